@@ -2,14 +2,49 @@
 FastAPI backend for PQC-secured DFLN dashboard.
 Run: uvicorn api:app --reload
 """
-from fastapi import FastAPI
+import asyncio
+import json
+import os
+import threading
+from contextlib import asynccontextmanager
+from typing import Optional
+
+from fastapi import FastAPI, HTTPException, Request
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import PlainTextResponse, StreamingResponse
+from pydantic import BaseModel
+
+from qdfln import metrics
+from qdfln.keystore import KeyStore
+from qdfln.sessions import SessionManager
+
+# Set QDFLN_KEY_STORE to a file path to keep PQC identities and session keys
+# across server restarts; otherwise they are cached in memory only.
+key_store = KeyStore(
+    path=os.environ.get("QDFLN_KEY_STORE"),
+    session_max_age=float(os.environ.get("QDFLN_SESSION_KEY_MAX_AGE", 3600)),
+)
+
+# The server records hot-path metrics unless QDFLN_METRICS=0.
+if os.environ.get("QDFLN_METRICS") != "0":
+    metrics.REGISTRY.enable()
+
+# Torch and PQC work runs on this pool, never on the event loop.
+sessions = SessionManager(
+    key_store=key_store,
+    max_workers=int(os.environ.get("QDFLN_WORKERS", 4)),
+)
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    yield
+    sessions.shutdown()
 
-from qdfln.pipeline import run_round_data
 
 app = FastAPI(
     title="DFLN API",
     description="PQC-secured Decentralized Federated Learning Network",
+    lifespan=lifespan,
 )
 
 app.add_middleware(
@@ -21,13 +56,136 @@ app.add_middleware(
 )
 
 
+class SessionConfig(BaseModel):
+    malicious_client_id: Optional[str] = "C3"
+    malicious_validator_id: Optional[str] = "V3"
+    lr: float = 0.1
+
+
 @app.get("/api/health")
 def health():
     return {"status": "ok"}
 
 
+@app.get("/api/metrics", response_class=PlainTextResponse)
+def get_metrics():
+    """Hot-path timers and counters in Prometheus text format."""
+    return PlainTextResponse(metrics.REGISTRY.render(), media_type="text/plain; version=0.0.4")
+
+
 @app.post("/api/run-round")
-def run_round():
-    """Run one DFLN training round and return clients, validators, consensus."""
-    data = run_round_data()
-    return data
+async def run_round():
+    """Run one round on the default session and return clients, validators, consensus."""
+    loop = asyncio.get_running_loop()
+    session = await loop.run_in_executor(sessions.executor, sessions.default_session)
+    job = sessions.submit_rounds(session.id)
+    done = await asyncio.wrap_future(sessions.job_future(job["job_id"]))
+    if done["status"] != "done":
+        raise HTTPException(status_code=500, detail=done["error"])
+    return done["results"][-1]
+
+
+@app.post("/api/sessions", status_code=201)
+async def create_session(config: Optional[SessionConfig] = None):
+    """Create a long-lived federation that later rounds reuse."""
+    config = config or SessionConfig()
+    loop = asyncio.get_running_loop()
+    session = await loop.run_in_executor(
+        sessions.executor,
+        lambda: sessions.create_session(
+            malicious_client_id=config.malicious_client_id,
+            malicious_validator_id=config.malicious_validator_id,
+            lr=config.lr,
+        ),
+    )
+    return session.summary()
+
+
+@app.get("/api/sessions/{session_id}")
+def get_session(session_id: str):
+    try:
+        return sessions.get_session(session_id).summary()
+    except KeyError as exc:
+        raise HTTPException(status_code=404, detail=str(exc))
+
+
+@app.delete("/api/sessions/{session_id}", status_code=204)
+def delete_session(session_id: str):
+    try:
+        sessions.delete_session(session_id)
+    except KeyError as exc:
+        raise HTTPException(status_code=404, detail=str(exc))
+
+
+@app.post("/api/sessions/{session_id}/rounds", status_code=202)
+def start_rounds(session_id: str, rounds: int = 1):
+    """Queue rounds as a background job; poll /api/jobs/{job_id} for progress."""
+    try:
+        job = sessions.submit_rounds(session_id, rounds)
+    except KeyError as exc:
+        raise HTTPException(status_code=404, detail=str(exc))
+    except ValueError as exc:
+        raise HTTPException(status_code=422, detail=str(exc))
+    return {"job_id": job["job_id"], "status": job["status"]}
+
+
+@app.get("/api/jobs/{job_id}")
+async def get_job(job_id: str, wait: float = 0.0):
+    """Job status and finished round results; `wait` long-polls up to that many seconds."""
+    try:
+        job = sessions.get_job(job_id)
+        if wait > 0 and job["status"] in ("queued", "running"):
+            future = asyncio.wrap_future(sessions.job_future(job_id))
+            try:
+                job = await asyncio.wait_for(asyncio.shield(future), timeout=wait)
+            except asyncio.TimeoutError:
+                # get_job returns a snapshot, so take a fresh one.
+                job = sessions.get_job(job_id)
+    except KeyError as exc:
+        raise HTTPException(status_code=404, detail=str(exc))
+    return job
+
+
+@app.post("/api/sessions/{session_id}/rounds/stream")
+async def stream_rounds(session_id: str, request: Request, rounds: int = 1):
+    """
+    Start rounds and stream their events as server-sent events while they run:
+    handshakes, per-packet accept/reject, aggregate hashes and consensus.
+    If the client disconnects the job keeps running but events are dropped.
+    """
+    loop = asyncio.get_running_loop()
+    queue: asyncio.Queue = asyncio.Queue()
+    listening = threading.Event()
+    listening.set()
+
+    def on_event(event):
+        if listening.is_set():
+            loop.call_soon_threadsafe(queue.put_nowait, event)
+
+    try:
+        job = sessions.submit_rounds(session_id, rounds, on_event=on_event)
+    except KeyError as exc:
+        raise HTTPException(status_code=404, detail=str(exc))
+    except ValueError as exc:
+        raise HTTPException(status_code=422, detail=str(exc))
+    job_done = sessions.job_future(job["job_id"])
+    job_done.add_done_callback(lambda _: loop.call_soon_threadsafe(queue.put_nowait, None))
+
+    async def events():
+        try:
+            while not await request.is_disconnected():
+                try:
+                    event = await asyncio.wait_for(queue.get(), timeout=1.0)
+                except asyncio.TimeoutError:
+                    continue
+                if event is None:
+                    # The session (and with it the job record) may be deleted meanwhile.
+                    done = job_done.result()
+                    payload = {"job_id": done["job_id"], "status": done["status"], "error": done["error"]}
+                    yield f"event: job_finished\ndata: {json.dumps(payload)}\n\n"
+                    return
+                yield f"event: {event['type']}\ndata: {json.dumps(event)}\n\n"
+        finally:
+            listening.clear()
+
+    return StreamingResponse(events(), media_type="text/event-stream")
@@ -3,3 +3,6 @@ from .validator import Validator
 from .blockchain import BlockchainSim
 from .models import create_global_model
 
+from .keystore import KeyStore
+from .federation import Federation
+from .scenario import Scenario, load_scenario
@@ -0,0 +1,491 @@
+"""
+Streaming gradient aggregators for validators.
+
+Gradients are fed one at a time with `add`; `result` returns G_t. Exact
+modes keep a preallocated C x D buffer and use partial selection
+(kthvalue/topk) instead of a full sort; "mean" keeps only a running sum and
+the "approx_*" modes keep a bounded-memory quantile sketch per coordinate.
+The Byzantine-robust rules (krum, multi_krum, geometric_median,
+centered_clip, norm_bounded_mean) share the same interface.
+"""
+import inspect
+from typing import Callable, Dict, List, Optional
+
+import torch
+
+
+AGGREGATORS: Dict[str, Callable[..., "Aggregator"]] = {}
+
+
+def register_aggregator(name: str):
+    def decorator(cls):
+        AGGREGATORS[name] = cls
+        return cls
+    return decorator
+
+
+def make_aggregator(name: str, grad_dim: int, **options) -> "Aggregator":
+    """Build the aggregator registered as `name`, passing only the options it accepts."""
+    if name not in AGGREGATORS:
+        raise ValueError(f"Unknown aggregation mode {name!r}; choose from {sorted(AGGREGATORS)}")
+    factory = AGGREGATORS[name]
+    params = inspect.signature(factory).parameters
+    accepted = {k: v for k, v in options.items() if k in params}
+    return factory(grad_dim, **accepted)
+
+
+def _trim_count(n: int, trim_ratio: float) -> int:
+    k = int(trim_ratio * n)
+    if k == 0 or n <= 2 * k:
+        return 0
+    return k
+
+
+class Aggregator:
+    # True if result() is the plain mean of the added gradients, so additive
+    # masks can be removed from it after the fact. Only linear rules can be
+    # combined with pairwise masking: rules that sort, clip, select or rescale
+    # rows turn the masks into noise that no correction can remove.
+    linear = False
+    # True if each output coordinate depends only on that coordinate of the
+    # inputs, so a slice of columns can be aggregated on its own.
+    coordinatewise = False
+
+    def __init__(self, grad_dim: int):
+        self.grad_dim = grad_dim
+        self.count = 0
+
+    def add(self, g: torch.Tensor) -> None:
+        raise NotImplementedError
+
+    def add_rows(self, rows: torch.Tensor) -> None:
+        """Add every row of an n x D matrix; subclasses do this in bulk where they can."""
+        for g in rows:
+            self.add(g)
+
+    def result(self) -> torch.Tensor:
+        raise NotImplementedError
+
+    def reset(self) -> None:
+        self.count = 0
+
+    def reserve(self, n: int) -> None:
+        """Hint that about `n` gradients will arrive this round."""
+
+    def start_like(self, other: "Aggregator") -> None:
+        """Take the state `other` carried into its current round, so both map the same rows to the same result."""
+
+    def __len__(self) -> int:
+        return self.count
+
+
+@register_aggregator("mean")
+class MeanAggregator(Aggregator):
+    """Running mean: O(D) memory regardless of client count."""
+
+    linear = True
+    coordinatewise = True
+
+    def __init__(self, grad_dim: int):
+        super().__init__(grad_dim)
+        self.total = torch.zeros(grad_dim)
+
+    def add(self, g: torch.Tensor) -> None:
+        self.total.add_(g)
+        self.count += 1
+
+    def add_rows(self, rows: torch.Tensor) -> None:
+        self.total.add_(rows.sum(dim=0))
+        self.count += rows.shape[0]
+
+    def result(self) -> torch.Tensor:
+        if self.count == 0:
+            return torch.zeros(self.grad_dim)
+        return self.total / self.count
+
+    def reset(self) -> None:
+        super().reset()
+        self.total.zero_()
+
+
+class BufferAggregator(Aggregator):
+    """Keeps accepted gradients in one preallocated, geometrically grown C x D buffer."""
+
+    def __init__(self, grad_dim: int, capacity: int = 16):
+        super().__init__(grad_dim)
+        self.buffer = torch.empty(max(1, capacity), grad_dim)
+        self._sq_dists: Optional[torch.Tensor] = None
+
+    def reserve(self, n: int) -> None:
+        if n > self.buffer.shape[0]:
+            grown = torch.empty(n, self.grad_dim)
+            grown[: self.count] = self.buffer[: self.count]
+            self.buffer = grown
+
+    def add(self, g: torch.Tensor) -> None:
+        if self.count == self.buffer.shape[0]:
+            self.reserve(2 * self.count)
+        self.buffer[self.count] = g
+        self.count += 1
+        self._sq_dists = None
+
+    def add_rows(self, rows: torch.Tensor) -> None:
+        n = rows.shape[0]
+        if self.count + n > self.buffer.shape[0]:
+            self.reserve(max(self.count + n, 2 * self.count))
+        self.buffer[self.count : self.count + n] = rows
+        self.count += n
+        self._sq_dists = None
+
+    def reset(self) -> None:
+        super().reset()
+        self._sq_dists = None
+
+    def pairwise_sq_distances(self) -> torch.Tensor:
+        """C x C squared distances in one batched cdist, cached until the next add/reset."""
+        if self._sq_dists is None:
+            stack = self.rows()
+            self._sq_dists = torch.cdist(stack, stack, compute_mode="use_mm_for_euclid_dist").pow_(2)
+        return self._sq_dists
+
+    def rows(self) -> torch.Tensor:
+        """View of the gradients added so far (no copy)."""
+        return self.buffer[: self.count]
+
+    def result(self) -> torch.Tensor:
+        if self.count == 0:
+            return torch.zeros(self.grad_dim)
+        return self.aggregate(self.rows())
+
+    def aggregate(self, stack: torch.Tensor) -> torch.Tensor:
+        raise NotImplementedError
+
+
+@register_aggregator("median")
+class MedianAggregator(BufferAggregator):
+    """Exact coordinate-wise lower median via kthvalue (same as torch.median)."""
+
+    coordinatewise = True
+
+    def aggregate(self, stack: torch.Tensor) -> torch.Tensor:
+        k = (stack.shape[0] + 1) // 2
+        return torch.kthvalue(stack, k, dim=0).values
+
+
+@register_aggregator("trimmed_mean")
+class TrimmedMeanAggregator(BufferAggregator):
+    """Exact trimmed mean: drops the k largest and smallest per coordinate with topk, no full sort."""
+
+    coordinatewise = True
+
+    def __init__(self, grad_dim: int, capacity: int = 16, trim_ratio: float = 0.2):
+        super().__init__(grad_dim, capacity)
+        self.trim_ratio = trim_ratio
+
+    def aggregate(self, stack: torch.Tensor) -> torch.Tensor:
+        n = stack.shape[0]
+        k = _trim_count(n, self.trim_ratio)
+        if k == 0:
+            return stack.mean(dim=0)
+        high = torch.topk(stack, k, dim=0, largest=True, sorted=False).values.sum(dim=0)
+        low = torch.topk(stack, k, dim=0, largest=False, sorted=False).values.sum(dim=0)
+        return (stack.sum(dim=0) - high - low) / (n - 2 * k)
+
+
+class QuantileSketch:
+    """
+    Per-coordinate mergeable quantile sketch (a simplified KLL). Level h holds
+    up to `capacity` rows of weight 2**h; when a level fills, each coordinate
+    is sorted and every other value is promoted to the next level. Memory is
+    O(capacity * log(n / capacity) * D) and results are exact while
+    n <= capacity.
+    """
+
+    def __init__(self, grad_dim: int, capacity: int = 64):
+        if capacity < 2 or capacity % 2:
+            raise ValueError("Sketch capacity must be an even number >= 2")
+        self.grad_dim = grad_dim
+        self.capacity = capacity
+        self.levels: List[torch.Tensor] = []
+        self.sizes: List[int] = []
+        self._offsets: List[int] = []
+        self.count = 0
+
+    def _ensure_level(self, h: int) -> None:
+        while len(self.levels) <= h:
+            self.levels.append(torch.empty(self.capacity, self.grad_dim))
+            self.sizes.append(0)
+            # Levels also start on alternating halves, so the first (often
+            # only) compaction of every level does not drop the same side.
+            self._offsets.append(len(self._offsets) % 2)
+
+    def _push(self, h: int, rows: torch.Tensor) -> None:
+        self._ensure_level(h)
+        n = rows.shape[0]
+        if self.sizes[h] + n > self.capacity:
+            self._compact(h)
+        self.levels[h][self.sizes[h] : self.sizes[h] + n] = rows
+        self.sizes[h] += n
+
+    def _compact(self, h: int) -> None:
+        size = self.sizes[h]
+        sorted_vals = torch.sort(self.levels[h][:size], dim=0).values
+        # Alternate the kept half so rounding errors do not accumulate in one direction.
+        offset = self._offsets[h]
+        self._offsets[h] ^= 1
+        promoted = sorted_vals[offset : size - (size % 2) : 2]
+        self.sizes[h] = 0
+        if size % 2:
+            self.levels[h][0] = sorted_vals[-1]
+            self.sizes[h] = 1
+        self._push(h + 1, promoted)
+
+    def add(self, g: torch.Tensor) -> None:
+        self._push(0, g.view(1, -1))
+        self.count += 1
+
+    def reset(self) -> None:
+        self.sizes = [0] * len(self.levels)
+        # Same start as a fresh sketch, so equal inputs give equal results.
+        self._offsets = [h % 2 for h in range(len(self.levels))]
+        self.count = 0
+
+    def _items(self):
+        values = torch.cat([lvl[:n] for lvl, n in zip(self.levels, self.sizes) if n], dim=0)
+        weights = torch.cat(
+            [torch.full((n,), float(2 ** h)) for h, n in enumerate(self.sizes) if n]
+        )
+        return values, weights
+
+    def _sorted_block(self, values, weights, start, stop):
+        vals, idx = torch.sort(values[:, start:stop], dim=0)
+        w = weights[idx]
+        return vals, w, torch.cumsum(w, dim=0)
+
+    def median(self, block_size: int = 4096) -> torch.Tensor:
+        values, weights = self._items()
+        half = weights.sum() / 2
+        out = torch.empty(self.grad_dim)
+        for start in range(0, self.grad_dim, block_size):
+            stop = min(start + block_size, self.grad_dim)
+            vals, _, cum = self._sorted_block(values, weights, start, stop)
+            pos = torch.searchsorted(cum.T.contiguous(), half.expand(stop - start, 1).contiguous())
+            pos = pos.clamp(max=vals.shape[0] - 1)
+            out[start:stop] = vals.gather(0, pos.T).squeeze(0)
+        return out
+
+    def trimmed_mean(self, trim_ratio: float, block_size: int = 4096) -> torch.Tensor:
+        values, weights = self._items()
+        total = float(weights.sum())
+        k = float(_trim_count(int(total), trim_ratio))
+        out = torch.empty(self.grad_dim)
+        for start in range(0, self.grad_dim, block_size):
+            stop = min(start + block_size, self.grad_dim)
+            vals, w, cum = self._sorted_block(values, weights, start, stop)
+            # Weight of each item that falls inside the kept rank range (k, total - k].
+            kept = (torch.clamp(cum, max=total - k) - torch.clamp(cum - w, min=k)).clamp(min=0)
+            out[start:stop] = (vals * kept).sum(dim=0) / (total - 2 * k)
+        return out
+
+
+@register_aggregator("approx_median")
+class ApproxMedianAggregator(Aggregator):
+    """Bounded-memory approximate coordinate-wise median."""
+
+    def __init__(self, grad_dim: int, sketch_capacity: int = 64, block_size: int = 4096):
+        super().__init__(grad_dim)
+        self.sketch = QuantileSketch(grad_dim, sketch_capacity)
+        self.block_size = block_size
+
+    def add(self, g: torch.Tensor) -> None:
+        self.sketch.add(g)
+        self.count += 1
+
+    def result(self) -> torch.Tensor:
+        if self.count == 0:
+            return torch.zeros(self.grad_dim)
+        return self.sketch.median(self.block_size)
+
+    def reset(self) -> None:
+        super().reset()
+        self.sketch.reset()
+
+
+@register_aggregator("approx_trimmed_mean")
+class ApproxTrimmedMeanAggregator(ApproxMedianAggregator):
+    """Bounded-memory approximate trimmed mean."""
+
+    def __init__(
+        self,
+        grad_dim: int,
+        sketch_capacity: int = 64,
+        block_size: int = 4096,
+        trim_ratio: float = 0.2,
+    ):
+        super().__init__(grad_dim, sketch_capacity, block_size)
+        self.trim_ratio = trim_ratio
+
+    def result(self) -> torch.Tensor:
+        if self.count == 0:
+            return torch.zeros(self.grad_dim)
+        return self.sketch.trimmed_mean(self.trim_ratio, self.block_size)
+
+
+def _byzantine_count(n: int, byzantine_ratio: float, num_byzantine: Optional[int]) -> int:
+    f = num_byzantine if num_byzantine is not None else int(byzantine_ratio * n)
+    # Krum needs n - f - 2 >= 1 neighbours to score each gradient.
+    return max(0, min(f, n - 3))
+
+
+def _krum_scores(sq_dists: torch.Tensor, f: int) -> torch.Tensor:
+    n = sq_dists.shape[0]
+    m = max(1, n - f - 2)
+    # Skip column 0 of the sorted distances: it is each gradient's distance to itself.
+    nearest = torch.topk(sq_dists, min(m + 1, n), dim=1, largest=False).values[:, 1:]
+    return nearest.sum(dim=1)
+
+
+@register_aggregator("krum")
+class KrumAggregator(BufferAggregator):
+    """Krum: returns the gradient whose n - f - 2 nearest neighbours are closest."""
+
+    def __init__(
+        self,
+        grad_dim: int,
+        capacity: int = 16,
+        byzantine_ratio: float = 0.2,
+        num_byzantine: Optional[int] = None,
+    ):
+        super().__init__(grad_dim, capacity)
+        self.byzantine_ratio = byzantine_ratio
+        self.num_byzantine = num_byzantine
+
+    def scores(self) -> torch.Tensor:
+        f = _byzantine_count(self.count, self.byzantine_ratio, self.num_byzantine)
+        return _krum_scores(self.pairwise_sq_distances(), f)
+
+    def aggregate(self, stack: torch.Tensor) -> torch.Tensor:
+        if stack.shape[0] <= 2:
+            return stack.mean(dim=0)
+        return stack[torch.argmin(self.scores())].clone()
+
+
+@register_aggregator("multi_krum")
+class MultiKrumAggregator(KrumAggregator):
+    """Multi-Krum: averages the `multi_k` best Krum-scored gradients (default n - f)."""
+
+    def __init__(
+        self,
+        grad_dim: int,
+        capacity: int = 16,
+        byzantine_ratio: float = 0.2,
+        num_byzantine: Optional[int] = None,
+        multi_k: Optional[int] = None,
+    ):
+        super().__init__(grad_dim, capacity, byzantine_ratio, num_byzantine)
+        self.multi_k = multi_k
+
+    def aggregate(self, stack: torch.Tensor) -> torch.Tensor:
+        n = stack.shape[0]
+        if n <= 2:
+            return stack.mean(dim=0)
+        f = _byzantine_count(n, self.byzantine_ratio, self.num_byzantine)
+        m = self.multi_k if self.multi_k is not None else n - f
+        m = max(1, min(m, n))
+        chosen = torch.topk(self.scores(), m, largest=False).indices
+        return stack[chosen].mean(dim=0)
+
+
+@register_aggregator("geometric_median")
+class GeometricMedianAggregator(BufferAggregator):
+    """Geometric median by Weiszfeld iterations, stopping once the update is below `tol`."""
+
+    def __init__(
+        self,
+        grad_dim: int,
+        capacity: int = 16,
+        max_iter: int = 100,
+        tol: float = 1e-6,
+        eps: float = 1e-8,
+    ):
+        super().__init__(grad_dim, capacity)
+        self.max_iter = max_iter
+        self.tol = tol
+        self.eps = eps
+        self.iterations = 0
+
+    def aggregate(self, stack: torch.Tensor) -> torch.Tensor:
+        z = stack.mean(dim=0)
+        self.iterations = 0
+        for self.iterations in range(1, self.max_iter + 1):
+            dists = torch.linalg.vector_norm(stack - z, dim=1).clamp_(min=self.eps)
+            w = 1.0 / dists
+            z_new = (w @ stack) / w.sum()
+            step = torch.linalg.vector_norm(z_new - z)
+            z = z_new
+            if step <= self.tol * (torch.linalg.vector_norm(z) + self.eps):
+                break
+        return z
+
+
+@register_aggregator("centered_clip")
+class CenteredClipAggregator(BufferAggregator):
+    """
+    Centered clipping: starting from the previous round's aggregate, repeatedly
+    move the center by the mean of (g_i - center) clipped to `clip_radius`.
+    The starting point is fixed at reset(), so result() can be called again
+    within a round and start_like() reproduces it elsewhere.
+    """
+
+    def __init__(self, grad_dim: int, capacity: int = 16, clip_radius: float = 1.0, iterations: int = 3):
+        super().__init__(grad_dim, capacity)
+        self.clip_radius = clip_radius
+        self.iterations = iterations
+        self.center = torch.zeros(grad_dim)
+        self.round_center = self.center
+
+    def reset(self) -> None:
+        super().reset()
+        self.round_center = self.center
+
+    def start_like(self, other: "Aggregator") -> None:
+        self.center = self.round_center = other.round_center
+
+    def aggregate(self, stack: torch.Tensor) -> torch.Tensor:
+        v = self.round_center.clone()
+        for _ in range(self.iterations):
+            diff = stack - v
+            norms = torch.linalg.vector_norm(diff, dim=1, keepdim=True)
+            scale = torch.clamp(self.clip_radius / (norms + 1e-12), max=1.0)
+            v = v + (diff * scale).mean(dim=0)
+        self.center = v
+        return v
+
+
+@register_aggregator("norm_bounded_mean")
+class NormBoundedMeanAggregator(MeanAggregator):
+    """
+    Streaming mean of gradients each rescaled to norm <= `norm_bound`.
+    Rescaled masked rows no longer cancel, so this rule cannot be combined
+    with pairwise masking.
+    """
+
+    # Rescaling depends on the whole gradient's norm, and the result is not
+    # the plain mean of the added rows.
+    linear = False
+    coordinatewise = False
+
+    def __init__(self, grad_dim: int, norm_bound: float = 1.0):
+        super().__init__(grad_dim)
+        self.norm_bound = norm_bound
+
+    def add(self, g: torch.Tensor) -> None:
+        norm = float(torch.linalg.vector_norm(g))
+        if norm > self.norm_bound:
+            g = g * (self.norm_bound / norm)
+        super().add(g)
+
+    def add_rows(self, rows: torch.Tensor) -> None:
+        norms = torch.linalg.vector_norm(rows, dim=1, keepdim=True)
+        scale = torch.where(norms > self.norm_bound, self.norm_bound / norms, torch.ones_like(norms))
+        super().add_rows(rows * scale)
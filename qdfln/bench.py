@@ -0,0 +1,366 @@
+"""
+Offline benchmark harness.
+
+Round benchmarks run full federation rounds over a sweep of client count x
+validator count x gradient dimension (synthetic data, in-memory keys) and
+split each round into the stages its StageTimer records (result["timings"]):
+
+    handshake     KEM handshakes (client-validator and mask pairs)
+    training      local training of all clients
+    sign_encrypt  masking, signing and packet encryption
+    network       simulated transport, when a Network is configured
+    validate      packet decryption and checks, per validator
+    aggregate     aggregation and H_agg, per validator
+    consensus     stake-weighted consensus and block append
+    update        model update and checkpointing
+    other         the rest of the round's wall time
+
+Primitive benchmarks time the crypto and aggregation building blocks in
+isolation; `--crypto` compares every registered KEM and signature
+scheme. Results go to a JSON file; `--compare old.json` reports stages
+whose median got slower than `--threshold`.
+
+    python -m qdfln.bench --clients 5,10,20 --validators 3 --dims 8,64 \\
+        --rounds 3 --out bench.json
+"""
+import argparse
+import contextlib
+import io
+import json
+import platform
+import resource
+import subprocess
+import sys
+import time
+import tracemalloc
+from typing import Any, Callable, Dict, Iterable, List, Optional
+
+import numpy as np
+import torch
+
+from .aggregation import make_aggregator
+from .channel import SecureChannel, SessionChannels
+from .compression import COMPRESSORS, decompress, make_compressor
+from .crypto_utils import (
+    KEM_SCHEMES,
+    SIG_SCHEMES,
+    CryptoSuite,
+    benchmark_suite,
+    derive_fernet_key,
+    get_suite,
+)
+from .scenario import Scenario
+from . import wire
+
+# The round's StageTimer stages (result["timings"]); "other" is the rest of
+# the round's wall time, e.g. committee selection and event bookkeeping.
+STAGES = (
+    "handshake", "training", "sign_encrypt", "network", "validate", "aggregate", "consensus", "update", "other",
+)
+
+def summarize(samples: Iterable[float]) -> Dict[str, float]:
+    values = np.asarray(list(samples), dtype=np.float64)
+    if values.size == 0:
+        return {"n": 0}
+    p50, p90, p99 = np.percentile(values, [50, 90, 99])
+    return {
+        "n": int(values.size),
+        "mean": float(values.mean()),
+        "min": float(values.min()),
+        "p50": float(p50),
+        "p90": float(p90),
+        "p99": float(p99),
+        "max": float(values.max()),
+    }
+
+
+def _max_rss_mb() -> float:
+    # ru_maxrss is KiB on Linux and bytes on macOS.
+    rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return rss / (1024 * 1024) if sys.platform == "darwin" else rss / 1024
+
+
+def run_round(federation) -> Dict[str, Any]:
+    """Drive one round to completion and return its result."""
+    result = None
+    for event in federation.iter_round():
+        if event["type"] == "round_finished":
+            result = event["result"]
+    return result
+
+
+def stage_times(result: Dict[str, Any], elapsed: float) -> Dict[str, float]:
+    """Seconds per stage from the round's StageTimer, with the untimed remainder as "other"."""
+    timings = result["timings"]
+    totals = {stage: timings.get(stage, 0.0) for stage in STAGES}
+    totals["other"] = max(0.0, elapsed - sum(timings.values()))
+    return totals
+
+
+def bench_round(
+    num_clients: int,
+    num_validators: int,
+    grad_dim: int,
+    rounds: int = 3,
+    warmup: int = 1,
+    trace_memory: bool = False,
+    scenario_overrides: Optional[Dict[str, Any]] = None,
+) -> Dict[str, Any]:
+    """Time `rounds` rounds (after `warmup` untimed ones) of one sweep point."""
+    scenario = Scenario(
+        name="bench",
+        num_clients=num_clients,
+        num_validators=num_validators,
+        dataset="synthetic",
+        samples_per_client=32,
+        # Logistic regression: grad_dim = input_dim + 1 (bias).
+        input_dim=max(1, grad_dim - 1),
+        shared_identities=True,
+        **(scenario_overrides or {}),
+    )
+    if trace_memory:
+        tracemalloc.start()
+    sink = io.StringIO()
+    with contextlib.redirect_stdout(sink):
+        started = time.perf_counter()
+        federation = scenario.build()
+        setup_s = time.perf_counter() - started
+
+        per_stage: Dict[str, List[float]] = {stage: [] for stage in STAGES}
+        round_s: List[float] = []
+        packets: List[int] = []
+        for i in range(warmup + rounds):
+            started = time.perf_counter()
+            result = run_round(federation)
+            elapsed = time.perf_counter() - started
+            sink.seek(0)
+            sink.truncate()
+            if i < warmup:
+                continue
+            round_s.append(elapsed)
+            packets.append(result["packets_sent"])
+            stages = stage_times(result, elapsed)
+            for stage, seconds in stages.items():
+                per_stage[stage].append(seconds)
+
+    memory = {"max_rss_mb": round(_max_rss_mb(), 1)}
+    if trace_memory:
+        memory["python_peak_mb"] = round(tracemalloc.get_traced_memory()[1] / 2**20, 2)
+        tracemalloc.stop()
+
+    mean_round = float(np.mean(round_s)) if round_s else float("nan")
+    return {
+        "params": {
+            "clients": num_clients,
+            "validators": num_validators,
+            "grad_dim": federation.grad_dim,
+            "rounds": rounds,
+            "warmup": warmup,
+        },
+        "setup_s": setup_s,
+        "round_s": summarize(round_s),
+        "stages": {stage: summarize(v) for stage, v in per_stage.items()},
+        "throughput": {
+            "rounds_per_s": 1.0 / mean_round,
+            "client_updates_per_s": num_clients / mean_round,
+            # With committees a client sends to committee_size validators, not all of them.
+            "packets_per_s": float(np.mean(packets)) / mean_round if packets else float("nan"),
+        },
+        "memory": memory,
+    }
+
+
+def _time_calls(fn: Callable[[], Any], repeats: int) -> Dict[str, float]:
+    samples = []
+    for _ in range(repeats):
+        started = time.perf_counter()
+        fn()
+        samples.append(time.perf_counter() - started)
+    return summarize(samples)
+
+
+def bench_primitives(
+    dims: List[int],
+    num_clients: int,
+    repeats: int = 20,
+    sign_repeats: int = 3,
+    suite: Optional[CryptoSuite] = None,
+) -> Dict[str, Any]:
+    """Per-call latency of the crypto primitives and of each aggregator at C x D."""
+    suite = get_suite(suite)
+    results: Dict[str, Any] = {}
+    kem_pk, kem_sk = suite.kem_generate_keypair()
+
+    def kem_handshake():
+        ct, shared = suite.kem_encapsulate(kem_pk)
+        suite.kem_decapsulate(ct, kem_sk)
+        return derive_fernet_key(shared)
+
+    key = kem_handshake()
+    channel = SecureChannel(key)
+    results["kem_handshake"] = _time_calls(kem_handshake, repeats)
+    sig_pk, sig_sk = suite.sig_generate_keypair()
+    for dim in dims:
+        g_bytes = torch.randn(dim).numpy().tobytes()
+        signature = suite.sign(sig_sk, g_bytes)
+        packet = wire.encode_packet("C1", "V1", 1, g_bytes, channel, signature, wire.fingerprint(sig_pk))
+        results[f"sign[d={dim}]"] = _time_calls(lambda: suite.sign(sig_sk, g_bytes), sign_repeats)
+        results[f"verify[d={dim}]"] = _time_calls(lambda: suite.verify(sig_pk, g_bytes, signature), repeats)
+        results[f"encrypt[d={dim}]"] = _time_calls(
+            lambda: wire.encode_packet("C1", "V1", 1, g_bytes, channel, signature, wire.fingerprint(sig_pk)),
+            repeats,
+        )
+        receiver = SessionChannels(key)
+        results[f"decrypt[d={dim}]"] = _time_calls(lambda: wire.parse_packet(packet).decrypt(receiver), repeats)
+
+        g_vec = torch.randn(dim)
+        for name in COMPRESSORS:
+            compressor = make_compressor(name, dim)
+            payload = compressor.compress(g_vec)
+            results[f"compress_{name}[d={dim}]"] = {
+                **_time_calls(lambda: compressor.compress(g_vec), repeats),
+                "ratio": 4 * dim / len(payload),
+                "rel_error": compressor.last_error,
+            }
+            results[f"decompress_{name}[d={dim}]"] = _time_calls(lambda: decompress(payload, dim), repeats)
+
+        grads = torch.randn(num_clients, dim)
+        for mode in ("mean", "median", "trimmed_mean", "krum", "geometric_median"):
+            aggregator = make_aggregator(mode, dim)
+
+            def run():
+                aggregator.reset()
+                for g in grads:
+                    aggregator.add(g)
+                aggregator.result()
+
+            results[f"aggregate_{mode}[c={num_clients},d={dim}]"] = _time_calls(run, repeats)
+    return results
+
+
+def bench_crypto(iterations: int = 5) -> Dict[str, Dict[str, float]]:
+    """benchmark_suite for every signature scheme (with ML-KEM-512) and every KEM (with the default signature)."""
+    results: Dict[str, Dict[str, float]] = {}
+    for sig in SIG_SCHEMES:
+        rates = benchmark_suite(get_suite("ml-kem-512", sig), iterations)
+        results[sig] = {k: v for k, v in rates.items() if k.startswith(("sig_", "sign", "verify", "signature"))}
+    for kem in KEM_SCHEMES:
+        rates = benchmark_suite(get_suite(kem, "ml-dsa-44"), iterations)
+        results[kem] = {k: v for k, v in rates.items() if k.startswith(("kem_", "encaps", "decaps"))}
+    return results
+
+
+def _git_revision() -> Optional[str]:
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True, check=True
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def compare(old: Dict[str, Any], new: Dict[str, Any], threshold: float = 0.2) -> List[str]:
+    """Stages and primitives whose median latency grew by more than `threshold`."""
+    regressions = []
+
+    def check(name: str, before: Dict[str, float], after: Dict[str, float]) -> None:
+        if before.get("n") and after.get("n") and before["p50"] > 0:
+            change = after["p50"] / before["p50"] - 1.0
+            if change > threshold:
+                regressions.append(f"{name}: p50 {before['p50']:.6f}s -> {after['p50']:.6f}s (+{100 * change:.0f}%)")
+
+    old_cases = {json.dumps(c["params"], sort_keys=True): c for c in old.get("rounds", [])}
+    for case in new.get("rounds", []):
+        key = json.dumps(case["params"], sort_keys=True)
+        if key in old_cases:
+            check(f"{key} round", old_cases[key]["round_s"], case["round_s"])
+            for stage, stats in case["stages"].items():
+                check(f"{key} {stage}", old_cases[key]["stages"].get(stage, {}), stats)
+    for name, stats in new.get("primitives", {}).items():
+        check(name, old.get("primitives", {}).get(name, {}), stats)
+    return regressions
+
+
+def _int_list(text: str) -> List[int]:
+    return [int(x) for x in text.split(",") if x]
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Benchmark QDFLN rounds and primitives")
+    parser.add_argument("--clients", type=_int_list, default=[3], help="comma-separated client counts")
+    parser.add_argument("--validators", type=_int_list, default=[3], help="comma-separated validator counts")
+    parser.add_argument("--dims", type=_int_list, default=[5], help="comma-separated gradient dimensions")
+    parser.add_argument("--rounds", type=int, default=3, help="timed rounds per sweep point")
+    parser.add_argument("--warmup", type=int, default=1, help="untimed rounds before timing")
+    parser.add_argument("--repeats", type=int, default=20, help="calls per primitive benchmark")
+    parser.add_argument("--no-rounds", action="store_true", help="skip the round sweep")
+    parser.add_argument("--no-primitives", action="store_true", help="skip primitive benchmarks")
+    parser.add_argument("--suite", default="default", help="crypto suite preset for rounds and primitives")
+    parser.add_argument("--compression", choices=sorted(COMPRESSORS), help="compress gradients in round benchmarks")
+    parser.add_argument("--compression-ratio", type=float, default=0.01, help="kept fraction for topk/randk")
+    parser.add_argument("--crypto", action="store_true", help="compare all registered KEM and signature schemes")
+    parser.add_argument("--trace-memory", action="store_true", help="also record Python peak allocation")
+    parser.add_argument("--out", default=None, help="write results as JSON to this path")
+    parser.add_argument("--compare", default=None, help="baseline JSON to check for regressions")
+    parser.add_argument("--threshold", type=float, default=0.2, help="allowed p50 slowdown (0.2 = 20%%)")
+    args = parser.parse_args()
+
+    report: Dict[str, Any] = {
+        "meta": {
+            "revision": _git_revision(),
+            "timestamp": time.time(),
+            "python": platform.python_version(),
+            "torch": torch.__version__,
+            "platform": platform.platform(),
+            "threads": torch.get_num_threads(),
+            "suite": get_suite(args.suite).name,
+            "compression": args.compression,
+        },
+        "rounds": [],
+        "primitives": {},
+    }
+    overrides: Dict[str, Any] = {"crypto_suite": args.suite}
+    if args.compression:
+        overrides.update(compression=args.compression, compression_options={"ratio": args.compression_ratio})
+        if make_compressor(args.compression, 1).sparse:
+            overrides["mask_scale"] = None
+    if not args.no_rounds:
+        for c in args.clients:
+            for v in args.validators:
+                for d in args.dims:
+                    case = bench_round(
+                        c, v, d, args.rounds, args.warmup, args.trace_memory,
+                        scenario_overrides=overrides,
+                    )
+                    report["rounds"].append(case)
+                    print(
+                        f"clients={c:<6} validators={v:<4} dim={d:<8} "
+                        f"round p50={case['round_s']['p50']:.3f}s  "
+                        + "  ".join(f"{s}={case['stages'][s]['p50']:.3f}" for s in STAGES)
+                    )
+    if not args.no_primitives:
+        report["primitives"] = bench_primitives(
+            args.dims, max(args.clients), args.repeats, suite=get_suite(args.suite)
+        )
+        for name, stats in report["primitives"].items():
+            print(f"{name:<40} p50={1e3 * stats['p50']:.3f}ms  p99={1e3 * stats['p99']:.3f}ms")
+
+    if args.crypto:
+        report["crypto"] = bench_crypto()
+        for scheme, stats in report["crypto"].items():
+            print(f"{scheme:<22} " + "  ".join(f"{k}={v:.1f}" if isinstance(v, float) else f"{k}={v}" for k, v in stats.items()))
+
+    if args.out:
+        with open(args.out, "w") as f:
+            json.dump(report, f, indent=2)
+    if args.compare:
+        with open(args.compare) as f:
+            regressions = compare(json.load(f), report, args.threshold)
+        for line in regressions:
+            print(f"REGRESSION {line}")
+        if regressions:
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
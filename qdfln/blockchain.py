@@ -1,53 +1,410 @@
-from typing import Dict, Tuple, Optional, List
+import hashlib
+import json
+import time
+from typing import Any, Collection, Dict, Tuple, Optional, List
+
+from .metrics import CONSENSUS_SECONDS
+
+
+GENESIS_HASH = "0" * 64
+
+
+class Block:
+    """
+    A finalized round: the winning H_agg, who voted what, and the stake
+    changes it caused. Sharded rounds leave `votes` empty and record each
+    shard's committee, votes and winning hash in `shards`. Their H_agg
+    commits to the shard hashes in shard order.
+    """
+
+    def __init__(
+        self,
+        height: int,
+        round_id: int,
+        prev_hash: str,
+        H_agg: str,
+        winning_weight: float,
+        total_stake: float,
+        votes: Dict[str, str],
+        fraudsters: List[str],
+        stake_deltas: Dict[str, float],
+        timestamp: Optional[float] = None,
+        block_hash: Optional[str] = None,
+        shards: Optional[List[Dict[str, Any]]] = None,
+    ):
+        self.height = height
+        self.round_id = round_id
+        self.prev_hash = prev_hash
+        self.H_agg = H_agg
+        self.winning_weight = winning_weight
+        self.total_stake = total_stake
+        self.votes = votes
+        self.fraudsters = fraudsters
+        self.stake_deltas = stake_deltas
+        self.shards = shards
+        self.timestamp = time.time() if timestamp is None else timestamp
+        self.hash = block_hash if block_hash is not None else self.compute_hash()
+
+    def _body(self) -> Dict[str, Any]:
+        body = {
+            "height": self.height,
+            "round_id": self.round_id,
+            "prev_hash": self.prev_hash,
+            "H_agg": self.H_agg,
+            "winning_weight": self.winning_weight,
+            "total_stake": self.total_stake,
+            "votes": self.votes,
+            "fraudsters": self.fraudsters,
+            "stake_deltas": self.stake_deltas,
+            "timestamp": self.timestamp,
+        }
+        # Only sharded blocks carry the key, so unsharded block hashes are unchanged.
+        if self.shards is not None:
+            body["shards"] = self.shards
+        return body
+
+    def compute_hash(self) -> str:
+        encoded = json.dumps(self._body(), sort_keys=True, separators=(",", ":")).encode("utf-8")
+        return hashlib.sha256(encoded).hexdigest()
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {**self._body(), "hash": self.hash}
+
+    @classmethod
+    def from_dict(cls, data: Dict[str, Any]) -> "Block":
+        return cls(
+            data["height"],
+            data["round_id"],
+            data["prev_hash"],
+            data["H_agg"],
+            data["winning_weight"],
+            data["total_stake"],
+            data["votes"],
+            data["fraudsters"],
+            data["stake_deltas"],
+            timestamp=data["timestamp"],
+            block_hash=data["hash"],
+            shards=data.get("shards"),
+        )
 
 
 class BlockchainSim:
-    def __init__(self, supermajority: float = 2 / 3, slash_fraction: float = 0.2):
+    """
+    Stake-weighted consensus on aggregation hashes with an append-only chain
+    of finalized blocks. Per-round stake tallies and the running total stake
+    are updated in O(1) per submission, and finalized rounds are dropped from
+    the open-round tables. `retain_blocks` bounds how many blocks stay in memory.
+    """
+
+    def __init__(
+        self,
+        supermajority: float = 2 / 3,
+        slash_fraction: float = 0.2,
+        retain_blocks: Optional[int] = None,
+        block_store=None,
+    ):
+        # Votes of rounds that are not finalized yet.
         self.round_hashes: Dict[int, Dict[str, str]] = {}
         self.reputation: Dict[str, int] = {}
         self.stake: Dict[str, float] = {}
         self.supermajority = supermajority
         self.slash_fraction = slash_fraction
+        self.retain_blocks = retain_blocks
+        # Optional storage.BlockStore that every finalized block is appended to.
+        self.block_store = block_store
+
+        self.blocks: List[Block] = []
+        self._block_index: Dict[int, int] = {}
+        self._pruned_blocks = 0
+        self._head_hash = GENESIS_HASH
+        self._total_stake = 0.0
+        self._tallies: Dict[int, Dict[str, float]] = {}
+        self._vote_weights: Dict[int, Dict[str, float]] = {}
+        self._leaders: Dict[int, Tuple[str, float]] = {}
+
+    @property
+    def total_stake(self) -> float:
+        return self._total_stake
+
+    @property
+    def head_hash(self) -> str:
+        return self._head_hash
+
+    @property
+    def height(self) -> int:
+        return self._pruned_blocks + len(self.blocks)
+
+    def _set_stake(self, validator_id: str, stake: float) -> None:
+        self._total_stake += stake - self.stake.get(validator_id, 0.0)
+        self.stake[validator_id] = stake
 
     def register_validator(self, validator_id: str, stake: float) -> None:
-        self.stake[validator_id] = float(stake)
+        self._set_stake(validator_id, float(stake))
         self.reputation.setdefault(validator_id, 0)
 
-    def submit_hash(self, round_id: int, validator_id: str, H_agg: str):
-        self.round_hashes.setdefault(round_id, {})[validator_id] = H_agg
+    def submit_hash(self, round_id: int, validator_id: str, H_agg: str) -> bool:
+        """
+        Record a vote. Returns True as soon as some hash of this round holds a
+        supermajority of total stake, so callers can stop waiting for votes.
+        """
+        if round_id in self._block_index:
+            raise ValueError(f"Round {round_id} is already finalized")
         self.reputation.setdefault(validator_id, 0)
-        self.stake.setdefault(validator_id, 1.0)
+        if validator_id not in self.stake:
+            self._set_stake(validator_id, 1.0)
 
-    def check_consensus_and_update(
-        self, round_id: int
-    ) -> Optional[Tuple[str, float, Dict[str, str], List[str]]]:
-        entries = self.round_hashes.get(round_id, {})
-        if not entries:
-            return None
+        votes = self.round_hashes.setdefault(round_id, {})
+        tally = self._tallies.setdefault(round_id, {})
+        weights = self._vote_weights.setdefault(round_id, {})
 
-        weight_per_hash: Dict[str, float] = {}
-        for vid, h in entries.items():
-            w = self.stake.get(vid, 0.0)
-            weight_per_hash[h] = weight_per_hash.get(h, 0.0) + w
+        previous = votes.get(validator_id)
+        if previous is not None:
+            tally[previous] -= weights[validator_id]
+            if not tally[previous]:
+                del tally[previous]
+            if self._leaders.get(round_id, (None,))[0] == previous:
+                # The leader lost weight; re-pick among this round's (few) distinct hashes.
+                self._leaders[round_id] = max(tally.items(), key=lambda x: x[1]) if tally else ("", 0.0)
 
-        H_star, winning_weight = max(weight_per_hash.items(), key=lambda x: x[1])
-        total_stake = sum(self.stake.values())
+        w = self.stake[validator_id]
+        votes[validator_id] = H_agg
+        weights[validator_id] = w
+        tally[H_agg] = tally.get(H_agg, 0.0) + w
+        if tally[H_agg] > self._leaders.get(round_id, ("", 0.0))[1]:
+            self._leaders[round_id] = (H_agg, tally[H_agg])
+        return self.has_supermajority(round_id)
 
-        if total_stake <= 0:
-            return None
+    def has_supermajority(self, round_id: int) -> bool:
+        leader = self._leaders.get(round_id)
+        if leader is None or self._total_stake <= 0:
+            return False
+        return leader[1] >= self.supermajority * self._total_stake
 
-        # Require supermajority of stake for finality
-        if winning_weight < self.supermajority * total_stake:
+    def leading_hash(self, round_id: int) -> Optional[str]:
+        """The hash that would finalize `round_id` now, or None without a supermajority."""
+        return self._leaders[round_id][0] if self.has_supermajority(round_id) else None
+
+    def check_consensus_and_update(
+        self, round_id: int, spared: Collection[str] = ()
+    ) -> Optional[Tuple[str, float, Dict[str, str], List[str]]]:
+        """
+        Finalize `round_id` if one hash holds a supermajority of stake: reward
+        agreeing validators, slash the rest, and append a block. Dissenters in
+        `spared` (e.g. whose disputes were not confirmed) are neither rewarded
+        nor slashed. Returns None if there is no supermajority or the round
+        was already finalized.
+        """
+        with CONSENSUS_SECONDS.time():
+            return self._finalize(round_id, spared)
+
+    def _finalize(
+        self, round_id: int, spared: Collection[str] = ()
+    ) -> Optional[Tuple[str, float, Dict[str, str], List[str]]]:
+        entries = self.round_hashes.get(round_id, {})
+        if not entries or not self.has_supermajority(round_id):
             return None
 
+        H_star, winning_weight = self._leaders[round_id]
+        total_stake = self._total_stake
+
         fraudsters: List[str] = []
+        stake_deltas: Dict[str, float] = {}
         for vid, h in entries.items():
             if h == H_star:
                 self.reputation[vid] += 1
-            else:
+            elif vid not in spared:
                 self.reputation[vid] -= 1
-                self.stake[vid] = max(0.0, self.stake[vid] * (1.0 - self.slash_fraction))
+                before = self.stake[vid]
+                self._set_stake(vid, max(0.0, before * (1.0 - self.slash_fraction)))
+                stake_deltas[vid] = self.stake[vid] - before
                 fraudsters.append(vid)
 
+        block = Block(
+            self.height,
+            round_id,
+            self._head_hash,
+            H_star,
+            winning_weight,
+            total_stake,
+            dict(entries),
+            fraudsters,
+            stake_deltas,
+        )
+        self._append_block(block)
+        self._drop_round(round_id)
         return H_star, winning_weight, entries, fraudsters
 
+    def shard_outcome(self, committee: List[str], votes: Dict[str, str]) -> Optional[Tuple[str, float]]:
+        """(winning hash, its stake) if one hash holds a supermajority of the committee's stake."""
+        committee_stake = sum(self.stake.get(vid, 0.0) for vid in committee)
+        tally: Dict[str, float] = {}
+        for vid, h in votes.items():
+            if vid in committee:
+                tally[h] = tally.get(h, 0.0) + self.stake.get(vid, 0.0)
+        if not tally or committee_stake <= 0:
+            return None
+        H_star, weight = max(tally.items(), key=lambda x: x[1])
+        if weight < self.supermajority * committee_stake:
+            return None
+        return H_star, weight
+
+    def check_shard_consensus_and_update(
+        self,
+        round_id: int,
+        committees: List[List[str]],
+        votes: List[Dict[str, str]],
+        spared: Collection[Tuple[str, int]] = (),
+    ) -> Optional[Tuple[str, float, float, List[Dict[str, Any]], List[str]]]:
+        """
+        Finalize a sharded round: each shard needs a supermajority of its
+        committee's stake. Validators are rewarded or slashed once per shard
+        they voted in, except (validator, shard) pairs in `spared` (listed
+        under the shard record's "spared"), and one block records every shard. Shards without a supermajority are
+        recorded with H_agg None. Returns (H_agg, winning stake, committee
+        stake, shard records, fraudsters), or None if no shard reached a
+        supermajority.
+        """
+        with CONSENSUS_SECONDS.time():
+            if round_id in self._block_index:
+                return None
+            # All outcomes are decided on pre-round stake, then applied.
+            records: List[Dict[str, Any]] = []
+            for shard, (committee, shard_votes) in enumerate(zip(committees, votes)):
+                outcome = self.shard_outcome(committee, shard_votes)
+                records.append({
+                    "shard": shard,
+                    "committee": list(committee),
+                    "votes": dict(shard_votes),
+                    "H_agg": outcome[0] if outcome else None,
+                    "winning_weight": outcome[1] if outcome else 0.0,
+                    "committee_stake": sum(self.stake.get(vid, 0.0) for vid in committee),
+                })
+            if not any(r["H_agg"] for r in records):
+                return None
+
+            fraudsters: List[str] = []
+            stake_deltas: Dict[str, float] = {}
+            for record in records:
+                if record["H_agg"] is None:
+                    continue
+                for vid, h in record["votes"].items():
+                    self.reputation.setdefault(vid, 0)
+                    if h == record["H_agg"]:
+                        self.reputation[vid] += 1
+                        continue
+                    if (vid, record["shard"]) in spared:
+                        record.setdefault("spared", []).append(vid)
+                        continue
+                    self.reputation[vid] -= 1
+                    before = self.stake.get(vid, 0.0)
+                    self._set_stake(vid, max(0.0, before * (1.0 - self.slash_fraction)))
+                    stake_deltas[vid] = stake_deltas.get(vid, 0.0) + self.stake[vid] - before
+                    if vid not in fraudsters:
+                        fraudsters.append(vid)
+
+            H_star = hashlib.sha256("|".join(r["H_agg"] or "-" for r in records).encode("utf-8")).hexdigest()
+            winning_weight = sum(r["winning_weight"] for r in records)
+            committee_stake = sum(r["committee_stake"] for r in records)
+            block = Block(
+                self.height,
+                round_id,
+                self._head_hash,
+                H_star,
+                winning_weight,
+                committee_stake,
+                {},
+                fraudsters,
+                stake_deltas,
+                shards=records,
+            )
+            self._append_block(block)
+            self._drop_round(round_id)
+            return H_star, winning_weight, committee_stake, records, fraudsters
+
+    def _append_block(self, block: Block) -> None:
+        if self.block_store is not None:
+            self.block_store.append(block)
+        self._block_index[block.round_id] = block.height
+        self.blocks.append(block)
+        self._head_hash = block.hash
+        if self.retain_blocks is not None and len(self.blocks) > self.retain_blocks:
+            self.compact(self.retain_blocks)
+
+    def _drop_round(self, round_id: int) -> None:
+        self.round_hashes.pop(round_id, None)
+        self._tallies.pop(round_id, None)
+        self._vote_weights.pop(round_id, None)
+        self._leaders.pop(round_id, None)
+
+    def get_block(self, round_id: int) -> Optional[Block]:
+        """O(1) lookup by round: in memory if retained, else from the block store."""
+        height = self._block_index.get(round_id)
+        if height is not None and height >= self._pruned_blocks:
+            return self.blocks[height - self._pruned_blocks]
+        if self.block_store is not None:
+            return self.block_store.get(round_id)
+        return None
+
+    def compact(self, keep_last: int) -> None:
+        """Drop all but the last `keep_last` blocks from memory; the head hash is unchanged."""
+        drop = max(0, len(self.blocks) - keep_last)
+        for block in self.blocks[:drop]:
+            self._block_index.pop(block.round_id, None)
+        del self.blocks[:drop]
+        self._pruned_blocks += drop
+
+    def prune_open_rounds(self, before_round: int) -> None:
+        """Forget votes of rounds older than `before_round` that never reached finality."""
+        for round_id in [r for r in self.round_hashes if r < before_round]:
+            self._drop_round(round_id)
+
+    def export_state(self) -> Dict[str, Any]:
+        return {
+            "stake": dict(self.stake),
+            "reputation": dict(self.reputation),
+            "head_hash": self._head_hash,
+            "height": self.height,
+        }
+
+    def load_state(self, state: Dict[str, Any]) -> None:
+        """Resume from export_state(); earlier blocks stay on disk, none in memory."""
+        self.stake = {vid: float(s) for vid, s in state["stake"].items()}
+        self.reputation = {vid: int(r) for vid, r in state["reputation"].items()}
+        self._total_stake = sum(self.stake.values())
+        self._head_hash = state["head_hash"]
+        self.blocks = []
+        self._block_index = {}
+        self._pruned_blocks = state["height"]
+        self.round_hashes = {}
+        self._tallies = {}
+        self._vote_weights = {}
+        self._leaders = {}
+
+    def apply_block(self, block: Block) -> None:
+        """Fast-forward reputation, stake and head over a block that is already stored."""
+        if block.prev_hash != self._head_hash:
+            raise ValueError(f"Block for round {block.round_id} does not extend the current head")
+        # Dissenters that were spared are not fraudsters (or are listed under the shard).
+        for vid, h in block.votes.items():
+            change = 1 if h == block.H_agg else -1 if vid in block.fraudsters else 0
+            self.reputation[vid] = self.reputation.get(vid, 0) + change
+        for shard in block.shards or []:
+            if shard["H_agg"] is None:
+                continue
+            spared = shard.get("spared", [])
+            for vid, h in shard["votes"].items():
+                change = 1 if h == shard["H_agg"] else 0 if vid in spared else -1
+                self.reputation[vid] = self.reputation.get(vid, 0) + change
+        for vid, delta in block.stake_deltas.items():
+            self._set_stake(vid, self.stake.get(vid, 0.0) + delta)
+        self._head_hash = block.hash
+        self._pruned_blocks += 1
+
+    def verify_chain(self) -> bool:
+        """Check hash links and block hashes of the retained blocks."""
+        for i, block in enumerate(self.blocks):
+            if block.hash != block.compute_hash():
+                return False
+            if i > 0 and block.prev_hash != self.blocks[i - 1].hash:
+                return False
+        return True
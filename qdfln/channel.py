@@ -0,0 +1,127 @@
+"""
+Authenticated channels for gradient payloads.
+
+A SecureChannel wraps one client<->validator session key in an AEAD
+(AES-256-GCM or ChaCha20-Poly1305). The cipher object is built once per key
+and reused for every packet. A nonce is a 4-byte prefix followed by a 64-bit
+message counter. The prefix packs the direction (top bit) and the channel
+epoch, the number of the channel opened on this session key. Senders take
+the epoch from KeyStore.open_channel, which persists it with the key, so a
+restarted process or a second client object on the same key never repeats
+a nonce. Payloads can be encrypted into and decrypted from
+caller-provided buffers, which lets the wire format write the ciphertext
+straight into the packet.
+
+The AEAD tag authenticates the plaintext and the associated data, so the
+receiving side needs no separate hash of the gradient.
+"""
+import base64
+import struct
+import threading
+from typing import Dict, Tuple, Union
+
+from cryptography.hazmat.primitives.ciphers.aead import AESGCM, ChaCha20Poly1305
+
+NONCE_SIZE = 12
+TAG_SIZE = 16
+PREFIX_SIZE = 4
+# Direction bit of the nonce prefix.
+CLIENT_TO_VALIDATOR = 0
+VALIDATOR_TO_CLIENT = 1
+MAX_EPOCH = (1 << 31) - 1
+
+_CIPHERS = {"aes-gcm": AESGCM, "chacha20-poly1305": ChaCha20Poly1305}
+# Wire flag bit for each cipher (see wire.py).
+CIPHER_FLAGS = {"aes-gcm": 0, "chacha20-poly1305": 1}
+CIPHER_NAMES = {flag: name for name, flag in CIPHER_FLAGS.items()}
+
+_PREFIX = struct.Struct("!I")
+_COUNTER = struct.Struct("!Q")
+
+Buffer = Union[bytes, bytearray, memoryview]
+
+
+def raw_key(key: bytes) -> bytes:
+    """32 raw key bytes from a session key, which may be base64 (derive_fernet_key) or raw."""
+    if len(key) == 32:
+        return bytes(key)
+    return base64.urlsafe_b64decode(key)
+
+
+def nonce_prefix(epoch: int, direction: int = CLIENT_TO_VALIDATOR) -> bytes:
+    if not 0 <= epoch <= MAX_EPOCH:
+        raise OverflowError("Channel epochs exhausted; rotate the session key")
+    return _PREFIX.pack(direction << 31 | epoch)
+
+
+class SecureChannel:
+    def __init__(self, key: bytes, cipher: str = "aes-gcm", epoch: int = 0, direction: int = CLIENT_TO_VALIDATOR):
+        """
+        Only one channel per (key, direction, epoch) may encrypt. Receivers
+        can use any epoch, since the nonce travels with the ciphertext.
+        """
+        if cipher not in _CIPHERS:
+            raise ValueError(f"Unknown cipher {cipher!r}; choose from {sorted(_CIPHERS)}")
+        self.cipher = cipher
+        self.flag = CIPHER_FLAGS[cipher]
+        self.epoch = epoch
+        self._aead = _CIPHERS[cipher](raw_key(key))
+        self._prefix = nonce_prefix(epoch, direction)
+        self._counter = 0
+        self._lock = threading.Lock()
+
+    def next_nonce(self) -> bytes:
+        with self._lock:
+            if self._counter >= 1 << 64:
+                raise OverflowError("Nonce counter exhausted; rotate the session key")
+            counter = self._counter
+            self._counter += 1
+        return self._prefix + _COUNTER.pack(counter)
+
+    def encrypt(self, data: Buffer, aad: Buffer = b"") -> Tuple[bytes, bytes]:
+        """Returns (nonce, ciphertext with tag)."""
+        nonce = self.next_nonce()
+        return nonce, self._aead.encrypt(nonce, data, aad)
+
+    def encrypt_into(self, data: Buffer, aad: Buffer, out: Buffer) -> bytes:
+        """Write ciphertext and tag (len(data) + TAG_SIZE bytes) into `out`; returns the nonce."""
+        nonce = self.next_nonce()
+        self._aead.encrypt_into(nonce, data, aad, out)
+        return nonce
+
+    def decrypt(self, nonce: Buffer, ciphertext: Buffer, aad: Buffer = b"") -> bytes:
+        """Raises cryptography's InvalidTag if the payload or `aad` was tampered with."""
+        return self._aead.decrypt(nonce, ciphertext, aad)
+
+    def decrypt_into(self, nonce: Buffer, ciphertext: Buffer, aad: Buffer, out: Buffer) -> None:
+        """Write the plaintext (len(ciphertext) - TAG_SIZE bytes) into `out`."""
+        self._aead.decrypt_into(nonce, ciphertext, aad, out)
+
+
+class SessionChannels:
+    """
+    Receiving channels for one session key, one per cipher, built on first
+    use. The holder of the key keeps this object next to it, so replacing
+    or rotating the key releases the cipher objects with it. Pickles as the
+    bare key, so process-pool workers build their own.
+    """
+
+    def __init__(self, key: bytes):
+        self.key = key
+        self._channels: Dict[str, SecureChannel] = {}
+
+    def get(self, cipher: str = "aes-gcm") -> SecureChannel:
+        channel = self._channels.get(cipher)
+        if channel is None:
+            channel = self._channels[cipher] = SecureChannel(self.key, cipher)
+        return channel
+
+    def __reduce__(self):
+        return SessionChannels, (self.key,)
+
+
+def channel_for(key: Union[bytes, SessionChannels], cipher: str = "aes-gcm") -> SecureChannel:
+    """A receiving channel: the cached one of a SessionChannels, or a new one for a bare key."""
+    if isinstance(key, SessionChannels):
+        return key.get(cipher)
+    return SecureChannel(key, cipher)
@@ -1,11 +1,16 @@
-from typing import List, Dict
+import base64
+from typing import List, Dict, Optional, Tuple, Union
 
 import torch
 import torch.nn as nn
-import torch.optim as optim
-from cryptography.fernet import Fernet
 
-from .crypto_utils import hash_bytes, pqc_sig_generate_keypair, pqc_sig_sign
+from . import wire
+from .channel import SecureChannel
+from .compression import Compressor, decompress
+from .crypto_utils import CryptoSuite, DEFAULT_SUITE
+from .masking import PairwiseMasking
+from .metrics import SIGN_SECONDS
+from .models import flat_params, make_model, parameter_vector
 
 
 USE_DP = False
@@ -14,6 +19,10 @@ DP_NOISE_STD = 0.05
 
 
 def flatten_gradients(model: nn.Module) -> torch.Tensor:
+    """The gradient buffer itself for flattened models (see models.py), else a concatenated copy."""
+    flat = flat_params(model)
+    if flat is not None:
+        return flat.grad
     grads = []
     for p in model.parameters():
         grads.append(p.grad.view(-1))
@@ -30,38 +39,86 @@ def apply_dp_noise(g_vec: torch.Tensor) -> torch.Tensor:
 
 
 class Client:
-    def __init__(self, client_id: str, X_local, y_local, input_dim: int):
+    def __init__(
+        self,
+        client_id: str,
+        X_local,
+        y_local,
+        input_dim: int,
+        sig_keypair: Optional[Tuple[bytes, bytes]] = None,
+        suite: Optional[CryptoSuite] = None,
+        model: str = "logreg",
+        model_options: Optional[Dict] = None,
+    ):
         self.id = client_id
-        self.X = torch.tensor(X_local, dtype=torch.float32)
-        self.y = torch.tensor(y_local, dtype=torch.float32)
-        self.model = nn.Linear(input_dim, 1)
+        # float32 arrays (e.g. dataset partitions) are shared, not copied.
+        self.X = torch.as_tensor(X_local, dtype=torch.float32)
+        self.y = torch.as_tensor(y_local, dtype=torch.float32)
+        self.input_dim = input_dim
+        self.set_model(model, model_options)
         self.qkd_keys: Dict[str, bytes] = {}
-        self.sig_public_key, self.sig_secret_key = pqc_sig_generate_keypair()
-        self.mask_vec = torch.randn_like(self.get_param_vector()) * 0.01
+        # One AEAD channel per validator, rebuilt only when its session key changes.
+        self.channels: Dict[str, SecureChannel] = {}
+        self.suite = suite or DEFAULT_SUITE
+        if sig_keypair is None:
+            sig_keypair = self.suite.sig_generate_keypair()
+        self.sig_public_key, self.sig_secret_key = sig_keypair
+        self.sig_public_key_hex = self.sig_public_key.hex()
+        self.sig_public_key_fingerprint = wire.fingerprint(self.sig_public_key)
+        # Shared pairwise masking; None sends gradients unmasked.
+        self.masking: Optional[PairwiseMasking] = None
+        # Payload compression (see compression.py); None sends raw float32.
+        self.compressor: Optional[Compressor] = None
+        # Last signed payload, kept so a referee can recompute disputed aggregate chunks.
+        self.last_signed: Optional[Dict] = None
+
+    def set_model(self, name: str = "logreg", options: Optional[Dict] = None) -> None:
+        """Replace the local model with a freshly built, flattened one from the model registry."""
+        self.model_name = name
+        self.model_options = dict(options or {})
+        self.model = make_model(name, self.input_dim, **(options or {}))
+        self.flat = flat_params(self.model)
 
     def get_param_vector(self) -> torch.Tensor:
-        params = [p.data.view(-1) for p in self.model.parameters()]
-        return torch.cat(params)
+        """The live parameter buffer; clone it to keep a snapshot."""
+        return self.flat.data
 
     def load_global_model(self, global_model: nn.Module):
-        for p_self, p_global in zip(self.model.parameters(), global_model.parameters()):
-            p_self.data = p_global.data.clone()
-
-    def set_symmetric_key_for_validator(self, validator_id: str, key: bytes):
+        self.flat.load_(parameter_vector(global_model))
+
+    def needs_channel(self, validator_id: str, key: bytes, cipher: str = "aes-gcm") -> bool:
+        """True unless the channel to `validator_id` already runs on `key` with `cipher`."""
+        channel = self.channels.get(validator_id)
+        return self.qkd_keys.get(validator_id) != key or channel is None or channel.cipher != cipher
+
+    def set_symmetric_key_for_validator(
+        self, validator_id: str, key: bytes, cipher: str = "aes-gcm", epoch: Optional[int] = None
+    ):
+        """
+        Open a channel on `key` at `epoch` (see KeyStore.open_channel). Without
+        an epoch the current channel is kept if it matches, else epoch 0 is used.
+        """
+        if epoch is not None or self.needs_channel(validator_id, key, cipher):
+            self.channels[validator_id] = SecureChannel(key, cipher, epoch or 0)
         self.qkd_keys[validator_id] = key
 
     def local_train_and_compute_gradient(self, epochs: int = 1, lr: float = 0.1) -> torch.Tensor:
-        optimizer = optim.SGD(self.model.parameters(), lr=lr)
-        loss_fn = nn.BCEWithLogLogitsLoss() if False else nn.BCEWithLogitsLoss()
+        """
+        Plain SGD on the flat buffers, then the gradient at the trained
+        weights. Without DP the result is a view of the gradient buffer,
+        valid until the next call.
+        """
+        loss_fn = nn.BCEWithLogitsLoss()
 
         for _ in range(epochs):
-            optimizer.zero_grad()
+            self.flat.zero_grad()
             logits = self.model(self.X).squeeze(-1)
             loss = loss_fn(logits, self.y)
             loss.backward()
-            optimizer.step()
+            with torch.no_grad():
+                self.flat.data.sub_(lr * self.flat.grad)
 
-        self.model.zero_grad()
+        self.flat.zero_grad()
         logits = self.model(self.X).squeeze(-1)
         loss = loss_fn(logits, self.y)
         loss.backward()
@@ -70,30 +127,96 @@ class Client:
             g_vec = apply_dp_noise(g_vec)
         return g_vec.detach()
 
-    def mask_gradient(self, g_vec: torch.Tensor) -> torch.Tensor:
-        return g_vec + self.mask_vec
-
-    def create_secure_packet_for_validator(self, validator_id: str, g_vec: torch.Tensor) -> Dict:
+    def mask_gradient(self, g_vec: torch.Tensor, round_id: int = 0) -> torch.Tensor:
+        if self.masking is None:
+            return g_vec
+        return g_vec + self.masking.mask(self.id, round_id)
+
+    def sign_gradient(self, g_vec: torch.Tensor, round_id: int = 0) -> Dict:
+        """Mask, serialize (compressed if configured) and sign a gradient once for every validator."""
+        masked = self.mask_gradient(g_vec, round_id)
+        if self.compressor is None:
+            g_bytes = masked.numpy().tobytes()
+        else:
+            g_bytes = self.compressor.compress(masked)
+        with SIGN_SECONDS.time():
+            signature = self.suite.sign(self.sig_secret_key, g_bytes)
+        self.last_signed = {
+            "g_bytes": g_bytes,
+            "compression": self.compressor.name if self.compressor is not None else None,
+            "signature": signature.hex(),
+            "signature_bytes": signature,
+        }
+        return self.last_signed
+
+    def sent_gradient(self) -> Optional[torch.Tensor]:
+        """The dense (masked) gradient validators decode from the last signed payload."""
+        if self.last_signed is None:
+            return None
+        g_bytes = self.last_signed["g_bytes"]
+        if self.last_signed["compression"] is not None:
+            return torch.from_numpy(decompress(g_bytes))
+        return torch.frombuffer(bytearray(g_bytes), dtype=torch.float32)
+
+    def create_secure_packet_for_validator(
+        self, validator_id: str, g_vec: torch.Tensor, signed: Optional[Dict] = None, round_id: int = 0
+    ) -> Dict:
         if validator_id not in self.qkd_keys:
             raise ValueError(f"No QKD key for validator {validator_id}")
 
-        masked = self.mask_gradient(g_vec)
-        g_bytes = masked.numpy().tobytes()
-
-        key = self.qkd_keys[validator_id]
-        f = Fernet(key)
-        token = f.encrypt(g_bytes)
+        if signed is None:
+            signed = self.sign_gradient(g_vec, round_id)
+        g_bytes = signed["g_bytes"]
 
-        h = hash_bytes(g_bytes)
-        signature = pqc_sig_sign(self.sig_secret_key, g_bytes)
+        channel = self.channels[validator_id]
+        nonce, ciphertext = channel.encrypt(g_bytes, wire.dict_packet_aad(self.id, validator_id, round_id))
 
         return {
             "client_id": self.id,
             "validator_id": validator_id,
-            "encrypted_gradient": token.decode("utf-8"),
-            "hash": h,
-            "signature": signature.hex(),
-            "sig_public_key": self.sig_public_key.hex(),
+            "round_id": round_id,
+            "cipher": channel.cipher,
+            "compression": signed["compression"],
+            "encrypted_gradient": base64.b64encode(nonce + ciphertext).decode("ascii"),
+            "signature": signed["signature"],
+            "sig_public_key": self.sig_public_key_hex,
             "length": len(g_bytes),
         }
 
+    def create_secure_packets(
+        self,
+        validator_ids: List[str],
+        g_vec: torch.Tensor,
+        wire_format: str = "dict",
+        round_id: int = 0,
+    ) -> Dict[str, Union[Dict, bytes]]:
+        """
+        Sign the masked gradient once and fan it out as one envelope per
+        validator, either as dicts or as binary packets (see wire.py).
+        """
+        signed = self.sign_gradient(g_vec, round_id)
+        if wire_format == "binary":
+            return {
+                vid: self.create_binary_packet_for_validator(vid, signed, round_id)
+                for vid in validator_ids
+            }
+        if wire_format != "dict":
+            raise ValueError(f"Unknown wire format {wire_format}")
+        return {
+            vid: self.create_secure_packet_for_validator(vid, g_vec, signed, round_id)
+            for vid in validator_ids
+        }
+
+    def create_binary_packet_for_validator(self, validator_id: str, signed: Dict, round_id: int = 0) -> bytes:
+        if validator_id not in self.qkd_keys:
+            raise ValueError(f"No QKD key for validator {validator_id}")
+        return wire.encode_packet(
+            self.id,
+            validator_id,
+            round_id,
+            signed["g_bytes"],
+            self.channels[validator_id],
+            signed["signature_bytes"],
+            self.sig_public_key_fingerprint,
+            compressed=signed["compression"] is not None,
+        )
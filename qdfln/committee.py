@@ -0,0 +1,81 @@
+"""
+Committee (shard) assignment.
+
+Instead of sending every gradient to every validator, clients are dealt
+into `num_shards` shards and each shard is served by a committee of
+`committee_size` validators. Each client then sends k packets instead of
+V, so round work is O(C x k). Consensus is reached per shard among the
+committee's stake (see BlockchainSim.check_shard_consensus_and_update).
+
+The assignment is a pure function of a seed, which is the chain head hash
+and the round id. Every participant can recompute it, and it changes
+every block. Committees are sampled without replacement with probability
+proportional to stake (Efraimidis-Spirakis keys u^(1/w), with u taken from
+sha256). Validators slashed to zero stake are never picked. Larger
+committees tolerate more Byzantine members per shard.
+"""
+import hashlib
+import math
+from typing import Dict, List, Optional, Sequence
+
+
+def _uniform(seed: bytes, *parts: str) -> float:
+    """Deterministic uniform in (0, 1) from the seed and `parts`."""
+    h = hashlib.sha256(seed + "|".join(parts).encode("utf-8")).digest()
+    return (int.from_bytes(h[:8], "big") + 1) / (2**64 + 2)
+
+
+def weighted_sample(stakes: Dict[str, float], k: int, seed: bytes, tag: str = "") -> List[str]:
+    """`k` distinct ids drawn with probability proportional to stake, in draw order."""
+    candidates = [(vid, s) for vid, s in stakes.items() if s > 0]
+    keys = sorted(
+        ((math.log(_uniform(seed, tag, vid)) / s, vid) for vid, s in candidates),
+        reverse=True,
+    )
+    return [vid for _, vid in keys[:k]]
+
+
+class CommitteeAssignment:
+    def __init__(self, shards: List[List[str]], committees: List[List[str]]):
+        self.shards = shards
+        self.committees = committees
+        self.client_shard = {cid: s for s, members in enumerate(shards) for cid in members}
+
+    def __len__(self) -> int:
+        return len(self.shards)
+
+    def validators_for(self, client_id: str) -> List[str]:
+        return self.committees[self.client_shard[client_id]]
+
+    def to_dict(self) -> Dict[str, List[List[str]]]:
+        return {"shards": self.shards, "committees": self.committees}
+
+
+def round_seed(head_hash: str, round_id: int) -> bytes:
+    return hashlib.sha256(f"{head_hash}|{round_id}".encode("utf-8")).digest()
+
+
+def assign_committees(
+    client_ids: Sequence[str],
+    stakes: Dict[str, float],
+    committee_size: int,
+    seed: bytes,
+    num_shards: Optional[int] = None,
+) -> CommitteeAssignment:
+    """
+    Deal clients into `num_shards` balanced shards (default: one per
+    `committee_size` validators) in seeded-hash order, and draw a
+    stake-weighted committee for each shard.
+    """
+    eligible = sum(1 for s in stakes.values() if s > 0)
+    if eligible == 0:
+        raise ValueError("No validator has stake left to form a committee")
+    committee_size = max(1, min(committee_size, eligible))
+    if num_shards is None:
+        num_shards = max(1, eligible // committee_size)
+    num_shards = max(1, min(num_shards, len(client_ids)))
+
+    order = sorted(client_ids, key=lambda cid: _uniform(seed, "client", cid))
+    shards = [order[s::num_shards] for s in range(num_shards)]
+    committees = [weighted_sample(stakes, committee_size, seed, f"shard{s}") for s in range(num_shards)]
+    return CommitteeAssignment(shards, committees)
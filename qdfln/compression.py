@@ -0,0 +1,180 @@
+"""
+Gradient compression between local training and packet creation.
+
+A compressor turns a client's float32 gradient into a self-describing
+payload, which is what gets signed and encrypted:
+
+    codec u8 | grad_dim u32 | body
+
+    fp16    D float16 values
+    int8    float32 scale, D int8 values (symmetric, scale = max|g| / 127)
+    sparse  k u32, k uint32 indices, k float32 values
+
+"topk" keeps the k largest-magnitude coordinates and "randk" keeps k random
+ones (k = ratio * D). Both carry the unsent remainder into the next round
+as a per-client error-feedback residual, so no update is permanently lost.
+Compressors are stateful and belong to one client.
+
+Quantized payloads keep every coordinate, so pairwise masks still cancel
+(up to quantization error). Sparse payloads only carry the kept
+coordinates and cannot be combined with masking.
+"""
+import inspect
+import struct
+from typing import Callable, Dict, Optional, Tuple
+
+import numpy as np
+import torch
+
+CODEC_FP16 = 1
+CODEC_INT8 = 2
+CODEC_SPARSE = 3
+
+_HEADER = struct.Struct("!BI")
+_SCALE = struct.Struct("<f")
+_COUNT = struct.Struct("<I")
+
+COMPRESSORS: Dict[str, Callable[..., "Compressor"]] = {}
+
+
+class CompressionError(ValueError):
+    pass
+
+
+def register_compressor(name: str):
+    def decorator(cls):
+        COMPRESSORS[name] = cls
+        cls.name = name
+        return cls
+    return decorator
+
+
+def make_compressor(name: str, grad_dim: int, **options) -> "Compressor":
+    """Build the compressor registered as `name`, passing only the options it accepts."""
+    if name not in COMPRESSORS:
+        raise ValueError(f"Unknown compression {name!r}; choose from {sorted(COMPRESSORS)}")
+    factory = COMPRESSORS[name]
+    params = inspect.signature(factory).parameters
+    accepted = {k: v for k, v in options.items() if k in params}
+    return factory(grad_dim, **accepted)
+
+
+def decompress(payload: bytes, grad_dim: Optional[int] = None) -> np.ndarray:
+    """Dense float32 gradient from a payload; raises CompressionError if it is malformed."""
+    if len(payload) < _HEADER.size:
+        raise CompressionError("Payload shorter than header")
+    codec, dim = _HEADER.unpack_from(payload, 0)
+    if grad_dim is not None and dim != grad_dim:
+        raise CompressionError(f"Payload is {dim}-dim, expected {grad_dim}")
+    body = memoryview(payload)[_HEADER.size :]
+
+    if codec == CODEC_FP16:
+        if len(body) != 2 * dim:
+            raise CompressionError("fp16 body length does not match header")
+        return np.frombuffer(body, dtype="<f2").astype(np.float32)
+    if codec == CODEC_INT8:
+        if len(body) != _SCALE.size + dim:
+            raise CompressionError("int8 body length does not match header")
+        (scale,) = _SCALE.unpack_from(body, 0)
+        return np.frombuffer(body, dtype=np.int8, offset=_SCALE.size).astype(np.float32) * np.float32(scale)
+    if codec == CODEC_SPARSE:
+        if len(body) < _COUNT.size:
+            raise CompressionError("Sparse body shorter than its count")
+        (k,) = _COUNT.unpack_from(body, 0)
+        if len(body) != _COUNT.size + 8 * k:
+            raise CompressionError("Sparse body length does not match its count")
+        idx = np.frombuffer(body, dtype="<u4", count=k, offset=_COUNT.size)
+        values = np.frombuffer(body, dtype="<f4", count=k, offset=_COUNT.size + 4 * k)
+        if k and int(idx.max()) >= dim:
+            raise CompressionError("Sparse index out of range")
+        out = np.zeros(dim, dtype=np.float32)
+        out[idx] = values
+        return out
+    raise CompressionError(f"Unknown codec {codec}")
+
+
+class Compressor:
+    name = ""
+    # True if payloads drop coordinates (incompatible with pairwise masking).
+    sparse = False
+
+    def __init__(self, grad_dim: int):
+        self.grad_dim = grad_dim
+        # Payload size and relative L2 error ||sent - g|| / ||g|| of the last compress() call.
+        self.last_bytes = 0
+        self.last_error = 0.0
+
+    def compress(self, g_vec: torch.Tensor) -> bytes:
+        payload, sent = self._encode(g_vec)
+        norm = float(torch.linalg.vector_norm(g_vec))
+        err = float(torch.linalg.vector_norm(sent - g_vec))
+        self.last_error = err / norm if norm > 0 else 0.0
+        self.last_bytes = len(payload)
+        return payload
+
+    def _encode(self, g_vec: torch.Tensor) -> Tuple[bytes, torch.Tensor]:
+        """(payload, the dense vector the receiver will decode)."""
+        raise NotImplementedError
+
+
+@register_compressor("fp16")
+class FP16Compressor(Compressor):
+    def _encode(self, g_vec: torch.Tensor) -> Tuple[bytes, torch.Tensor]:
+        half = g_vec.to(torch.float16)
+        return _HEADER.pack(CODEC_FP16, self.grad_dim) + half.numpy().tobytes(), half.float()
+
+
+@register_compressor("int8")
+class Int8Compressor(Compressor):
+    def _encode(self, g_vec: torch.Tensor) -> Tuple[bytes, torch.Tensor]:
+        max_abs = float(g_vec.abs().max()) if g_vec.numel() else 0.0
+        # Rounded to float32 first, since that is the scale the receiver sees.
+        scale = float(np.float32(max_abs / 127.0)) if max_abs > 0 else 1.0
+        q = torch.round(g_vec / scale).clamp_(-127, 127).to(torch.int8)
+        payload = _HEADER.pack(CODEC_INT8, self.grad_dim) + _SCALE.pack(scale) + q.numpy().tobytes()
+        return payload, q.float() * scale
+
+
+class _SparseCompressor(Compressor):
+    sparse = True
+
+    def __init__(self, grad_dim: int, ratio: float = 0.01, error_feedback: bool = True):
+        super().__init__(grad_dim)
+        self.k = max(1, min(grad_dim, int(round(ratio * grad_dim))))
+        self.error_feedback = error_feedback
+        self.residual = torch.zeros(grad_dim)
+
+    def _select(self, acc: torch.Tensor) -> torch.Tensor:
+        raise NotImplementedError
+
+    def _encode(self, g_vec: torch.Tensor) -> Tuple[bytes, torch.Tensor]:
+        acc = g_vec + self.residual if self.error_feedback else g_vec
+        idx = torch.sort(self._select(acc)).values
+        values = acc[idx]
+        sent = torch.zeros_like(acc)
+        sent[idx] = values
+        if self.error_feedback:
+            self.residual = acc - sent
+        payload = b"".join((
+            _HEADER.pack(CODEC_SPARSE, self.grad_dim),
+            _COUNT.pack(self.k),
+            idx.numpy().astype("<u4").tobytes(),
+            values.numpy().astype("<f4").tobytes(),
+        ))
+        return payload, sent
+
+
+@register_compressor("topk")
+class TopKCompressor(_SparseCompressor):
+    def _select(self, acc: torch.Tensor) -> torch.Tensor:
+        return torch.topk(acc.abs(), self.k, sorted=False).indices
+
+
+@register_compressor("randk")
+class RandKCompressor(_SparseCompressor):
+    def __init__(self, grad_dim: int, ratio: float = 0.01, error_feedback: bool = True, seed: int = 0):
+        super().__init__(grad_dim, ratio, error_feedback)
+        self.generator = torch.Generator().manual_seed(seed)
+
+    def _select(self, acc: torch.Tensor) -> torch.Tensor:
+        return torch.randperm(self.grad_dim, generator=self.generator)[: self.k]
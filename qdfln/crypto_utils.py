@@ -1,60 +1,253 @@
 import os
 import base64
 import hashlib
+import importlib
+import threading
+import time
+from collections import OrderedDict
+from typing import Dict, Optional, Union
 
-from pqcrypto.kem.ml_kem_512 import generate_keypair as kem_generate_keypair, encrypt as kem_encrypt, decrypt as kem_decrypt
-from pqcrypto.sign.sphincs_shake_256s_simple import (
-    generate_keypair as sig_generate_keypair,
-    sign as sig_sign,
-    verify as sig_verify,
-)
+from .metrics import VERIFY_SECONDS
 
 
 def hash_bytes(data: bytes) -> str:
     return hashlib.sha256(data).hexdigest()
 
 
-# --------- KEM (PQC) helpers ---------
+def derive_fernet_key(shared_secret: bytes) -> bytes:
+    """
+    Derive a 32-byte symmetric key from a shared secret, formatted
+    as a Fernet-compatible base64 key.
+    """
+    raw = hashlib.sha256(shared_secret).digest()
+    return base64.urlsafe_b64encode(raw)
 
 
-def pqc_kem_generate_keypair() -> tuple[bytes, bytes]:
-    """Return (public_key, secret_key) for ML-KEM-512."""
-    return kem_generate_keypair()
+# --------- Crypto suites ---------
+
+# Scheme name -> pqcrypto module.
+KEM_SCHEMES: Dict[str, str] = {
+    "ml-kem-512": "pqcrypto.kem.ml_kem_512",
+    "ml-kem-768": "pqcrypto.kem.ml_kem_768",
+    "ml-kem-1024": "pqcrypto.kem.ml_kem_1024",
+}
+SIG_SCHEMES: Dict[str, str] = {
+    "sphincs-shake-256s": "pqcrypto.sign.sphincs_shake_256s_simple",
+    "sphincs-shake-256f": "pqcrypto.sign.sphincs_shake_256f_simple",
+    "sphincs-shake-192f": "pqcrypto.sign.sphincs_shake_192f_simple",
+    "sphincs-shake-128f": "pqcrypto.sign.sphincs_shake_128f_simple",
+    "sphincs-sha2-128f": "pqcrypto.sign.sphincs_sha2_128f_simple",
+    "ml-dsa-44": "pqcrypto.sign.ml_dsa_44",
+    "ml-dsa-65": "pqcrypto.sign.ml_dsa_65",
+    "ml-dsa-87": "pqcrypto.sign.ml_dsa_87",
+    "falcon-512": "pqcrypto.sign.falcon_512",
+    "falcon-1024": "pqcrypto.sign.falcon_1024",
+}
+
+
+class CryptoSuite:
+    """
+    One KEM and one signature scheme. Clients, validators and the key store
+    take a suite instead of calling a fixed pqcrypto module. Suites pickle
+    by name, so they can be passed to process-pool workers.
+    """
 
+    def __init__(self, kem: str = "ml-kem-512", sig: str = "sphincs-shake-256s"):
+        if kem not in KEM_SCHEMES:
+            raise ValueError(f"Unknown KEM {kem!r}; choose from {sorted(KEM_SCHEMES)}")
+        if sig not in SIG_SCHEMES:
+            raise ValueError(f"Unknown signature scheme {sig!r}; choose from {sorted(SIG_SCHEMES)}")
+        self.kem_name = kem
+        self.sig_name = sig
+        self._kem = importlib.import_module(KEM_SCHEMES[kem])
+        self._sig = importlib.import_module(SIG_SCHEMES[sig])
 
-def pqc_kem_encapsulate(public_key: bytes) -> tuple[bytes, bytes]:
-    """Client side: return (ciphertext, shared_secret)."""
-    ciphertext, shared = kem_encrypt(public_key)
-    return ciphertext, shared
+    @property
+    def name(self) -> str:
+        return f"{self.kem_name}+{self.sig_name}"
 
+    def __repr__(self) -> str:
+        return f"CryptoSuite({self.kem_name!r}, {self.sig_name!r})"
 
-def pqc_kem_decapsulate(ciphertext: bytes, secret_key: bytes) -> bytes:
-    """Validator side: recover shared_secret from ciphertext."""
-    return kem_decrypt(secret_key, ciphertext)
+    def __reduce__(self):
+        return get_suite, (self.kem_name, self.sig_name)
 
+    @property
+    def sizes(self) -> Dict[str, int]:
+        return {
+            "kem_public_key": self._kem.PUBLIC_KEY_SIZE,
+            "kem_ciphertext": self._kem.CIPHERTEXT_SIZE,
+            "sig_public_key": self._sig.PUBLIC_KEY_SIZE,
+            "signature": self._sig.SIGNATURE_SIZE,
+        }
 
-def derive_fernet_key(shared_secret: bytes) -> bytes:
+    def kem_generate_keypair(self) -> tuple[bytes, bytes]:
+        return self._kem.generate_keypair()
+
+    def kem_encapsulate(self, public_key: bytes) -> tuple[bytes, bytes]:
+        """Client side: return (ciphertext, shared_secret)."""
+        return self._kem.encrypt(public_key)
+
+    def kem_decapsulate(self, ciphertext: bytes, secret_key: bytes) -> bytes:
+        """Validator side: recover shared_secret from ciphertext."""
+        return self._kem.decrypt(secret_key, ciphertext)
+
+    def sig_generate_keypair(self) -> tuple[bytes, bytes]:
+        return self._sig.generate_keypair()
+
+    def sign(self, secret_key: bytes, message: bytes) -> bytes:
+        return self._sig.sign(secret_key, message)
+
+    def verify(self, public_key: bytes, message: bytes, signature: bytes) -> bool:
+        return self._sig.verify(public_key, message, signature)
+
+
+_suites: Dict[tuple, CryptoSuite] = {}
+
+# Named presets for get_suite(name).
+SUITE_PRESETS: Dict[str, tuple] = {
+    "default": ("ml-kem-512", "sphincs-shake-256s"),
+    "sphincs-fast": ("ml-kem-512", "sphincs-shake-128f"),
+    "ml-dsa": ("ml-kem-768", "ml-dsa-65"),
+    "falcon": ("ml-kem-512", "falcon-512"),
+    "high": ("ml-kem-1024", "ml-dsa-87"),
+}
+
+
+def register_suite(name: str, kem: str, sig: str) -> None:
+    SUITE_PRESETS[name] = (kem, sig)
+
+
+def get_suite(kem: Union[str, CryptoSuite, None] = None, sig: Optional[str] = None) -> CryptoSuite:
     """
-    Derive a 32-byte symmetric key from a shared secret, formatted
-    as a Fernet-compatible base64 key.
+    get_suite() is the default suite, get_suite("ml-dsa") a preset, and
+    get_suite("ml-kem-768", "falcon-512") any KEM/signature pair. Suites are
+    shared per pair.
     """
-    raw = hashlib.sha256(shared_secret).digest()
-    return base64.urlsafe_b64encode(raw)
+    if isinstance(kem, CryptoSuite):
+        return kem
+    if sig is None:
+        preset = kem or "default"
+        if preset not in SUITE_PRESETS:
+            raise ValueError(f"Unknown crypto suite {preset!r}; choose from {sorted(SUITE_PRESETS)}")
+        kem, sig = SUITE_PRESETS[preset]
+    key = (kem, sig)
+    if key not in _suites:
+        _suites[key] = CryptoSuite(kem, sig)
+    return _suites[key]
+
+
+DEFAULT_SUITE = get_suite()
+
+
+def benchmark_suite(suite: CryptoSuite, iterations: int = 10, message_size: int = 4096) -> Dict[str, float]:
+    """Operations per second for keygen, sign, verify, encapsulate and decapsulate, plus sizes."""
+    message = os.urandom(message_size)
+
+    def rate(fn) -> float:
+        started = time.perf_counter()
+        for _ in range(iterations):
+            fn()
+        return iterations / (time.perf_counter() - started)
+
+    sig_pk, sig_sk = suite.sig_generate_keypair()
+    signature = suite.sign(sig_sk, message)
+    kem_pk, kem_sk = suite.kem_generate_keypair()
+    ciphertext, _ = suite.kem_encapsulate(kem_pk)
+    return {
+        "sig_keygen_per_s": rate(suite.sig_generate_keypair),
+        "sign_per_s": rate(lambda: suite.sign(sig_sk, message)),
+        "verify_per_s": rate(lambda: suite.verify(sig_pk, message, signature)),
+        "kem_keygen_per_s": rate(suite.kem_generate_keypair),
+        "encaps_per_s": rate(lambda: suite.kem_encapsulate(kem_pk)),
+        "decaps_per_s": rate(lambda: suite.kem_decapsulate(ciphertext, kem_sk)),
+        **suite.sizes,
+    }
+
+
+# --------- Default-suite helpers ---------
+
+
+def pqc_kem_generate_keypair() -> tuple[bytes, bytes]:
+    """Return (public_key, secret_key) for ML-KEM-512."""
+    return DEFAULT_SUITE.kem_generate_keypair()
 
 
-# --------- Signature (PQC) helpers ---------
+def pqc_kem_encapsulate(public_key: bytes) -> tuple[bytes, bytes]:
+    """Client side: return (ciphertext, shared_secret)."""
+    return DEFAULT_SUITE.kem_encapsulate(public_key)
+
+
+def pqc_kem_decapsulate(ciphertext: bytes, secret_key: bytes) -> bytes:
+    """Validator side: recover shared_secret from ciphertext."""
+    return DEFAULT_SUITE.kem_decapsulate(ciphertext, secret_key)
 
 
 def pqc_sig_generate_keypair() -> tuple[bytes, bytes]:
     """Return (public_key, secret_key) for SPHINCS+-SHAKE-256s."""
-    return sig_generate_keypair()
+    return DEFAULT_SUITE.sig_generate_keypair()
 
 
 def pqc_sig_sign(secret_key: bytes, message: bytes) -> bytes:
-    return sig_sign(secret_key, message)
+    return DEFAULT_SUITE.sign(secret_key, message)
 
 
 def pqc_sig_verify(public_key: bytes, message: bytes, signature: bytes) -> bool:
-    return sig_verify(public_key, message, signature)
+    return DEFAULT_SUITE.verify(public_key, message, signature)
+
 
+class SignatureCache:
+    """
+    Bounded LRU of (scheme, public key, digest, signature) entries that
+    already verified, so a validator never re-runs PQC signature
+    verification on a signature it has checked before. A hit skips the
+    check, so share a cache only between parties that trust each other.
+    """
 
+    def __init__(self, max_entries: int = 4096):
+        self.max_entries = max_entries
+        self._seen: "OrderedDict[bytes, None]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    @staticmethod
+    def _key(scheme: str, public_key: bytes, digest: str, signature: bytes) -> bytes:
+        h = hashlib.sha256()
+        # Length-prefixed, so fields cannot run into each other.
+        for part in (scheme.encode("utf-8"), public_key):
+            h.update(len(part).to_bytes(4, "big"))
+            h.update(part)
+        h.update(digest.encode("ascii"))
+        h.update(signature)
+        return h.digest()
+
+    def verify(
+        self,
+        public_key: bytes,
+        message: bytes,
+        signature: bytes,
+        suite: Optional[CryptoSuite] = None,
+    ) -> bool:
+        started = time.perf_counter()
+        suite = suite or DEFAULT_SUITE
+        # Always hashed here: a caller-supplied digest could vouch for a
+        # message other than the one being verified.
+        key = self._key(suite.sig_name, public_key, hash_bytes(message), signature)
+        with self._lock:
+            if key in self._seen:
+                self._seen.move_to_end(key)
+                self.hits += 1
+                VERIFY_SECONDS.observe(time.perf_counter() - started, "true")
+                return True
+            self.misses += 1
+
+        ok = suite.verify(public_key, message, signature)
+        VERIFY_SECONDS.observe(time.perf_counter() - started, "false")
+        if not ok:
+            return False
+        with self._lock:
+            self._seen[key] = None
+            if len(self._seen) > self.max_entries:
+                self._seen.popitem(last=False)
+        return True
@@ -0,0 +1,266 @@
+"""
+Dataset loading and client partitioning.
+
+`load_dataset` reads CSV (plain or inside a ZIP archive), .npy/.npz and
+Parquet files into one contiguous float32 feature matrix and label vector.
+Each file is parsed once per process; with a `cache_dir` the arrays are
+also written as .npy files and memory-mapped on later loads, so pandas is
+skipped entirely after the first run.
+
+Partitioners assign every sample an owner. `partition` then gathers the
+samples grouped by owner in a single copy, and each client gets
+contiguous slices (views) of that array.
+"""
+import hashlib
+import io
+import json
+import os
+import threading
+import zipfile
+from typing import Dict, List, Optional, Sequence, Tuple
+
+import numpy as np
+import pandas as pd
+
+LABEL_COLUMNS = ("label", "class", "y", "target")
+GROUP_COLUMN = "client_id"
+
+
+class Dataset:
+    def __init__(
+        self,
+        X: np.ndarray,
+        y: np.ndarray,
+        feature_names: Optional[List[str]] = None,
+        groups: Optional[np.ndarray] = None,
+    ):
+        self.X = X
+        self.y = y
+        self.feature_names = feature_names or [f"x{i}" for i in range(X.shape[1])]
+        # Per-sample owner column (e.g. client_id) used by the "column" partitioner.
+        self.groups = groups
+
+    @property
+    def input_dim(self) -> int:
+        return self.X.shape[1]
+
+    def __len__(self) -> int:
+        return self.X.shape[0]
+
+
+_cache: Dict[tuple, Dataset] = {}
+_cache_lock = threading.Lock()
+
+
+def _has_header(first_line: str) -> bool:
+    try:
+        [float(field) for field in first_line.strip().split(",")]
+    except ValueError:
+        return True
+    return False
+
+
+def _read_csv(stream: io.BufferedIOBase, names: Optional[Sequence[str]]) -> pd.DataFrame:
+    raw = stream.read()
+    first_line = raw.split(b"\n", 1)[0].decode("latin-1")
+    header = "infer" if names is None and _has_header(first_line) else None
+    df = pd.read_csv(io.BytesIO(raw), header=header, names=names, encoding="latin-1")
+    df.columns = [str(c) for c in df.columns]
+    return df
+
+
+def _read_frame(path: str, names: Optional[Sequence[str]]) -> pd.DataFrame:
+    ext = os.path.splitext(path)[1].lower()
+    if ext == ".parquet":
+        return pd.read_parquet(path)
+    if zipfile.is_zipfile(path):
+        with zipfile.ZipFile(path) as archive:
+            members = [
+                m for m in archive.namelist()
+                if m.lower().endswith((".csv", ".txt")) and not m.startswith("__MACOSX")
+            ]
+            if not members:
+                raise ValueError(f"No CSV member in archive {path}")
+            with archive.open(members[0]) as f:
+                return _read_csv(f, names)
+    with open(path, "rb") as f:
+        return _read_csv(f, names)
+
+
+def _from_frame(
+    df: pd.DataFrame,
+    label_column: Optional[str],
+    feature_columns: Optional[Sequence[str]],
+    group_column: Optional[str],
+) -> Dataset:
+    if label_column is None:
+        label_column = next((c for c in df.columns if c.lower() in LABEL_COLUMNS), df.columns[-1])
+    if group_column is None and GROUP_COLUMN in df.columns:
+        group_column = GROUP_COLUMN
+    if feature_columns is None:
+        feature_columns = [c for c in df.columns if c not in (label_column, group_column)]
+    X = np.ascontiguousarray(df[list(feature_columns)].to_numpy(dtype=np.float32))
+    y = np.ascontiguousarray(df[label_column].to_numpy(dtype=np.float32))
+    groups = df[group_column].astype(str).to_numpy() if group_column else None
+    return Dataset(X, y, list(feature_columns), groups)
+
+
+def _from_arrays(path: str, label_column: Optional[int]) -> Dataset:
+    if path.lower().endswith(".npz"):
+        with np.load(path) as arrays:
+            X, y = arrays["X"], arrays["y"]
+            groups = arrays["groups"].astype(str) if "groups" in arrays else None
+    else:
+        # A float32 .npy is mapped, not read; labels are one of its columns.
+        data = np.load(path, mmap_mode="r")
+        col = data.shape[1] - 1 if label_column is None else int(label_column) % data.shape[1]
+        y = data[:, col]
+        X = data[:, :-1] if col == data.shape[1] - 1 else np.delete(data, col, axis=1)
+        groups = None
+    X = np.ascontiguousarray(X, dtype=np.float32)
+    y = np.ascontiguousarray(y, dtype=np.float32)
+    return Dataset(X, y, groups=groups)
+
+
+def _cache_paths(cache_dir: str, key: tuple) -> Dict[str, str]:
+    digest = hashlib.sha256(repr(key).encode("utf-8")).hexdigest()[:16]
+    base = os.path.join(cache_dir, digest)
+    return {"X": base + ".X.npy", "y": base + ".y.npy", "meta": base + ".json", "groups": base + ".groups.npy"}
+
+
+def _load_cached(paths: Dict[str, str]) -> Optional[Dataset]:
+    if not os.path.exists(paths["meta"]):
+        return None
+    with open(paths["meta"]) as f:
+        meta = json.load(f)
+    X = np.load(paths["X"], mmap_mode="r")
+    y = np.load(paths["y"], mmap_mode="r")
+    groups = np.load(paths["groups"]) if meta.get("groups") else None
+    return Dataset(X, y, meta["feature_names"], groups)
+
+
+def _store_cached(paths: Dict[str, str], ds: Dataset) -> None:
+    os.makedirs(os.path.dirname(paths["X"]), exist_ok=True)
+    np.save(paths["X"], ds.X)
+    np.save(paths["y"], ds.y)
+    if ds.groups is not None:
+        np.save(paths["groups"], ds.groups.astype("U"))
+    # The metadata file is written last and marks the entry as complete.
+    tmp = paths["meta"] + ".tmp"
+    with open(tmp, "w") as f:
+        json.dump({"feature_names": ds.feature_names, "groups": ds.groups is not None}, f)
+    os.replace(tmp, paths["meta"])
+
+
+def load_dataset(
+    path: str,
+    label_column=None,
+    feature_columns: Optional[Sequence[str]] = None,
+    names: Optional[Sequence[str]] = None,
+    group_column: Optional[str] = None,
+    cache_dir: Optional[str] = None,
+) -> Dataset:
+    """
+    Load `path` once per process (keyed by path, size and mtime). Headerless
+    CSVs get `names` if given, else integer column names; the label column
+    defaults to one named label/class/y/target, else the last column.
+    """
+    st = os.stat(path)
+    key = (
+        os.path.realpath(path), st.st_size, st.st_mtime_ns,
+        label_column, tuple(feature_columns or ()), tuple(names or ()), group_column,
+    )
+    with _cache_lock:
+        if key in _cache:
+            return _cache[key]
+
+        paths = _cache_paths(cache_dir, key) if cache_dir else None
+        ds = _load_cached(paths) if paths else None
+        if ds is None:
+            if path.lower().endswith((".npy", ".npz")):
+                ds = _from_arrays(path, label_column)
+            else:
+                ds = _from_frame(_read_frame(path, names), label_column, feature_columns, group_column)
+            if paths:
+                _store_cached(paths, ds)
+                ds = _load_cached(paths)
+        _cache[key] = ds
+        return ds
+
+
+def synthetic_dataset(n: int, input_dim: int, seed: int = 0) -> Dataset:
+    """Standard-normal features with labels drawn from a random logistic model."""
+    rng = np.random.default_rng(seed)
+    X = rng.standard_normal((n, input_dim), dtype=np.float32)
+    w = rng.standard_normal(input_dim).astype(np.float32)
+    probs = 1.0 / (1.0 + np.exp(-(X @ w)))
+    y = (rng.random(n) < probs).astype(np.float32)
+    return Dataset(X, y)
+
+
+# --------- Partitioners: each returns an owner index per sample ---------
+
+
+def iid_owners(n: int, num_clients: int, seed: int = 0) -> np.ndarray:
+    """Shuffle, then deal samples out in equal shares."""
+    owners = np.arange(n) % num_clients
+    np.random.default_rng(seed).shuffle(owners)
+    return owners
+
+
+def dirichlet_owners(y: np.ndarray, num_clients: int, alpha: float = 0.5, seed: int = 0) -> np.ndarray:
+    """Label-skewed non-IID split: each class is divided by Dirichlet(alpha) proportions."""
+    rng = np.random.default_rng(seed)
+    owners = np.empty(len(y), dtype=np.int64)
+    for label in np.unique(y):
+        idx = np.flatnonzero(y == label)
+        rng.shuffle(idx)
+        shares = rng.dirichlet(np.full(num_clients, alpha))
+        cuts = (np.cumsum(shares)[:-1] * len(idx)).astype(np.int64)
+        owners[idx] = np.repeat(np.arange(num_clients), np.diff(np.concatenate(([0], cuts, [len(idx)]))))
+    return owners
+
+
+def column_owners(groups: np.ndarray, client_ids: Sequence[str]) -> np.ndarray:
+    """Owner from a per-sample id column; samples of other ids get -1 and are dropped."""
+    lookup = {cid: i for i, cid in enumerate(client_ids)}
+    return np.fromiter((lookup.get(g, -1) for g in groups), dtype=np.int64, count=len(groups))
+
+
+def partition(
+    dataset: Dataset,
+    client_ids: Sequence[str],
+    scheme: str = "iid",
+    alpha: float = 0.5,
+    seed: int = 0,
+) -> Dict[str, Tuple[np.ndarray, np.ndarray]]:
+    """
+    Split `dataset` over `client_ids` by "iid", "dirichlet" or "column".
+    Samples are gathered in owner order once; each client gets views into
+    that copy. Clients that receive no samples are left out.
+    """
+    n, k = len(dataset), len(client_ids)
+    if scheme == "iid":
+        owners = iid_owners(n, k, seed)
+    elif scheme == "dirichlet":
+        owners = dirichlet_owners(dataset.y, k, alpha, seed)
+    elif scheme == "column":
+        if dataset.groups is None:
+            raise ValueError("Column partitioning needs a dataset with a group column")
+        owners = column_owners(dataset.groups, client_ids)
+    else:
+        raise ValueError(f"Unknown partition scheme {scheme!r}")
+
+    order = np.argsort(owners, kind="stable")
+    counts = np.bincount(owners[owners >= 0], minlength=k)
+    order = order[len(order) - counts.sum():]
+    X = dataset.X[order]
+    y = dataset.y[order]
+
+    parts: Dict[str, Tuple[np.ndarray, np.ndarray]] = {}
+    offsets = np.concatenate(([0], np.cumsum(counts)))
+    for i, cid in enumerate(client_ids):
+        lo, hi = offsets[i], offsets[i + 1]
+        if hi > lo:
+            parts[cid] = (X[lo:hi], y[lo:hi])
+    return parts
@@ -0,0 +1,709 @@
+import inspect
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, Dict, Iterator, List, Optional, Set, Union
+
+import torch
+
+from .aggregation import AGGREGATORS
+from .models import create_global_model, flat_params
+from .client import Client
+from .committee import CommitteeAssignment, assign_committees, round_seed
+from .compression import make_compressor
+from .validator import Validator
+from .blockchain import BlockchainSim
+from .crypto_utils import CryptoSuite, SignatureCache, get_suite
+from .keystore import KeyStore
+from .masking import DEFAULT_NEIGHBORS, PairwiseMasking
+from .merkle import locate_disputes
+from .metrics import COMPRESSED_BYTES_SAVED, HANDSHAKE_SECONDS, ROUNDS, StageTimer
+from .network import CHAIN_NODE, ExchangeStats, Network, RoundPolicy
+from .storage import FederationStore
+from .training import BatchedTrainer, supports_batched
+from .wire import packet_client_id
+
+
+def _supports_emoji() -> bool:
+    enc = sys.stdout.encoding or ""
+    return "UTF" in enc.upper()
+
+
+if _supports_emoji():
+    EMOJI_OK = "✅"
+    EMOJI_WARN = "⚠️"
+    EMOJI_VAL = "🛡️"
+    EMOJI_PQC = "🔐"
+else:
+    EMOJI_OK = "[OK]"
+    EMOJI_WARN = "[!]"
+    EMOJI_VAL = "[VAL]"
+    EMOJI_PQC = "[PQC]"
+
+
+GradientAttack = Callable[[torch.Tensor], torch.Tensor]
+
+
+def _scaled(g: torch.Tensor) -> torch.Tensor:
+    return g * 50.0
+
+
+def _negated(G: torch.Tensor) -> torch.Tensor:
+    return -G
+
+
+def _linear_aggregation(validator_kwargs: Optional[Dict[str, Any]]) -> bool:
+    """True if validators built with these kwargs aggregate with a linear rule."""
+    default = inspect.signature(Validator).parameters["agg_mode"].default
+    mode = (validator_kwargs or {}).get("agg_mode", default)
+    return getattr(AGGREGATORS.get(mode), "linear", False)
+
+
+def _attack_name(attack: GradientAttack) -> str:
+    return attack.__name__.lstrip("_")
+
+
+class Federation:
+    """
+    Owns the clients, validators, chain and global model of one DFLN run, so
+    reputation, stake, validator suspicion and keys carry over between rounds.
+    Each finalized round applies the agreed-upon G_t as an SGD step on θ.
+    """
+
+    def __init__(
+        self,
+        clients: List[Client],
+        input_dim: int,
+        model: str = "logreg",
+        model_options: Optional[Dict[str, Any]] = None,
+        validator_ids: Optional[List[str]] = None,
+        key_store: Optional[KeyStore] = None,
+        stake: Union[float, Dict[str, float]] = 10.0,
+        lr: float = 0.1,
+        malicious_client_id: Optional[str] = None,
+        malicious_validator_id: Optional[str] = None,
+        validator_kwargs: Optional[Dict[str, Any]] = None,
+        batched_training: bool = True,
+        wire_format: str = "binary",
+        cipher: str = "aes-gcm",
+        compression: Optional[str] = None,
+        compression_options: Optional[Dict[str, Any]] = None,
+        committee_size: Optional[int] = None,
+        num_shards: Optional[int] = None,
+        network: Optional[Network] = None,
+        round_policy: Optional[RoundPolicy] = None,
+        storage_dir: Optional[str] = None,
+        keep_checkpoints: Optional[int] = None,
+        mask_scale: Optional[float] = 0.01,
+        mask_neighbors: Optional[int] = DEFAULT_NEIGHBORS,
+        client_attacks: Optional[Dict[str, GradientAttack]] = None,
+        validator_attacks: Optional[Dict[str, GradientAttack]] = None,
+        crypto_suite: Union[str, CryptoSuite, None] = None,
+        shared_sig_cache: bool = False,
+    ):
+        """
+        Every validator verifies signatures on its own. `shared_sig_cache=True`
+        lets them share one verified-signature cache, which saves V - 1
+        verifications per packet but means each validator trusts the others'
+        checks. Use it only for benchmarks where all validators run honest code.
+        """
+        if validator_ids is None:
+            validator_ids = ["V1", "V2", "V3"]
+        self.clients = clients
+        self.input_dim = input_dim
+        self.key_store = key_store if key_store is not None else KeyStore()
+        self.lr = lr
+        self.malicious_client_id = malicious_client_id
+        self.malicious_validator_id = malicious_validator_id
+        # Per-id gradient manipulations; the single malicious ids keep their
+        # original behaviour (x50 gradient, negated aggregate).
+        self.client_attacks = dict(client_attacks or {})
+        self.validator_attacks = dict(validator_attacks or {})
+        if malicious_client_id is not None:
+            self.client_attacks.setdefault(malicious_client_id, _scaled)
+        if malicious_validator_id is not None:
+            self.validator_attacks.setdefault(malicious_validator_id, _negated)
+        self.wire_format = wire_format
+        # AEAD for gradient payloads: "aes-gcm" or "chacha20-poly1305" (see channel.py).
+        self.cipher = cipher
+        # Clients must already hold identities for this suite (see pipeline._build_clients).
+        self.suite = get_suite(crypto_suite)
+        for c in clients:
+            if c.suite.sig_name != self.suite.sig_name:
+                raise ValueError(
+                    f"Client {c.id} signs with {c.suite.sig_name}, federation uses {self.suite.sig_name}"
+                )
+
+        # Clients train the same registered architecture (see models.py); θ is one flat buffer.
+        self.model_name = model
+        self.global_model = create_global_model(input_dim, model, **(model_options or {}))
+        self.global_flat = flat_params(self.global_model)
+        self.grad_dim = len(self.global_flat)
+        for c in clients:
+            if c.model_name != model or c.model_options != dict(model_options or {}):
+                c.set_model(model, model_options)
+
+        # Pairwise masks cancel in the sum over clients; a falsy scale disables masking.
+        # mask_neighbors=None pairs every client with every other (O(C^2) handshakes).
+        # Masks can only be removed from a linear aggregate ("mean"), so other
+        # rules run unmasked whatever mask_scale says.
+        self.masking: Optional[PairwiseMasking] = None
+        if mask_scale and _linear_aggregation(validator_kwargs):
+            self.masking = PairwiseMasking(
+                [c.id for c in clients], self.grad_dim, scale=mask_scale, neighbors=mask_neighbors
+            )
+        for c in clients:
+            c.masking = self.masking
+
+        # Committee mode: each client sends to the k validators of its shard (see committee.py).
+        self.committee_size = committee_size
+        self.num_shards = num_shards
+
+        # Optional simulated transport for packets and votes (see network.py).
+        self.network = network
+        self.round_policy = round_policy if round_policy is not None else RoundPolicy()
+
+        # Per-client payload compression; sparse payloads would leave masks uncancelled.
+        self.compression = compression
+        if compression is not None:
+            options = dict(compression_options or {})
+            base_seed = options.pop("seed", 0)
+            for i, c in enumerate(clients):
+                c.compressor = make_compressor(compression, self.grad_dim, seed=base_seed + i, **options)
+                if c.compressor.sparse and self.masking is not None:
+                    raise ValueError(f"{compression!r} compression drops coordinates; set mask_scale=None")
+
+        shared = SignatureCache() if shared_sig_cache else None
+        self.validators = [
+            Validator(
+                vid, self.grad_dim, sig_cache=shared, masking=self.masking, suite=self.suite,
+                **(validator_kwargs or {}),
+            )
+            for vid in validator_ids
+        ]
+        for v in self.validators:
+            v.aggregator.reserve(len(clients))
+
+        self.chain = BlockchainSim()
+        for v in self.validators:
+            v_stake = stake.get(v.id, 0.0) if isinstance(stake, dict) else stake
+            self.chain.register_validator(v.id, stake=v_stake)
+        self.round_id = 0
+
+        self.store: Optional[FederationStore] = None
+        if storage_dir is not None:
+            self.store = FederationStore(storage_dir, keep_checkpoints=keep_checkpoints)
+            self.chain.block_store = self.store.blocks
+            if self.store.has_state():
+                self._resume()
+
+        # One stacked trainer for all clients when every model is logistic regression.
+        self.trainer: Optional[BatchedTrainer] = None
+        if batched_training and supports_batched(clients):
+            self.trainer = BatchedTrainer(clients)
+
+    def apply_update(self, G_t: torch.Tensor) -> None:
+        """θ_{t+1} = θ_t - lr * G_t, with G_t laid out like flatten_gradients."""
+        with torch.no_grad():
+            self.global_flat.data.sub_(self.lr * G_t)
+
+    def _checkpoint(self, round_id: int, aggregate: Optional[torch.Tensor]) -> None:
+        state = {
+            "chain": self.chain.export_state(),
+            "validators": {
+                v.id: {"client_suspicion": dict(v.client_suspicion)} for v in self.validators
+            },
+        }
+        ref_grads = {v.id: v.ref_grad for v in self.validators if v.ref_grad is not None}
+        self.store.save_round(
+            round_id,
+            state,
+            self.global_flat.data,
+            aggregate=aggregate,
+            ref_grads=ref_grads,
+        )
+
+    def _resume(self) -> None:
+        """
+        Restore the last checkpoint. Blocks stored after it were finalized
+        but their G_t never reached a checkpointed model, so they are
+        truncated and those rounds run again.
+        """
+        state = self.store.load_state()
+        self.round_id = state["round_id"]
+        self.chain.load_state(state["chain"])
+        self.store.blocks.truncate(state["chain"]["height"])
+
+        model = self.store.load_model(state["round_id"])
+        if model is not None:
+            self.global_flat.load_(model)
+        ref_grads = self.store.load_ref_grads(state)
+        for v in self.validators:
+            saved = state["validators"].get(v.id, {})
+            v.client_suspicion = dict(saved.get("client_suspicion", {}))
+            if v.id in ref_grads:
+                v.ref_grad = ref_grads[v.id]
+
+    def iter_round(self) -> Iterator[Dict[str, Any]]:
+        """
+        Run one round as a stream of structured events (see format_event).
+        The last event is `round_finished` and carries the round result.
+        """
+        started = time.perf_counter()
+        timer = StageTimer()
+        self.round_id += 1
+        round_id = self.round_id
+        bc = self.chain
+        validator_ids = [v.id for v in self.validators]
+
+        yield {
+            "type": "round_started",
+            "round_id": round_id,
+            "kem": self.suite.kem_name,
+            "signature": self.suite.sig_name,
+            "cipher": self.cipher,
+        }
+
+        assignment: Optional[CommitteeAssignment] = None
+        if self.committee_size is not None:
+            assignment = assign_committees(
+                [c.id for c in self.clients],
+                {vid: bc.stake.get(vid, 0.0) for vid in validator_ids},
+                self.committee_size,
+                round_seed(bc.head_hash, round_id),
+                self.num_shards,
+            )
+            yield {"type": "committees", "round_id": round_id, **assignment.to_dict()}
+        # Validator ids each client sends its gradient to.
+        targets = {
+            c.id: assignment.validators_for(c.id) if assignment is not None else validator_ids
+            for c in self.clients
+        }
+        by_id = {v.id: v for v in self.validators}
+
+        # PQC KEM handshake: each validator has a long-lived KEM keypair and each
+        # client derives a shared secret with every validator it sends to, unless
+        # the key store still holds a valid session key for that pair.
+        yield {"type": "phase", "round_id": round_id, "phase": "handshake"}
+        for c in self.clients:
+            fresh = False
+            with timer.stage("handshake"):
+                for v in (by_id[vid] for vid in targets[c.id]):
+                    t0 = time.perf_counter()
+                    key_client, key_validator, is_fresh = self.key_store.handshake(c.id, v.id, self.suite)
+                    HANDSHAKE_SECONDS.observe(time.perf_counter() - t0, "true" if is_fresh else "false")
+                    fresh = fresh or is_fresh
+                    if c.needs_channel(v.id, key_client, self.cipher):
+                        epoch = self.key_store.open_channel(c.id, v.id, self.suite)
+                        c.set_symmetric_key_for_validator(v.id, key_client, self.cipher, epoch)
+                    v.set_qkd_key_for_client(c.id, key_validator)
+                    v.register_client_identity(c.id, c.sig_public_key)
+            yield {
+                "type": "handshake",
+                "round_id": round_id,
+                "client_id": c.id,
+                "validators": targets[c.id],
+                "fresh": fresh,
+            }
+        with timer.stage("handshake"):
+            # Client pairs on the masking graph agree on mask keys the same way.
+            if self.masking is not None:
+                for a, b in self.masking.pairs():
+                    key_a, _, _ = self.key_store.handshake(a, b, self.suite)
+                    self.masking.set_pair_key(a, b, key_a)
+            self.key_store.save()
+
+        yield {"type": "phase", "round_id": round_id, "phase": "training"}
+        client_grads: Dict[str, torch.Tensor] = {}
+        client_infos: List[Dict[str, Any]] = []
+        with timer.stage("training"):
+            for c in self.clients:
+                c.load_global_model(self.global_model)
+            if self.trainer is not None:
+                grad_rows = self.trainer.local_train_and_compute_gradients()
+            else:
+                grad_rows = [c.local_train_and_compute_gradient() for c in self.clients]
+        for c, g_vec in zip(self.clients, grad_rows):
+            attack = self.client_attacks.get(c.id)
+            if attack is not None:
+                g_vec = attack(g_vec)
+            client_grads[c.id] = g_vec
+            info = {
+                "id": c.id,
+                "grad_norm": round(float(torch.norm(g_vec)), 4),
+                "malicious": attack is not None,
+                "attack": _attack_name(attack) if attack is not None else None,
+            }
+            client_infos.append(info)
+            yield {"type": "client_trained", "round_id": round_id, **info}
+
+        validator_infos: List[Dict[str, Any]] = []
+        aggregates: Dict[str, torch.Tensor] = {}
+        # Committees[s] serves shards[s]; without committees there is one shard served by everyone.
+        shards = assignment.shards if assignment is not None else [[c.id for c in self.clients]]
+        committees = assignment.committees if assignment is not None else [validator_ids]
+        shard_votes: List[Dict[str, str]] = [{} for _ in shards]
+        shard_counts: List[Dict[str, int]] = [{} for _ in shards]
+        disputes: Dict[str, Dict[str, Any]] = {}
+        spared: Set[Any] = set()
+        with ThreadPoolExecutor() as pool:
+            # Signing runs in native code without the GIL, so clients sign in parallel.
+            with timer.stage("sign_encrypt"):
+                signed_packets = pool.map(
+                    lambda c: c.create_secure_packets(
+                        targets[c.id], client_grads[c.id], wire_format=self.wire_format, round_id=round_id
+                    ),
+                    self.clients,
+                )
+                outbox = [
+                    (c.id, vid, pkt) for c, packets in zip(self.clients, signed_packets) for vid, pkt in packets.items()
+                ]
+            compression_stats = self._compression_stats(targets)
+
+            network_stats: Optional[Dict[str, Any]] = None
+            if self.network is not None:
+                # Only what reaches a validator under the round policy is processed.
+                with timer.stage("network"):
+                    delivered, packet_stats = self.network.exchange(outbox, self.round_policy)
+                # Validators see their batch in client order, whatever the arrival order.
+                rank = {c.id: i for i, c in enumerate(self.clients)}
+                outbox = sorted(
+                    ((m.src, m.dst, m.payload) for msgs in delivered.values() for m in msgs),
+                    key=lambda item: rank[item[0]],
+                )
+                network_stats = {"packets": packet_stats.to_dict()}
+                yield {"type": "network", "round_id": round_id, "phase": "packets", **network_stats["packets"]}
+            # shard -> validator -> packets
+            packets_by_shard: List[Dict[str, List[Union[Dict, bytes]]]] = [
+                {vid: [] for vid in committee} for committee in committees
+            ]
+            for cid, vid, pkt in outbox:
+                shard = assignment.client_shard[cid] if assignment is not None else 0
+                packets_by_shard[shard][vid].append(pkt)
+            vote_stats = ExchangeStats()
+
+            yield {"type": "phase", "round_id": round_id, "phase": "aggregation"}
+            for shard, committee in enumerate(committees):
+                label = shard if assignment is not None else None
+                for vid in committee:
+                    v = by_id[vid]
+                    with timer.stage("validate"):
+                        v.reset_round(round_id)
+                        batch = packets_by_shard[shard][vid]
+                        accepted = v.process_packets(batch, executor=pool)
+                    for pkt, ok in zip(batch, accepted):
+                        cid = packet_client_id(pkt)
+                        yield {
+                            "type": "packet",
+                            "round_id": round_id,
+                            "validator_id": v.id,
+                            "client_id": cid,
+                            "accepted": ok,
+                            "reason": None if ok else v.rejections.get(cid),
+                        }
+
+                    with timer.stage("aggregate"):
+                        G_t = v.aggregate_gradients()
+                        attack = self.validator_attacks.get(v.id)
+                        is_malicious = attack is not None
+                        G_for_hash = attack(G_t) if is_malicious else G_t
+                        H_agg = v.compute_H_agg(G_for_hash)
+                        aggregates[H_agg] = G_for_hash
+                        shard_votes[shard][v.id] = H_agg
+                        shard_counts[shard][H_agg] = len(v.received_clients)
+                    info = {
+                        "id": v.id,
+                        "grad_norm": round(float(torch.norm(G_t)), 4),
+                        "H_agg": H_agg,
+                        "malicious": is_malicious,
+                        "shard": label,
+                    }
+                    validator_infos.append(info)
+                    yield {"type": "aggregate_submitted", "round_id": round_id, **info}
+
+                if self.network is not None:
+                    # Votes that miss the vote deadline never reach the chain.
+                    with timer.stage("network"):
+                        ballots = [(vid, CHAIN_NODE, h) for vid, h in shard_votes[shard].items()]
+                        delivered, stats = self.network.exchange(
+                            ballots, RoundPolicy(deadline_s=self.round_policy.vote_deadline_s)
+                        )
+                    shard_votes[shard] = {m.src: m.payload for m in delivered.get(CHAIN_NODE, [])}
+                    vote_stats.add(stats)
+                if assignment is None:
+                    with timer.stage("aggregate"):
+                        for vid, H_agg in shard_votes[shard].items():
+                            bc.submit_hash(round_id, vid, H_agg)
+                else:
+                    # Committee members still hold this shard's trees, so disputes are settled now.
+                    with timer.stage("consensus"):
+                        outcome = bc.shard_outcome(committee, shard_votes[shard])
+                        if outcome is not None:
+                            dissent = [vid for vid, h in shard_votes[shard].items() if h != outcome[0]]
+                            found = self._resolve_disputes(outcome[0], shard_votes[shard], dissent)
+                            disputes.update({f"{vid}/{shard}": d for vid, d in found.items()})
+                            spared.update((vid, shard) for vid, d in found.items() if not d["confirmed"])
+
+        consensus: Dict[str, Any] = {}
+        applied: Optional[torch.Tensor] = None
+        if assignment is None:
+            with timer.stage("consensus"):
+                # Disputes are settled before finality so that a dissenter whose
+                # fault the referee cannot confirm is spared the slash.
+                leader = bc.leading_hash(round_id)
+                if leader is not None:
+                    votes = bc.round_hashes.get(round_id, {})
+                    dissent = [vid for vid, h in votes.items() if h != leader]
+                    disputes = self._resolve_disputes(leader, votes, dissent)
+                    spared.update(vid for vid, d in disputes.items() if not d["confirmed"])
+                result = bc.check_consensus_and_update(round_id, spared=spared)
+            if result:
+                H_star, winning_stake, entries, fraudsters = result
+                total_stake = bc.total_stake
+                applied = aggregates[H_star]
+        else:
+            with timer.stage("consensus"):
+                result = bc.check_shard_consensus_and_update(round_id, committees, shard_votes, spared=spared)
+            if result:
+                H_star, winning_stake, total_stake, records, fraudsters = result
+                entries = {f"{vid}/{r['shard']}": h for r in records for vid, h in r["votes"].items()}
+                applied = self._combine_shards(records, aggregates, shard_counts)
+                consensus["shards"] = [
+                    {
+                        "shard": r["shard"],
+                        "committee": r["committee"],
+                        "clients": len(shards[r["shard"]]),
+                        "H_agg": r["H_agg"],
+                    }
+                    for r in records
+                ]
+        if result:
+            stake_pct = 100.0 * winning_stake / total_stake if total_stake > 0 else 0.0
+            consensus = {
+                "H_star": H_star,
+                "winning_stake": winning_stake,
+                "total_stake": total_stake,
+                "stake_pct": round(stake_pct, 1),
+                "entries": dict(entries),
+                "fraudsters": fraudsters,
+                "disputes": disputes,
+                "reputation": dict(bc.reputation),
+                "stake": dict(bc.stake),
+                "block_height": bc.height - 1,
+                "block_hash": bc.head_hash,
+                **consensus,
+            }
+            yield {"type": "consensus", "round_id": round_id, **consensus}
+
+            with timer.stage("update"):
+                self.apply_update(applied)
+            yield {"type": "model_updated", "round_id": round_id, "lr": self.lr}
+        else:
+            yield {"type": "no_consensus", "round_id": round_id}
+        with timer.stage("update"):
+            # Votes of a round that missed finality are never revisited.
+            bc.prune_open_rounds(round_id + 1)
+            if self.store is not None:
+                self._checkpoint(round_id, applied)
+        ROUNDS.inc("consensus" if result else "no_consensus")
+
+        duration = time.perf_counter() - started
+        if network_stats is not None:
+            network_stats["votes"] = vote_stats.to_dict()
+            simulated = network_stats["packets"]["elapsed_s"] + vote_stats.elapsed_s
+            network_stats["simulated_s"] = round(simulated, 4)
+            # Local work plus simulated network time, independent of time_scale.
+            network_stats["round_time_s"] = round(duration - timer.totals["network"] + simulated, 4)
+
+        yield {
+            "type": "round_finished",
+            "round_id": round_id,
+            "result": {
+                "round_id": round_id,
+                "clients": client_infos,
+                "validators": validator_infos,
+                "consensus": consensus,
+                "duration_s": round(duration, 4),
+                "timings": timer.report(),
+                "packets_sent": len(outbox),
+                "compression": compression_stats,
+                "network": network_stats,
+            },
+        }
+
+    @staticmethod
+    def _combine_shards(
+        records: List[Dict[str, Any]], aggregates: Dict[str, torch.Tensor], shard_counts: List[Dict[str, int]]
+    ) -> torch.Tensor:
+        """Mean of the finalized shard aggregates, weighted by how many clients each one covers."""
+        total, weight = None, 0
+        for r in records:
+            if r["H_agg"] is None:
+                continue
+            n = shard_counts[r["shard"]].get(r["H_agg"], 0)
+            G = aggregates[r["H_agg"]]
+            total = G * n if total is None else total + G * n
+            weight += n
+        if weight == 0:
+            return torch.zeros_like(next(aggregates[r["H_agg"]] for r in records if r["H_agg"] is not None))
+        return total / weight
+
+    def _resolve_disputes(
+        self, H_star: str, entries: Dict[str, str], fraudsters: List[str]
+    ) -> Dict[str, Dict[str, Any]]:
+        """
+        Localize each fraudster's disagreement with a validator on the
+        winning side by comparing Merkle trees, then have that validator
+        recompute only the disputed chunks from the clients' signed payloads.
+        `confirmed` is True if every disputed chunk of the fraudster's tree
+        is wrong; callers spare unconfirmed fraudsters the slash.
+        """
+        if not fraudsters:
+            return {}
+        by_id = {v.id: v for v in self.validators}
+        referee = next(by_id[vid] for vid, h in entries.items() if h == H_star and vid in by_id)
+        client_grads = {c.id: c.sent_gradient() for c in self.clients if c.last_signed is not None}
+        widths = referee.agg_tree.widths
+        disputes: Dict[str, Dict[str, Any]] = {}
+        for vid in fraudsters:
+            accused = by_id.get(vid)
+            if accused is None or accused.agg_tree is None or accused.agg_tree.widths != widths:
+                continue
+            chunks, exchanges = locate_disputes(referee.merkle_node, accused.merkle_node, widths)
+            recomputed = referee.recompute_chunks(client_grads, chunks)
+            wrong = [i for i in chunks if accused.agg_tree.leaf(i) != recomputed[i]]
+            disputes[vid] = {
+                "referee": referee.id,
+                "chunks": chunks,
+                "total_chunks": referee.agg_tree.num_chunks,
+                "exchanges": exchanges,
+                "recomputed_fraction": round(len(chunks) / referee.agg_tree.num_chunks, 4),
+                "confirmed": len(wrong) == len(chunks),
+            }
+        return disputes
+
+    def _compression_stats(self, targets: Dict[str, List[str]]) -> Optional[Dict[str, Any]]:
+        """Payload bytes per round (all packets) and mean relative error, or None if uncompressed."""
+        if self.compression is None:
+            return None
+        raw = sum(4 * self.grad_dim * len(targets[c.id]) for c in self.clients)
+        sent = sum(c.compressor.last_bytes * len(targets[c.id]) for c in self.clients)
+        COMPRESSED_BYTES_SAVED.inc(amount=raw - sent)
+        return {
+            "scheme": self.compression,
+            "raw_bytes": raw,
+            "payload_bytes": sent,
+            "saved_bytes": raw - sent,
+            "ratio": round(raw / sent, 2) if sent else None,
+            "mean_rel_error": round(sum(c.compressor.last_error for c in self.clients) / len(self.clients), 6),
+            "max_rel_error": round(max(c.compressor.last_error for c in self.clients), 6),
+        }
+
+    def run_round(self, log: Optional[Callable[[str], None]] = None) -> Dict[str, Any]:
+        """
+        Run one round; `log` receives each progress line as it happens. Without
+        a `log` callback the lines are collected into the result's "logs".
+        """
+        logs: List[str] = []
+        sink = log if log is not None else logs.append
+        for event in self.iter_round():
+            for line in format_event(event):
+                sink(line)
+        result = event["result"]
+        if log is None:
+            result["logs"] = logs
+        return result
+
+    def run(self, rounds: int = 1, log: Optional[Callable[[str], None]] = None) -> List[Dict[str, Any]]:
+        """Run `rounds` consecutive rounds and return their results in order."""
+        return [self.run_round(log=log) for _ in range(rounds)]
+
+
+_PHASE_TITLES = {
+    "handshake": "PQC KEM HANDSHAKE (CLIENTS <-> VALIDATORS)",
+    "training": "CLIENT LOCAL TRAINING",
+    "aggregation": "VALIDATOR AGGREGATION",
+}
+
+
+def format_event(event: Dict[str, Any]) -> List[str]:
+    """Render one round event as the human-readable log lines used by the CLI and API."""
+    kind = event["type"]
+    if kind == "round_started":
+        return [
+            "==================================================",
+            f"        PQC-SECURED DFLN TRAINING ROUND {event['round_id']}",
+            "==================================================",
+            f"{EMOJI_PQC} KEM: {event.get('kem', 'ml-kem-512').upper()}  |  "
+            f"Signatures: {event.get('signature', 'sphincs-shake-256s').upper()}",
+            f"{EMOJI_PQC} Symmetric encryption: {event.get('cipher', 'aes-gcm').upper()} "
+            "channels keyed from KEM shared secrets",
+        ]
+    if kind == "phase":
+        return ["", f"========== {_PHASE_TITLES[event['phase']]} ==========", ""]
+    if kind == "handshake":
+        action = "established" if event["fresh"] else "reused cached"
+        return [f"{EMOJI_PQC} Client {event['client_id']} {action} PQC keys with validators {event['validators']}"]
+    if kind == "client_trained":
+        if event["malicious"]:
+            return [
+                f"{EMOJI_WARN} Client {event['id']} is malicious: "
+                f"sending {event.get('attack') or 'scaled'} gradient (||g||={event['grad_norm']:.2f})"
+            ]
+        return [f"{EMOJI_OK} Client {event['id']}: ||g||={event['grad_norm']:.2f}"]
+    if kind == "committees":
+        lines = [f"{EMOJI_VAL} Committees for this round (stake-weighted, seeded by the chain head):"]
+        for shard, (members, committee) in enumerate(zip(event["shards"], event["committees"])):
+            lines.append(f"   - shard {shard}: {len(members)} clients -> {committee}")
+        return lines
+    if kind == "network":
+        lines = [
+            f"{EMOJI_OK} Network: {event['delivered']}/{event['sent'] + event['unsent']} packets delivered in "
+            f"{event['elapsed_s']:.3f}s simulated "
+            f"({event['late']} late, {event['dropped']} dropped, {event['unsent']} unsent)"
+        ]
+        for vid, n in event["arrived"].items():
+            lines.append(f"   - {vid}: {n} packets before cutoff")
+        return lines
+    if kind == "aggregate_submitted":
+        label = " (malicious)" if event["malicious"] else ""
+        if event.get("shard") is not None:
+            label += f" [shard {event['shard']}]"
+        return [
+            f"{EMOJI_VAL} Validator {event['id']}{label}: "
+            f"||G_t|| = {event['grad_norm']:.4f} | H_agg = {event['H_agg'][:10]}..."
+        ]
+    if kind == "consensus":
+        lines = [
+            "",
+            "========== BLOCKCHAIN CONSENSUS ==========",
+            "",
+            f"{EMOJI_OK} Consensus on H_agg = {event['H_star'][:10]}... "
+            f"with {event['winning_stake']:.1f} / {event['total_stake']:.1f} stake ({event['stake_pct']:.1f}%)",
+            "",
+            "Validator hashes (by id):",
+        ]
+        for vid, h in event["entries"].items():
+            lines.append(f"   - {vid}: {h[:18]}...")
+        if event["fraudsters"]:
+            lines += ["", "Fraud proofs triggered against validators:"]
+            for vid in event["fraudsters"]:
+                lines.append(f"   - {vid} (slashed, new stake={event['stake'][vid]:.2f})")
+                for key, dispute in event.get("disputes", {}).items():
+                    if key.split("/")[0] != vid:
+                        continue
+                    verdict = "confirmed" if dispute["confirmed"] else "not confirmed"
+                    lines.append(
+                        f"     {len(dispute['chunks'])}/{dispute['total_chunks']} chunks disputed, "
+                        f"{dispute['exchanges']} exchanges, {verdict} by {dispute['referee']}"
+                    )
+        lines += ["", "Validator reputation and stake:"]
+        for vid, score in event["reputation"].items():
+            lines.append(f"   - {vid}: reputation={score}, stake={event['stake'].get(vid, 0.0):.2f}")
+        lines += ["", f"Block #{event['block_height']} appended: {event['block_hash'][:18]}..."]
+        return lines
+    if kind == "model_updated":
+        return ["", f"{EMOJI_OK} Global model updated with consensus G_t (lr={event['lr']})"]
+    if kind == "no_consensus":
+        return ["", "[Blockchain] No consensus for this round; global model unchanged"]
+    return []
@@ -0,0 +1,223 @@
+import json
+import os
+import threading
+import time
+from typing import Callable, Dict, Optional, Tuple
+
+from .crypto_utils import CryptoSuite, DEFAULT_SUITE, derive_fernet_key
+
+
+class KeyStore:
+    """
+    Long-lived key material for a federation: each client's signing identity,
+    each validator's KEM keypair and each client<->validator Fernet session key.
+
+    Everything lives in memory; when `path` is given the store is loaded from
+    and saved to a JSON file so a restarted process skips key generation and
+    the KEM handshake. Ages are in seconds, `None` means never expire.
+
+    Keys made with a non-default CryptoSuite are stored under "<id>@<scheme>",
+    so federations with different suites can share one store.
+    """
+
+    def __init__(
+        self,
+        path: Optional[str] = None,
+        sig_max_age: Optional[float] = None,
+        kem_max_age: Optional[float] = None,
+        session_max_age: Optional[float] = None,
+        session_max_uses: Optional[int] = None,
+        clock: Callable[[], float] = time.time,
+    ):
+        self.path = path
+        self.sig_max_age = sig_max_age
+        self.kem_max_age = kem_max_age
+        self.session_max_age = session_max_age
+        self.session_max_uses = session_max_uses
+        self.clock = clock
+
+        self._sig: Dict[str, Dict] = {}
+        self._kem: Dict[str, Dict] = {}
+        self._sessions: Dict[str, Dict] = {}
+        self._lock = threading.RLock()
+        self._dirty = False
+
+        if path is not None and os.path.exists(path):
+            self.load()
+
+    @staticmethod
+    def _pair(client_id: str, validator_id: str) -> str:
+        return f"{client_id}|{validator_id}"
+
+    @staticmethod
+    def _scoped(key_id: str, scheme: str, default_scheme: str) -> str:
+        return key_id if scheme == default_scheme else f"{key_id}@{scheme}"
+
+    def _expired(self, entry: Dict, max_age: Optional[float]) -> bool:
+        return max_age is not None and self.clock() - entry["created"] >= max_age
+
+    # --------- Long-lived identities ---------
+
+    def sig_identity(self, client_id: str, suite: Optional[CryptoSuite] = None) -> Tuple[bytes, bytes]:
+        """Return the client's (public_key, secret_key), generating or rotating as needed."""
+        suite = suite or DEFAULT_SUITE
+        key_id = self._scoped(client_id, suite.sig_name, DEFAULT_SUITE.sig_name)
+        with self._lock:
+            entry = self._sig.get(key_id)
+            if entry is None or self._expired(entry, self.sig_max_age):
+                pk, sk = suite.sig_generate_keypair()
+                entry = {"pk": pk, "sk": sk, "created": self.clock()}
+                self._sig[key_id] = entry
+                self._dirty = True
+            return entry["pk"], entry["sk"]
+
+    def kem_identity(self, validator_id: str, suite: Optional[CryptoSuite] = None) -> Tuple[bytes, bytes]:
+        """Return the validator's KEM (public_key, secret_key). Rotating it drops its sessions."""
+        suite = suite or DEFAULT_SUITE
+        key_id = self._scoped(validator_id, suite.kem_name, DEFAULT_SUITE.kem_name)
+        with self._lock:
+            entry = self._kem.get(key_id)
+            if entry is None or self._expired(entry, self.kem_max_age):
+                pk, sk = suite.kem_generate_keypair()
+                entry = {"pk": pk, "sk": sk, "created": self.clock()}
+                self._kem[key_id] = entry
+                self._drop_sessions(validator_id=key_id)
+                self._dirty = True
+            return entry["pk"], entry["sk"]
+
+    # --------- Session keys ---------
+
+    def session_key(self, client_id: str, validator_id: str) -> Optional[bytes]:
+        """Return a still-valid cached session key and count one use, or None."""
+        with self._lock:
+            entry = self._sessions.get(self._pair(client_id, validator_id))
+            if entry is None:
+                return None
+            if self._expired(entry, self.session_max_age) or (
+                self.session_max_uses is not None and entry["uses"] >= self.session_max_uses
+            ):
+                del self._sessions[self._pair(client_id, validator_id)]
+                self._dirty = True
+                return None
+            entry["uses"] += 1
+            self._dirty = True
+            return entry["key"]
+
+    def handshake(
+        self, client_id: str, validator_id: str, suite: Optional[CryptoSuite] = None
+    ) -> Tuple[bytes, bytes, bool]:
+        """
+        Return (key_client, key_validator, fresh). Reuses the cached session key
+        when the rotation policy allows; otherwise runs KEM encapsulation
+        against the validator's long-lived KEM key and caches the result.
+        """
+        suite = suite or DEFAULT_SUITE
+        scoped_vid = self._scoped(validator_id, suite.kem_name, DEFAULT_SUITE.kem_name)
+        # Looked up first: an expired KEM key is rotated, which drops its sessions.
+        pk, sk = self.kem_identity(validator_id, suite)
+        cached = self.session_key(client_id, scoped_vid)
+        if cached is not None:
+            return cached, cached, False
+
+        ct, shared_client = suite.kem_encapsulate(pk)
+        shared_validator = suite.kem_decapsulate(ct, sk)
+        key_client = derive_fernet_key(shared_client)
+        key_validator = derive_fernet_key(shared_validator)
+        with self._lock:
+            self._sessions[self._pair(client_id, scoped_vid)] = {
+                "key": key_client,
+                "created": self.clock(),
+                "uses": 1,
+            }
+            self._dirty = True
+        return key_client, key_validator, True
+
+    def open_channel(self, client_id: str, validator_id: str, suite: Optional[CryptoSuite] = None) -> int:
+        """
+        Count one more sending channel on the pair's session key and return
+        its epoch (1, 2, ...). The count is saved with the key, so nonces stay
+        unique across restarts; a new session key starts again at 1.
+        """
+        suite = suite or DEFAULT_SUITE
+        pair = self._pair(client_id, self._scoped(validator_id, suite.kem_name, DEFAULT_SUITE.kem_name))
+        with self._lock:
+            entry = self._sessions.get(pair)
+            if entry is None:
+                raise KeyError(f"No session key for {pair}")
+            entry["channels"] = entry.get("channels", 0) + 1
+            self._dirty = True
+            return entry["channels"]
+
+    def rotate(self, client_id: Optional[str] = None, validator_id: Optional[str] = None) -> None:
+        """Force fresh session keys for a client, a validator, or everything."""
+        with self._lock:
+            self._drop_sessions(client_id, validator_id)
+
+    def _drop_sessions(self, client_id: Optional[str] = None, validator_id: Optional[str] = None) -> None:
+        for pair in list(self._sessions):
+            cid, vid = pair.split("|", 1)
+            if (client_id is None or cid == client_id) and (
+                validator_id is None or vid == validator_id or vid.split("@", 1)[0] == validator_id
+            ):
+                del self._sessions[pair]
+                self._dirty = True
+
+    # --------- Persistence ---------
+
+    def save(self) -> None:
+        if self.path is None:
+            return
+        with self._lock:
+            if not self._dirty:
+                return
+            data = {
+                "sig": {
+                    cid: {"pk": e["pk"].hex(), "sk": e["sk"].hex(), "created": e["created"]}
+                    for cid, e in self._sig.items()
+                },
+                "kem": {
+                    vid: {"pk": e["pk"].hex(), "sk": e["sk"].hex(), "created": e["created"]}
+                    for vid, e in self._kem.items()
+                },
+                "sessions": {
+                    pair: {
+                        "key": e["key"].decode("ascii"),
+                        "created": e["created"],
+                        "uses": e["uses"],
+                        "channels": e.get("channels", 0),
+                    }
+                    for pair, e in self._sessions.items()
+                },
+            }
+            directory = os.path.dirname(self.path)
+            if directory:
+                os.makedirs(directory, exist_ok=True)
+            tmp = self.path + ".tmp"
+            fd = os.open(tmp, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o600)
+            with os.fdopen(fd, "w") as f:
+                json.dump(data, f)
+            os.replace(tmp, self.path)
+            self._dirty = False
+
+    def load(self) -> None:
+        with open(self.path) as f:
+            data = json.load(f)
+        with self._lock:
+            self._sig = {
+                cid: {"pk": bytes.fromhex(e["pk"]), "sk": bytes.fromhex(e["sk"]), "created": e["created"]}
+                for cid, e in data.get("sig", {}).items()
+            }
+            self._kem = {
+                vid: {"pk": bytes.fromhex(e["pk"]), "sk": bytes.fromhex(e["sk"]), "created": e["created"]}
+                for vid, e in data.get("kem", {}).items()
+            }
+            self._sessions = {
+                pair: {
+                    "key": e["key"].encode("ascii"),
+                    "created": e["created"],
+                    "uses": e["uses"],
+                    "channels": e.get("channels", 0),
+                }
+                for pair, e in data.get("sessions", {}).items()
+            }
+            self._dirty = False
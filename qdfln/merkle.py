@@ -0,0 +1,154 @@
+"""
+Merkle-chunked aggregate hashes.
+
+G_t is canonically quantized (rounded to integer multiples of `quantum`,
+as little-endian int64) and cut into fixed-size chunks. H_agg is the
+Merkle root over the chunk hashes. Float noise well below the quantum,
+e.g. from a different summation order, only changes a chunk when it moves
+a value across a rounding boundary. Such a chunk is then found and
+recomputed like any other disputed chunk instead of failing the whole
+aggregate.
+
+Two validators whose roots differ find the differing chunks by comparing
+their trees top-down (`locate_disputes`). Only nodes whose hashes differ
+are expanded, so one bad chunk takes O(log n) exchanges. A referee then
+recomputes just those chunks from the client gradients.
+
+Leaves are sha256(0x00 || chunk) and inner nodes sha256(0x01 || left ||
+right). An odd node at the end of a level is promoted unchanged. Levels
+are indexed from the root (level 0), and node i at level L has children
+2i and 2i + 1 at level L + 1.
+"""
+import hashlib
+from typing import Callable, Dict, List, Optional, Sequence, Tuple
+
+import numpy as np
+import torch
+
+DEFAULT_CHUNK_SIZE = 1024
+QUANTUM = 2.0 ** -20
+
+NodeQuery = Callable[[int, int], bytes]
+
+
+def quantize(G: torch.Tensor, quantum: float = QUANTUM) -> np.ndarray:
+    """Canonical int64 encoding of G; rounding happens in float64."""
+    return np.rint(G.detach().double().numpy() / quantum).astype("<i8")
+
+
+def leaf_hash(chunk: np.ndarray) -> bytes:
+    return hashlib.sha256(b"\x00" + chunk.tobytes()).digest()
+
+
+def node_hash(left: bytes, right: bytes) -> bytes:
+    return hashlib.sha256(b"\x01" + left + right).digest()
+
+
+def chunk_bounds(index: int, chunk_size: int, dim: int) -> Tuple[int, int]:
+    lo = index * chunk_size
+    return lo, min(dim, lo + chunk_size)
+
+
+class MerkleTree:
+    def __init__(self, leaves: Sequence[bytes], dim: int = 0, chunk_size: int = DEFAULT_CHUNK_SIZE):
+        if not leaves:
+            leaves = [leaf_hash(np.empty(0, dtype="<i8"))]
+        self.dim = dim
+        self.chunk_size = chunk_size
+        levels = [list(leaves)]
+        while len(levels[-1]) > 1:
+            below = levels[-1]
+            above = [node_hash(below[i], below[i + 1]) for i in range(0, len(below) - 1, 2)]
+            if len(below) % 2:
+                above.append(below[-1])
+            levels.append(above)
+        # Root level first.
+        self.levels = levels[::-1]
+
+    @classmethod
+    def from_vector(
+        cls, G: torch.Tensor, chunk_size: int = DEFAULT_CHUNK_SIZE, quantum: float = QUANTUM
+    ) -> "MerkleTree":
+        q = quantize(G, quantum)
+        leaves = [leaf_hash(q[lo : lo + chunk_size]) for lo in range(0, len(q), chunk_size)]
+        return cls(leaves, len(q), chunk_size)
+
+    @property
+    def root(self) -> bytes:
+        return self.levels[0][0]
+
+    @property
+    def root_hex(self) -> str:
+        return self.root.hex()
+
+    @property
+    def widths(self) -> List[int]:
+        return [len(level) for level in self.levels]
+
+    @property
+    def num_chunks(self) -> int:
+        return len(self.levels[-1])
+
+    def node(self, level: int, index: int) -> bytes:
+        return self.levels[level][index]
+
+    def leaf(self, index: int) -> bytes:
+        return self.levels[-1][index]
+
+
+def locate_disputes(query_a: NodeQuery, query_b: NodeQuery, widths: Sequence[int]) -> Tuple[List[int], int]:
+    """
+    Indices of the leaves (chunks) where two trees of shape `widths`
+    differ, and the number of node comparisons it took. Each comparison is
+    one (level, index) query answered by both sides.
+    """
+    exchanges = 1
+    if query_a(0, 0) == query_b(0, 0):
+        return [], exchanges
+    frontier = [0]
+    for level in range(1, len(widths)):
+        below = []
+        for parent in frontier:
+            for child in (2 * parent, 2 * parent + 1):
+                if child >= widths[level]:
+                    continue
+                exchanges += 1
+                if query_a(level, child) != query_b(level, child):
+                    below.append(child)
+        frontier = below
+    return frontier, exchanges
+
+
+def recompute_leaves(
+    rows: torch.Tensor,
+    chunk_ids: Sequence[int],
+    chunk_size: int,
+    aggregate: Callable[[torch.Tensor], torch.Tensor],
+    coordinatewise: bool,
+    offset: Optional[Callable[[torch.Tensor], torch.Tensor]] = None,
+    quantum: float = QUANTUM,
+) -> Dict[int, bytes]:
+    """
+    Leaf hashes of the chunks `chunk_ids` of aggregate(rows), where rows is
+    C x D. A coordinate-wise rule is only run on the disputed columns;
+    other rules need the full aggregate. `offset(cols)` returns a
+    correction to add on the given column indices (e.g. mask removal).
+    """
+    dim = rows.shape[1]
+    if not chunk_ids:
+        return {}
+    cols = torch.cat([torch.arange(*chunk_bounds(i, chunk_size, dim)) for i in chunk_ids])
+    if coordinatewise:
+        values = aggregate(rows[:, cols])
+    else:
+        values = aggregate(rows)[cols]
+    if offset is not None:
+        values = values + offset(cols)
+    q = quantize(values, quantum)
+    leaves: Dict[int, bytes] = {}
+    pos = 0
+    for i in chunk_ids:
+        lo, hi = chunk_bounds(i, chunk_size, dim)
+        leaves[i] = leaf_hash(q[pos : pos + hi - lo])
+        pos += hi - lo
+    return leaves
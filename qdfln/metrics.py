@@ -0,0 +1,244 @@
+"""
+In-process metrics for the round hot path.
+
+Counters and histograms register in one MetricsRegistry and render as
+Prometheus text. While the registry is disabled (the default unless
+QDFLN_METRICS=1), every inc/observe returns right after checking one
+attribute, and `time()` hands back a shared no-op context manager.
+
+Label values are passed positionally in the order the metric declares
+them, e.g. PACKETS_REJECTED.inc("signature").
+"""
+import math
+import os
+import threading
+import time
+from typing import Dict, Iterator, List, Optional, Sequence, Tuple
+
+DEFAULT_BUCKETS = (0.0005, 0.001, 0.005, 0.01, 0.05, 0.1, 0.5, 1.0, 5.0, 10.0, 30.0, math.inf)
+
+
+class _NullTimer:
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+
+_NULL_TIMER = _NullTimer()
+
+
+class _Timer:
+    __slots__ = ("histogram", "labels", "started")
+
+    def __init__(self, histogram: "Histogram", labels: Tuple[str, ...]):
+        self.histogram = histogram
+        self.labels = labels
+
+    def __enter__(self):
+        self.started = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        self.histogram.observe(time.perf_counter() - self.started, *self.labels)
+        return False
+
+
+def _format_labels(names: Sequence[str], values: Sequence[str], extra: str = "") -> str:
+    pairs = [f'{n}="{v}"' for n, v in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+def _format_value(value: float) -> str:
+    if value == math.inf:
+        return "+Inf"
+    return repr(float(value))
+
+
+class Counter:
+    def __init__(self, registry: "MetricsRegistry", name: str, help: str, labelnames: Sequence[str] = ()):
+        self.registry = registry
+        self.name = name
+        self.help = help
+        self.labelnames = tuple(labelnames)
+        self._values: Dict[Tuple[str, ...], float] = {}
+        self._lock = threading.Lock()
+
+    def inc(self, *labels: str, amount: float = 1.0) -> None:
+        if not self.registry.enabled:
+            return
+        with self._lock:
+            self._values[labels] = self._values.get(labels, 0.0) + amount
+
+    def value(self, *labels: str) -> float:
+        return self._values.get(labels, 0.0)
+
+    def reset(self) -> None:
+        with self._lock:
+            self._values.clear()
+
+    def render(self) -> Iterator[str]:
+        yield f"# HELP {self.name} {self.help}"
+        yield f"# TYPE {self.name} counter"
+        with self._lock:
+            for labels, value in sorted(self._values.items()):
+                yield f"{self.name}{_format_labels(self.labelnames, labels)} {_format_value(value)}"
+
+
+class Histogram:
+    def __init__(
+        self,
+        registry: "MetricsRegistry",
+        name: str,
+        help: str,
+        labelnames: Sequence[str] = (),
+        buckets: Sequence[float] = DEFAULT_BUCKETS,
+    ):
+        self.registry = registry
+        self.name = name
+        self.help = help
+        self.labelnames = tuple(labelnames)
+        self.buckets = tuple(buckets)
+        # labels -> [bucket counts..., sum, count]
+        self._series: Dict[Tuple[str, ...], List[float]] = {}
+        self._lock = threading.Lock()
+
+    def observe(self, value: float, *labels: str) -> None:
+        if not self.registry.enabled:
+            return
+        with self._lock:
+            series = self._series.get(labels)
+            if series is None:
+                series = self._series[labels] = [0.0] * (len(self.buckets) + 2)
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    series[i] += 1
+                    break
+            series[-2] += value
+            series[-1] += 1
+
+    def time(self, *labels: str):
+        """Context manager that observes the elapsed wall time of its block."""
+        if not self.registry.enabled:
+            return _NULL_TIMER
+        return _Timer(self, labels)
+
+    def count(self, *labels: str) -> int:
+        series = self._series.get(labels)
+        return int(series[-1]) if series else 0
+
+    def total(self, *labels: str) -> float:
+        series = self._series.get(labels)
+        return series[-2] if series else 0.0
+
+    def reset(self) -> None:
+        with self._lock:
+            self._series.clear()
+
+    def render(self) -> Iterator[str]:
+        yield f"# HELP {self.name} {self.help}"
+        yield f"# TYPE {self.name} histogram"
+        with self._lock:
+            for labels, series in sorted(self._series.items()):
+                cumulative = 0.0
+                for bound, n in zip(self.buckets, series):
+                    cumulative += n
+                    le = f'le="{_format_value(bound)}"'
+                    yield f"{self.name}_bucket{_format_labels(self.labelnames, labels, le)} {_format_value(cumulative)}"
+                label_text = _format_labels(self.labelnames, labels)
+                yield f"{self.name}_sum{label_text} {_format_value(series[-2])}"
+                yield f"{self.name}_count{label_text} {_format_value(series[-1])}"
+
+
+class MetricsRegistry:
+    def __init__(self, enabled: bool = False):
+        self.enabled = enabled
+        self._metrics: Dict[str, object] = {}
+
+    def counter(self, name: str, help: str, labelnames: Sequence[str] = ()) -> Counter:
+        return self._metrics.setdefault(name, Counter(self, name, help, labelnames))
+
+    def histogram(
+        self, name: str, help: str, labelnames: Sequence[str] = (), buckets: Sequence[float] = DEFAULT_BUCKETS
+    ) -> Histogram:
+        return self._metrics.setdefault(name, Histogram(self, name, help, labelnames, buckets))
+
+    def enable(self) -> None:
+        self.enabled = True
+
+    def disable(self) -> None:
+        self.enabled = False
+
+    def reset(self) -> None:
+        for metric in self._metrics.values():
+            metric.reset()
+
+    def render(self) -> str:
+        """Prometheus text exposition format (version 0.0.4)."""
+        lines: List[str] = []
+        for metric in self._metrics.values():
+            lines.extend(metric.render())
+        return "\n".join(lines) + "\n"
+
+
+REGISTRY = MetricsRegistry(enabled=os.environ.get("QDFLN_METRICS", "0") == "1")
+
+HANDSHAKE_SECONDS = REGISTRY.histogram(
+    "qdfln_handshake_seconds", "Client-validator key agreement time.", ["fresh"]
+)
+SIGN_SECONDS = REGISTRY.histogram("qdfln_sign_seconds", "Gradient signing time per client.")
+VERIFY_SECONDS = REGISTRY.histogram("qdfln_verify_seconds", "Signature verification time per packet.", ["cached"])
+DECRYPT_SECONDS = REGISTRY.histogram("qdfln_decrypt_seconds", "Packet decryption time.", ["format"])
+DECOMPRESS_SECONDS = REGISTRY.histogram("qdfln_decompress_seconds", "Compressed payload expansion time.")
+COMPRESSED_BYTES_SAVED = REGISTRY.counter(
+    "qdfln_compressed_bytes_saved_total", "Payload bytes saved by gradient compression."
+)
+PACKETS_ACCEPTED = REGISTRY.counter("qdfln_packets_accepted_total", "Packets accepted by validators.")
+PACKETS_REJECTED = REGISTRY.counter(
+    "qdfln_packets_rejected_total", "Packets rejected by validators, by reason.", ["reason"]
+)
+COSINE_ANOMALIES = REGISTRY.counter(
+    "qdfln_cosine_anomalies_total", "Gradients flagged by the cosine check (counted toward blocking)."
+)
+OUTLIER_ANOMALIES = REGISTRY.counter(
+    "qdfln_outlier_anomalies_total",
+    "Gradients flagged by the median or cluster screening detectors (counted toward blocking).",
+    ["detector"],
+)
+AGGREGATION_SECONDS = REGISTRY.histogram("qdfln_aggregation_seconds", "Validator aggregation time.", ["mode"])
+CONSENSUS_SECONDS = REGISTRY.histogram("qdfln_consensus_seconds", "Consensus check and block append time.")
+ROUNDS = REGISTRY.counter("qdfln_rounds_total", "Finished rounds, by outcome.", ["outcome"])
+STAGE_SECONDS = REGISTRY.histogram("qdfln_round_stage_seconds", "Per-stage round time.", ["stage"])
+
+
+class StageTimer:
+    """
+    Accumulates wall time per named stage for one round. Blocks must not
+    span a generator yield, so only the federation's own work is counted.
+    """
+
+    def __init__(self):
+        self.totals: Dict[str, float] = {}
+        self._stage: Optional[str] = None
+        self._started = 0.0
+
+    def stage(self, name: str) -> "StageTimer":
+        self._stage = name
+        return self
+
+    def __enter__(self):
+        self._started = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        self.totals[self._stage] = self.totals.get(self._stage, 0.0) + time.perf_counter() - self._started
+        return False
+
+    def report(self) -> Dict[str, float]:
+        """Stage -> seconds (rounded), also recorded in STAGE_SECONDS."""
+        for name, seconds in self.totals.items():
+            STAGE_SECONDS.observe(seconds, name)
+        return {name: round(seconds, 6) for name, seconds in self.totals.items()}
@@ -1,6 +1,133 @@
+"""
+Model registry and flat parameter storage.
+
+Every model maps a batch of input_dim feature vectors to one logit per
+sample. "logreg" is nn.Linear(input_dim, 1). "mlp" stacks hidden layers.
+"cnn" runs small convolutions over the features, or over an image when
+`image_shape=(C, H, W)` is given.
+
+make_model flattens the model it builds. All parameters become views into
+one contiguous float32 buffer, and their .grad tensors become views into a
+second one. The parameter and gradient vectors, in the layout of
+flatten_gradients, are then the buffers themselves. Loading a model is a
+single copy_, and an SGD step is a single sub_.
+
+Gradients accumulate in place, so clear them with FlatParameters.zero_grad()
+or zero_grad(set_to_none=False). The default set_to_none would detach
+.grad from the buffer.
+"""
+import inspect
+from typing import Callable, Dict, Optional, Sequence, Tuple
+
+import torch
 import torch.nn as nn
+from torch.nn.utils import parameters_to_vector
+
+MODELS: Dict[str, Callable[..., nn.Module]] = {}
+
+
+def register_model(name: str):
+    def decorator(factory):
+        MODELS[name] = factory
+        return factory
+    return decorator
+
+
+def make_model(name: str, input_dim: int, **options) -> nn.Module:
+    """Build the model registered as `name`, passing only the options it accepts, and flatten it."""
+    if name not in MODELS:
+        raise ValueError(f"Unknown model {name!r}; choose from {sorted(MODELS)}")
+    factory = MODELS[name]
+    params = inspect.signature(factory).parameters
+    accepted = {k: v for k, v in options.items() if k in params}
+    model = factory(input_dim, **accepted)
+    FlatParameters(model)
+    return model
+
+
+def create_global_model(input_dim: int, name: str = "logreg", **options) -> nn.Module:
+    return make_model(name, input_dim, **options)
+
 
+class FlatParameters:
+    """One contiguous buffer for a module's parameters and one for their gradients."""
 
-def create_global_model(input_dim: int) -> nn.Module:
+    def __init__(self, module: nn.Module):
+        params = list(module.parameters())
+        numel = sum(p.numel() for p in params)
+        self.data = torch.empty(numel)
+        self.grad = torch.zeros(numel)
+        offset = 0
+        with torch.no_grad():
+            for p in params:
+                n = p.numel()
+                self.data[offset : offset + n].copy_(p.data.view(-1))
+                p.data = self.data[offset : offset + n].view_as(p)
+                p.grad = self.grad[offset : offset + n].view_as(p)
+                offset += n
+        module.flat_params = self
+
+    def __len__(self) -> int:
+        return self.data.numel()
+
+    def zero_grad(self) -> None:
+        self.grad.zero_()
+
+    def load_(self, vector: torch.Tensor) -> None:
+        self.data.copy_(vector)
+
+
+def flat_params(module: nn.Module) -> Optional[FlatParameters]:
+    return getattr(module, "flat_params", None)
+
+
+def parameter_vector(module: nn.Module) -> torch.Tensor:
+    """The module's parameters as one vector; the live buffer (no copy) for flattened modules."""
+    flat = flat_params(module)
+    if flat is not None:
+        return flat.data
+    return parameters_to_vector(module.parameters()).detach()
+
+
+@register_model("logreg")
+def logreg(input_dim: int) -> nn.Module:
     return nn.Linear(input_dim, 1)
 
+
+@register_model("mlp")
+def mlp(input_dim: int, hidden: Sequence[int] = (32,), dropout: float = 0.0) -> nn.Module:
+    layers = []
+    width = input_dim
+    for h in hidden:
+        layers += [nn.Linear(width, h), nn.ReLU()]
+        if dropout:
+            layers.append(nn.Dropout(dropout))
+        width = h
+    layers.append(nn.Linear(width, 1))
+    return nn.Sequential(*layers)
+
+
+@register_model("cnn")
+def cnn(
+    input_dim: int,
+    channels: Sequence[int] = (8, 16),
+    kernel_size: int = 3,
+    image_shape: Optional[Tuple[int, int, int]] = None,
+) -> nn.Module:
+    """
+    Conv-ReLU blocks, global average pooling and a linear head. Without
+    `image_shape` the features are treated as a one-channel 1-D signal.
+    """
+    if image_shape is not None:
+        if image_shape[0] * image_shape[1] * image_shape[2] != input_dim:
+            raise ValueError(f"image_shape {tuple(image_shape)} does not hold {input_dim} features")
+        shape, conv, pool = tuple(image_shape), nn.Conv2d, nn.AdaptiveAvgPool2d(1)
+    else:
+        shape, conv, pool = (1, input_dim), nn.Conv1d, nn.AdaptiveAvgPool1d(1)
+    layers = [nn.Unflatten(1, shape)]
+    width = shape[0]
+    for c in channels:
+        layers += [conv(width, c, kernel_size, padding=kernel_size // 2), nn.ReLU()]
+        width = c
+    layers += [pool, nn.Flatten(), nn.Linear(width, 1)]
+    return nn.Sequential(*layers)
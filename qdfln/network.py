@@ -0,0 +1,277 @@
+"""
+In-process network transport.
+
+Clients, validators and the chain normally hand each other Python objects
+directly. A Network puts an asyncio message bus between them. Every node has
+a local queue, and each message takes a simulated amount of time to reach
+it:
+
+    arrival = start delay of the sender (node_delay)
+            + queueing behind the sender's earlier messages
+            + size / bandwidth of the link
+            + latency (+ uniform jitter) of the link
+
+A sender pushes its messages out one after another, so a client sending V
+packets over a slow uplink reaches the last validator later than the
+first. A message is lost with the link's drop_rate. Each message's drop
+and jitter are drawn up front, in the order the messages were given, so a
+seeded Network makes the same draws whatever order the tasks run in.
+
+Receivers collect under a RoundPolicy. They take whatever has arrived by
+`deadline_s`, stop early once a `quorum` fraction of the messages addressed
+to them is in, and otherwise wait until nothing more is in flight. Messages
+that arrive after a receiver stopped count as late and are discarded.
+Messages a sender had not yet pushed out when every receiver stopped count
+as unsent.
+
+Delays are real asyncio sleeps multiplied by `time_scale`, so 0.01 runs a
+100 ms link in 1 ms. Reported times are in simulated seconds.
+"""
+import asyncio
+import json
+import math
+import random
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass, field
+from typing import Any, Dict, List, Optional, Sequence, Tuple, Union
+
+CHAIN_NODE = "chain"
+
+LinkKey = Union[str, Tuple[str, str]]
+
+
+@dataclass
+class LinkModel:
+    latency_s: float = 0.0
+    jitter_s: float = 0.0
+    # None means unlimited bandwidth.
+    bandwidth_bps: Optional[float] = None
+    drop_rate: float = 0.0
+
+    def transfer_s(self, size: int) -> float:
+        return 8.0 * size / self.bandwidth_bps if self.bandwidth_bps else 0.0
+
+
+@dataclass
+class RoundPolicy:
+    """
+    Deadlines are in simulated seconds from the start of a phase. With
+    `quorum` (a fraction in (0, 1]) a receiver stops as soon as that share
+    of the messages addressed to it has arrived. The deadline still caps
+    the wait. `vote_deadline_s` bounds how long the chain waits for the
+    validators' aggregate hashes.
+    """
+
+    deadline_s: Optional[float] = None
+    quorum: Optional[float] = None
+    vote_deadline_s: Optional[float] = None
+
+    def __post_init__(self):
+        if self.quorum is not None and not 0.0 < self.quorum <= 1.0:
+            raise ValueError(f"quorum must be in (0, 1], got {self.quorum}")
+
+
+@dataclass
+class Message:
+    src: str
+    dst: str
+    payload: Any
+    size: int
+    # Simulated seconds since the start of the exchange.
+    arrived_at: float = 0.0
+
+
+@dataclass
+class ExchangeStats:
+    # Messages pushed onto a link; the rest were still queued at their sender.
+    sent: int = 0
+    delivered: int = 0
+    dropped: int = 0
+    late: int = 0
+    unsent: int = 0
+    # Simulated seconds until the last receiver stopped.
+    elapsed_s: float = 0.0
+    # Messages each receiver accepted.
+    arrived: Dict[str, int] = field(default_factory=dict)
+
+    def add(self, other: "ExchangeStats") -> None:
+        """Fold in a concurrent exchange: counts add up, elapsed time is the longer one."""
+        self.sent += other.sent
+        self.delivered += other.delivered
+        self.dropped += other.dropped
+        self.late += other.late
+        self.unsent += other.unsent
+        self.elapsed_s = max(self.elapsed_s, other.elapsed_s)
+        for node, n in other.arrived.items():
+            self.arrived[node] = self.arrived.get(node, 0) + n
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "sent": self.sent,
+            "delivered": self.delivered,
+            "dropped": self.dropped,
+            "late": self.late,
+            "unsent": self.unsent,
+            "elapsed_s": round(self.elapsed_s, 4),
+            "arrived": dict(self.arrived),
+        }
+
+
+def payload_size(payload: Any) -> int:
+    """Bytes on the wire: binary packets as is, dict packets as JSON."""
+    if isinstance(payload, (bytes, bytearray, memoryview)):
+        return len(payload)
+    if isinstance(payload, str):
+        return len(payload.encode("utf-8"))
+    return len(json.dumps(payload, default=str).encode("utf-8"))
+
+
+def _run(coro):
+    """Run `coro` to completion, on a helper thread if this one already runs a loop."""
+    try:
+        asyncio.get_running_loop()
+    except RuntimeError:
+        return asyncio.run(coro)
+    with ThreadPoolExecutor(max_workers=1) as pool:
+        return pool.submit(asyncio.run, coro).result()
+
+
+class Network:
+    def __init__(
+        self,
+        default_link: Optional[LinkModel] = None,
+        links: Optional[Dict[LinkKey, LinkModel]] = None,
+        node_delay: Optional[Dict[str, float]] = None,
+        time_scale: float = 1.0,
+        seed: int = 0,
+    ):
+        """
+        `links` overrides the default per (src, dst) pair, or per sender id
+        for all of that node's outgoing links. `node_delay` holds simulated
+        seconds before a node starts sending, e.g. a slow device still
+        training.
+        """
+        if time_scale <= 0:
+            raise ValueError("time_scale must be positive")
+        self.default_link = default_link if default_link is not None else LinkModel()
+        self.links = dict(links or {})
+        self.node_delay = dict(node_delay or {})
+        self.time_scale = time_scale
+        self.rng = random.Random(seed)
+
+    @classmethod
+    def from_dict(cls, spec: Dict[str, Any]) -> "Network":
+        """
+        Build from a plain mapping (e.g. a scenario file). LinkModel fields at
+        the top level form the default link, and "links" maps "src" or
+        "src->dst" to LinkModel fields.
+        """
+        spec = dict(spec)
+        links: Dict[LinkKey, LinkModel] = {}
+        for key, fields in spec.pop("links", {}).items():
+            src, _, dst = key.partition("->")
+            links[(src, dst) if dst else src] = LinkModel(**fields)
+        link_fields = {k: spec.pop(k) for k in list(spec) if k in LinkModel.__dataclass_fields__}
+        return cls(default_link=LinkModel(**link_fields), links=links, **spec)
+
+    def link(self, src: str, dst: str) -> LinkModel:
+        return self.links.get((src, dst)) or self.links.get(src) or self.default_link
+
+    def exchange(
+        self,
+        messages: Sequence[Tuple[str, str, Any]],
+        policy: Optional[RoundPolicy] = None,
+    ) -> Tuple[Dict[str, List[Message]], ExchangeStats]:
+        """
+        Send (src, dst, payload) messages concurrently. Returns the messages
+        each receiver accepted, in arrival order, and the exchange statistics.
+        """
+        policy = policy if policy is not None else RoundPolicy()
+        return _run(self._exchange(messages, policy.quorum, policy.deadline_s))
+
+    async def _exchange(
+        self, messages: Sequence[Tuple[str, str, Any]], quorum: Optional[float], deadline_s: Optional[float]
+    ) -> Tuple[Dict[str, List[Message]], ExchangeStats]:
+        loop = asyncio.get_running_loop()
+        started = loop.time()
+        scale = self.time_scale
+        stats = ExchangeStats()
+
+        addressed: Dict[str, int] = {}
+        # src -> [(dst, payload, latency_s, dropped)], drawn in message order.
+        by_src: Dict[str, List[Tuple[str, Any, float, bool]]] = {}
+        for src, dst, payload in messages:
+            link = self.link(src, dst)
+            latency = link.latency_s + (self.rng.uniform(0.0, link.jitter_s) if link.jitter_s else 0.0)
+            dropped = self.rng.random() < link.drop_rate if link.drop_rate else False
+            addressed[dst] = addressed.get(dst, 0) + 1
+            by_src.setdefault(src, []).append((dst, payload, latency, dropped))
+        # Each message puts exactly one item in its receiver's queue: the
+        # Message, or None if the link dropped it.
+        queues: Dict[str, asyncio.Queue] = {dst: asyncio.Queue() for dst in addressed}
+        timers: List[asyncio.TimerHandle] = []
+
+        def now() -> float:
+            return (loop.time() - started) / scale
+
+        def arrive(msg: Optional[Message], dst: str) -> None:
+            if msg is not None:
+                msg.arrived_at = now()
+            queues[dst].put_nowait(msg)
+
+        async def send_all(src: str, outbox: List[Tuple[str, Any, float, bool]]) -> None:
+            delay = self.node_delay.get(src, 0.0)
+            if delay:
+                await asyncio.sleep(delay * scale)
+            for dst, payload, latency, dropped in outbox:
+                size = payload_size(payload)
+                transfer = self.link(src, dst).transfer_s(size)
+                if transfer:
+                    # The sender's uplink is busy until this message is out.
+                    await asyncio.sleep(transfer * scale)
+                stats.sent += 1
+                msg = None
+                if dropped:
+                    stats.dropped += 1
+                else:
+                    msg = Message(src, dst, payload, size)
+                timers.append(loop.call_later(latency * scale, arrive, msg, dst))
+
+        async def receive(dst: str) -> Tuple[List[Message], float]:
+            expected = addressed[dst]
+            target = math.ceil(quorum * expected) if quorum is not None else expected
+            got: List[Message] = []
+            for _ in range(expected):
+                if len(got) >= target:
+                    break
+                timeout = None
+                if deadline_s is not None:
+                    timeout = deadline_s * scale - (loop.time() - started)
+                    if timeout <= 0:
+                        break
+                try:
+                    msg = await asyncio.wait_for(queues[dst].get(), timeout)
+                except asyncio.TimeoutError:
+                    break
+                if msg is not None:
+                    got.append(msg)
+            return got, now()
+
+        senders = [asyncio.ensure_future(send_all(src, outbox)) for src, outbox in by_src.items()]
+        results = await asyncio.gather(*(receive(dst) for dst in addressed))
+        for task in senders:
+            task.cancel()
+        for handle in timers:
+            handle.cancel()
+        await asyncio.gather(*senders, return_exceptions=True)
+
+        delivered: Dict[str, List[Message]] = {}
+        for dst, (got, stopped_at) in zip(addressed, results):
+            delivered[dst] = got
+            stats.arrived[dst] = len(got)
+            stats.delivered += len(got)
+            stats.elapsed_s = max(stats.elapsed_s, stopped_at)
+        stats.unsent = len(messages) - stats.sent
+        stats.late = stats.sent - stats.delivered - stats.dropped
+        return delivered, stats
+
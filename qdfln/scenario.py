@@ -0,0 +1,326 @@
+"""
+Declarative federation scenarios.
+
+A Scenario fixes client and validator counts, the dataset and how it is
+partitioned, the validator stake distribution, and which participants are
+attacking. It can be written in Python or loaded from JSON or YAML
+(YAML needs PyYAML):
+
+    name: stress
+    num_clients: 10000
+    num_validators: 50
+    dataset: synthetic
+    samples_per_client: 32
+    stake_distribution: lognormal
+    shared_identities: true
+    mask_neighbors: 8
+    client_attacks:
+      - {kind: sign_flip, fraction: 0.05}
+    validator_attacks:
+      - {kind: negate, ids: [V7]}
+
+Run one with `python -m qdfln.scenario scenario.yaml`.
+"""
+import argparse
+import json
+import os
+import time
+from dataclasses import asdict, dataclass, field
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+import numpy as np
+import torch
+
+from .client import Client
+from .crypto_utils import get_suite
+from .datasets import Dataset, load_dataset, partition, synthetic_dataset
+from .federation import Federation, GradientAttack
+from .keystore import KeyStore
+from .masking import DEFAULT_NEIGHBORS
+from .network import Network, RoundPolicy
+
+
+def _client_attack(kind: str, factor: float) -> GradientAttack:
+    if kind == "scale":
+        def scaled(g):
+            return g * factor
+        return scaled
+    if kind == "sign_flip":
+        def sign_flipped(g):
+            return -factor * g
+        return sign_flipped
+    if kind == "gaussian":
+        def gaussian(g):
+            return g + factor * torch.randn_like(g)
+        return gaussian
+    if kind == "zero":
+        def zeroed(g):
+            return torch.zeros_like(g)
+        return zeroed
+    raise ValueError(f"Unknown client attack {kind!r}")
+
+
+def _validator_attack(kind: str, factor: float) -> GradientAttack:
+    if kind == "negate":
+        def negated(G):
+            return -G
+        return negated
+    if kind in ("scale", "gaussian", "zero"):
+        return _client_attack(kind, factor)
+    raise ValueError(f"Unknown validator attack {kind!r}")
+
+
+@dataclass
+class AttackSpec:
+    """
+    `kind` is one of scale, sign_flip, gaussian, zero (clients) or negate,
+    scale, gaussian, zero (validators). Targets are `ids` plus a seeded
+    random `fraction` of the remaining participants.
+    """
+
+    kind: str
+    ids: List[str] = field(default_factory=list)
+    fraction: float = 0.0
+    factor: float = 1.0
+
+
+@dataclass
+class Scenario:
+    name: str = "default"
+    num_clients: int = 5
+    num_validators: int = 3
+    rounds: int = 1
+    seed: int = 0
+
+    # A dataset path, "synthetic", or None for the bundled dataset.
+    dataset: Optional[str] = None
+    partition_scheme: Optional[str] = None
+    dirichlet_alpha: float = 0.5
+    samples_per_client: int = 64
+    input_dim: int = 4
+    # logreg, mlp or cnn (see models.py), with e.g. {"hidden": [64, 32]}.
+    model: str = "logreg"
+    model_options: Dict[str, Any] = field(default_factory=dict)
+
+    stake: float = 10.0
+    # uniform, lognormal (sigma = stake_sigma) or pareto (shape = stake_sigma).
+    stake_distribution: str = "uniform"
+    stake_sigma: float = 1.0
+
+    client_attacks: List[AttackSpec] = field(default_factory=list)
+    validator_attacks: List[AttackSpec] = field(default_factory=list)
+
+    # One signing keypair for every client: skips C keygens when identities
+    # do not matter for the experiment.
+    shared_identities: bool = False
+    lr: float = 0.1
+    wire_format: str = "binary"
+    cipher: str = "aes-gcm"
+    # fp16, int8, topk or randk (see compression.py); sparse modes need mask_scale: null.
+    compression: Optional[str] = None
+    compression_options: Dict[str, Any] = field(default_factory=dict)
+    # Used only with validator agg_mode "mean"; other rules run unmasked.
+    mask_scale: Optional[float] = 0.01
+    # Ring neighbours per client on the masking graph; null is the O(C^2) complete graph.
+    mask_neighbors: Optional[int] = DEFAULT_NEIGHBORS
+    validator: Dict[str, Any] = field(default_factory=dict)
+    # Committee mode: each client sends to `committee_size` validators of its shard.
+    committee_size: Optional[int] = None
+    num_shards: Optional[int] = None
+    # Simulated transport: LinkModel fields, "links", "time_scale", and
+    # "stragglers": {fraction, delay_s} for seeded slow clients (see network.py).
+    network: Optional[Dict[str, Any]] = None
+    # RoundPolicy fields: deadline_s, quorum, vote_deadline_s.
+    round_policy: Dict[str, Any] = field(default_factory=dict)
+    storage_dir: Optional[str] = None
+    # A preset name from crypto_utils.SUITE_PRESETS, e.g. "ml-dsa" or "falcon".
+    crypto_suite: str = "default"
+
+    @classmethod
+    def from_dict(cls, data: Dict[str, Any]) -> "Scenario":
+        data = dict(data)
+        for key in ("client_attacks", "validator_attacks"):
+            data[key] = [a if isinstance(a, AttackSpec) else AttackSpec(**a) for a in data.get(key, [])]
+        return cls(**data)
+
+    def to_dict(self) -> Dict[str, Any]:
+        return asdict(self)
+
+    def client_ids(self) -> List[str]:
+        return [f"C{i + 1}" for i in range(self.num_clients)]
+
+    def validator_ids(self) -> List[str]:
+        return [f"V{i + 1}" for i in range(self.num_validators)]
+
+    def stakes(self) -> Dict[str, float]:
+        ids = self.validator_ids()
+        rng = np.random.default_rng(self.seed)
+        if self.stake_distribution == "uniform":
+            values = np.full(len(ids), self.stake)
+        elif self.stake_distribution == "lognormal":
+            values = self.stake * rng.lognormal(0.0, self.stake_sigma, len(ids))
+        elif self.stake_distribution == "pareto":
+            values = self.stake * (1.0 + rng.pareto(self.stake_sigma, len(ids)))
+        else:
+            raise ValueError(f"Unknown stake distribution {self.stake_distribution!r}")
+        return {vid: float(s) for vid, s in zip(ids, values)}
+
+    def _targets(self, specs: List[AttackSpec], ids: List[str], make) -> Dict[str, GradientAttack]:
+        rng = np.random.default_rng(self.seed + 1)
+        attacks: Dict[str, GradientAttack] = {}
+        for spec in specs:
+            chosen = list(spec.ids)
+            rest = [i for i in ids if i not in attacks and i not in chosen]
+            n_random = int(round(spec.fraction * len(ids)))
+            if n_random and rest:
+                chosen += list(rng.choice(rest, size=min(n_random, len(rest)), replace=False))
+            attack = make(spec.kind, spec.factor)
+            for target in chosen:
+                attacks[str(target)] = attack
+        return attacks
+
+    def _network(self) -> Optional[Network]:
+        if self.network is None:
+            return None
+        spec = dict(self.network)
+        stragglers = spec.pop("stragglers", None)
+        spec.setdefault("seed", self.seed)
+        network = Network.from_dict(spec)
+        if stragglers:
+            rng = np.random.default_rng(self.seed + 2)
+            ids = self.client_ids()
+            n = int(round(stragglers.get("fraction", 0.0) * len(ids)))
+            for cid in rng.choice(ids, size=min(n, len(ids)), replace=False):
+                network.node_delay[str(cid)] = stragglers["delay_s"]
+        return network
+
+    def _dataset(self) -> Optional[Dataset]:
+        if self.dataset == "synthetic":
+            return synthetic_dataset(self.num_clients * self.samples_per_client, self.input_dim, self.seed)
+        if self.dataset is not None:
+            return load_dataset(self.dataset, cache_dir=os.environ.get("QDFLN_DATA_CACHE"))
+        return None
+
+    def client_data(self) -> Tuple[Dict[str, Tuple[np.ndarray, np.ndarray]], int]:
+        """
+        Each client's (X, y) and the input dimension. The dataset is loaded and
+        partitioned on first use and kept until a field it depends on changes,
+        so repeated builds (e.g. a benchmark sweep) skip the parsing.
+        """
+        key = (
+            self.dataset, self.partition_scheme, self.dirichlet_alpha, self.num_clients,
+            self.samples_per_client, self.input_dim, self.seed,
+        )
+        cached = getattr(self, "_client_data", None)
+        if cached is not None and cached[0] == key:
+            return cached[1]
+
+        from .pipeline import _default_dataset
+
+        dataset = self._dataset()
+        scheme = self.partition_scheme
+        if dataset is None:
+            found = _default_dataset()
+            if found is None:
+                raise ValueError(
+                    "No bundled dataset found under qdfln/data; set dataset to a file path or 'synthetic'"
+                )
+            dataset, default_scheme = found
+            scheme = scheme or default_scheme
+        parts = partition(
+            dataset, self.client_ids(), scheme=scheme or "iid", alpha=self.dirichlet_alpha, seed=self.seed
+        )
+        self._client_data = (key, (parts, dataset.input_dim))
+        return parts, dataset.input_dim
+
+    def build_clients(self, key_store: KeyStore) -> List[Client]:
+        parts, input_dim = self.client_data()
+        suite = get_suite(self.crypto_suite)
+        shared = key_store.sig_identity("shared", suite) if self.shared_identities else None
+        return [
+            Client(cid, X_local, y_local, input_dim, shared or key_store.sig_identity(cid, suite), suite)
+            for cid, (X_local, y_local) in parts.items()
+        ]
+
+    def build(self, key_store: Optional[KeyStore] = None) -> Federation:
+        if key_store is None:
+            key_store = KeyStore()
+        clients = self.build_clients(key_store)
+        return Federation(
+            clients,
+            clients[0].X.shape[1],
+            model=self.model,
+            model_options=dict(self.model_options),
+            validator_ids=self.validator_ids(),
+            key_store=key_store,
+            stake=self.stakes(),
+            lr=self.lr,
+            validator_kwargs=dict(self.validator),
+            wire_format=self.wire_format,
+            cipher=self.cipher,
+            compression=self.compression,
+            compression_options={"seed": self.seed, **self.compression_options},
+            committee_size=self.committee_size,
+            num_shards=self.num_shards,
+            network=self._network(),
+            round_policy=RoundPolicy(**self.round_policy),
+            storage_dir=self.storage_dir,
+            mask_scale=self.mask_scale,
+            mask_neighbors=self.mask_neighbors,
+            client_attacks=self._targets(self.client_attacks, [c.id for c in clients], _client_attack),
+            validator_attacks=self._targets(self.validator_attacks, self.validator_ids(), _validator_attack),
+            crypto_suite=self.crypto_suite,
+        )
+
+
+def load_scenario(path: str) -> Scenario:
+    with open(path) as f:
+        if path.lower().endswith((".yaml", ".yml")):
+            try:
+                import yaml
+            except ImportError:
+                raise ImportError("YAML scenarios need PyYAML: pip install pyyaml")
+            data = yaml.safe_load(f)
+        else:
+            data = json.load(f)
+    return Scenario.from_dict(data)
+
+
+def run_scenario(scenario: Scenario, log: Optional[Callable[[str], None]] = None) -> Dict[str, Any]:
+    """Build and run a scenario; returns setup time and per-round results."""
+    started = time.perf_counter()
+    federation = scenario.build()
+    setup_s = time.perf_counter() - started
+    results = federation.run(scenario.rounds, log=log)
+    return {
+        "scenario": scenario.to_dict(),
+        "setup_s": round(setup_s, 4),
+        "rounds": results,
+    }
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Run a QDFLN scenario file")
+    parser.add_argument("path", help="scenario .json, .yaml or .yml")
+    parser.add_argument("--rounds", type=int, default=None, help="override the scenario's round count")
+    parser.add_argument("--quiet", action="store_true", help="only print the round summaries")
+    args = parser.parse_args()
+
+    scenario = load_scenario(args.path)
+    if args.rounds is not None:
+        scenario.rounds = args.rounds
+    report = run_scenario(scenario, log=(lambda line: None) if args.quiet else print)
+    for result in report["rounds"]:
+        network = result["network"]
+        print(json.dumps({
+            "round_id": result["round_id"],
+            "duration_s": result["duration_s"],
+            "round_time_s": network["round_time_s"] if network else None,
+            "consensus": bool(result["consensus"]),
+            "fraudsters": result["consensus"].get("fraudsters", []),
+        }))
+    print(f"setup: {report['setup_s']:.2f}s")
+
+
+if __name__ == "__main__":
+    main()
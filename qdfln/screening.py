@@ -0,0 +1,136 @@
+"""
+Batched anomaly screening.
+
+A validator first opens all of a round's packets. It then screens the
+gradients that opened cleanly together, as one C x D matrix, against the
+reference gradient as it stood at the start of the round. Each detector is
+a single vectorized pass, so verdicts do not depend on arrival order:
+
+    norm     ||g_i|| > norm_threshold                               reject
+    cosine   cos(g_i, ref) < cos_threshold                          anomaly
+    median   ||g_i - med|| / median_j ||g_j - med|| > median_threshold
+             (med is the coordinate-wise median)                    anomaly
+    cluster  Krum score of g_i (summed squared distances to its
+             n - f - 2 nearest neighbours) / median score
+             > cluster_threshold                                    anomaly
+
+The median and cluster detectors are off unless given a threshold. They
+run over the rows that passed the norm check. The cluster detector needs
+the C x C distance matrix. An anomalous client gains one suspicion point
+per round and is blocked once it reaches max_suspicion (see Validator).
+
+The reference gradient then moves toward the mean of the accepted rows.
+It gets the total weight that n sequential EMA steps would give:
+ref <- beta^n * ref + (1 - beta^n) * mean.
+"""
+from dataclasses import dataclass
+from typing import List, Optional
+
+import torch
+
+from .aggregation import _byzantine_count, _krum_scores
+
+_EPS = 1e-12
+
+
+def row_norms(G: torch.Tensor) -> torch.Tensor:
+    return torch.linalg.vector_norm(G, dim=1)
+
+
+def cosine_to(G: torch.Tensor, ref: torch.Tensor, norms: Optional[torch.Tensor] = None) -> torch.Tensor:
+    """Cosine similarity of every row of G with `ref` (0 for zero vectors)."""
+    if norms is None:
+        norms = row_norms(G)
+    denom = (norms * torch.linalg.vector_norm(ref)).clamp_min(_EPS)
+    return (G @ ref) / denom
+
+
+def median_scores(G: torch.Tensor) -> torch.Tensor:
+    """Distance of each row to the coordinate-wise median, relative to the median such distance."""
+    med = G.median(dim=0).values
+    dists = row_norms(G - med)
+    return dists / dists.median().clamp_min(_EPS)
+
+
+def cluster_scores(G: torch.Tensor, byzantine_ratio: float = 0.2) -> torch.Tensor:
+    """Krum scores relative to their median: large for rows far from every dense cluster."""
+    n = G.shape[0]
+    if n < 3:
+        return torch.ones(n)
+    sq_dists = torch.cdist(G, G, compute_mode="use_mm_for_euclid_dist").pow_(2)
+    scores = _krum_scores(sq_dists, _byzantine_count(n, byzantine_ratio, None))
+    return scores / scores.median().clamp_min(_EPS)
+
+
+def update_reference(ref: Optional[torch.Tensor], accepted: torch.Tensor, beta: float = 0.9) -> Optional[torch.Tensor]:
+    """Order-independent EMA step over a batch of accepted rows."""
+    n = accepted.shape[0]
+    if n == 0:
+        return ref
+    mean = accepted.mean(dim=0)
+    if ref is None:
+        return mean
+    keep = beta ** n
+    return keep * ref + (1.0 - keep) * mean
+
+
+@dataclass
+class ScreeningResult:
+    norms: torch.Tensor
+    rejected: torch.Tensor
+    anomalous: torch.Tensor
+    cosines: Optional[torch.Tensor] = None
+    median_scores: Optional[torch.Tensor] = None
+    cluster_scores: Optional[torch.Tensor] = None
+    # Per-detector anomaly flags, in the order of DETECTORS.
+    flags: Optional[torch.Tensor] = None
+
+    DETECTORS = ("cosine", "median", "cluster")
+
+    def reasons(self, row: int) -> List[str]:
+        if self.flags is None:
+            return []
+        return [name for name, hit in zip(self.DETECTORS, self.flags[row].tolist()) if hit]
+
+
+class Screener:
+    def __init__(
+        self,
+        norm_threshold: float = 10.0,
+        cos_threshold: float = -0.2,
+        median_threshold: Optional[float] = None,
+        cluster_threshold: Optional[float] = None,
+        byzantine_ratio: float = 0.2,
+    ):
+        self.norm_threshold = norm_threshold
+        self.cos_threshold = cos_threshold
+        self.median_threshold = median_threshold
+        self.cluster_threshold = cluster_threshold
+        self.byzantine_ratio = byzantine_ratio
+
+    def screen(self, G: torch.Tensor, ref: Optional[torch.Tensor] = None) -> ScreeningResult:
+        n = G.shape[0]
+        norms = row_norms(G)
+        rejected = norms > self.norm_threshold
+        flags = torch.zeros(n, len(ScreeningResult.DETECTORS), dtype=torch.bool)
+        result = ScreeningResult(norms, rejected, flags.any(dim=1), flags=flags)
+
+        if ref is not None:
+            result.cosines = cosine_to(G, ref, norms)
+            flags[:, 0] = result.cosines < self.cos_threshold
+
+        kept = (~rejected).nonzero().view(-1)
+        if self.median_threshold is not None and len(kept):
+            scores = torch.full((n,), float("nan"))
+            scores[kept] = median_scores(G[kept])
+            result.median_scores = scores
+            flags[kept, 1] = scores[kept] > self.median_threshold
+        if self.cluster_threshold is not None and len(kept):
+            scores = torch.full((n,), float("nan"))
+            scores[kept] = cluster_scores(G[kept], self.byzantine_ratio)
+            result.cluster_scores = scores
+            flags[kept, 2] = scores[kept] > self.cluster_threshold
+
+        # Rejected rows are not also counted as anomalies.
+        result.anomalous = flags.any(dim=1) & ~rejected
+        return result
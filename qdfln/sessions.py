@@ -0,0 +1,196 @@
+import threading
+import time
+import uuid
+from concurrent.futures import Executor, Future, ThreadPoolExecutor
+from typing import Any, Callable, Dict, List, Optional
+
+from .federation import Federation
+from .keystore import KeyStore
+from .pipeline import build_federation
+
+
+def _copy_job(job: Dict[str, Any]) -> Dict[str, Any]:
+    return {**job, "results": list(job["results"])}
+
+
+class Session:
+    """A long-lived federation plus the lock that serializes its rounds."""
+
+    def __init__(self, session_id: str, federation: Federation):
+        self.id = session_id
+        self.federation = federation
+        self.lock = threading.Lock()
+        self.created = time.time()
+        self.job_ids: List[str] = []
+
+    def summary(self) -> Dict[str, Any]:
+        fed = self.federation
+        return {
+            "session_id": self.id,
+            "created": self.created,
+            "round_id": fed.round_id,
+            "clients": [c.id for c in fed.clients],
+            "validators": [v.id for v in fed.validators],
+            "stake": dict(fed.chain.stake),
+            "reputation": dict(fed.chain.reputation),
+            "jobs": list(self.job_ids),
+        }
+
+
+class SessionManager:
+    """
+    Keeps federations alive between API requests and runs their rounds as
+    background jobs on a worker pool, so request handlers never block on
+    torch or PQC work.
+
+    Job records are dropped with their session, and finished ones also
+    `job_ttl` seconds after they finish (None keeps them).
+    """
+
+    def __init__(
+        self,
+        executor: Optional[Executor] = None,
+        key_store: Optional[KeyStore] = None,
+        max_workers: Optional[int] = None,
+        job_ttl: Optional[float] = 3600.0,
+        clock: Callable[[], float] = time.time,
+    ):
+        self.executor = executor if executor is not None else ThreadPoolExecutor(max_workers=max_workers)
+        self.key_store = key_store
+        self.job_ttl = job_ttl
+        self.clock = clock
+        self.sessions: Dict[str, Session] = {}
+        self.jobs: Dict[str, Dict[str, Any]] = {}
+        self.futures: Dict[str, Future] = {}
+        self.default_session_id: Optional[str] = None
+        self._lock = threading.Lock()
+        self._default_lock = threading.Lock()
+
+    def create_session(self, **federation_kwargs: Any) -> Session:
+        """Build a federation (blocking: loads data and keys) and register it."""
+        federation = build_federation(key_store=self.key_store, **federation_kwargs)
+        session = Session(uuid.uuid4().hex, federation)
+        with self._lock:
+            self.sessions[session.id] = session
+        return session
+
+    def default_session(self, **federation_kwargs: Any) -> Session:
+        """
+        The session behind endpoints that take no session id, created on
+        first use (blocking) and again after it is deleted.
+        """
+        with self._default_lock:
+            with self._lock:
+                session = self.sessions.get(self.default_session_id)
+            if session is None:
+                session = self.create_session(**federation_kwargs)
+                self.default_session_id = session.id
+            return session
+
+    def get_session(self, session_id: str) -> Session:
+        with self._lock:
+            if session_id not in self.sessions:
+                raise KeyError(f"Unknown session {session_id}")
+            return self.sessions[session_id]
+
+    def delete_session(self, session_id: str) -> None:
+        """Forget the session and its jobs. A running job finishes, but its record is gone."""
+        with self._lock:
+            session = self.sessions.pop(session_id, None)
+            if session is None:
+                raise KeyError(f"Unknown session {session_id}")
+            for job_id in session.job_ids:
+                self._drop_job(job_id)
+
+    def _drop_job(self, job_id: str) -> None:
+        self.jobs.pop(job_id, None)
+        self.futures.pop(job_id, None)
+
+    def _prune_jobs(self) -> None:
+        """Drop finished jobs older than job_ttl; call with the lock held."""
+        if self.job_ttl is None:
+            return
+        cutoff = self.clock() - self.job_ttl
+        for job_id, job in list(self.jobs.items()):
+            if job["finished"] is not None and job["finished"] <= cutoff:
+                self._drop_job(job_id)
+                session = self.sessions.get(job["session_id"])
+                if session is not None and job_id in session.job_ids:
+                    session.job_ids.remove(job_id)
+
+    def submit_rounds(
+        self,
+        session_id: str,
+        rounds: int = 1,
+        on_event: Optional[Callable[[Dict[str, Any]], None]] = None,
+    ) -> Dict[str, Any]:
+        """
+        Queue `rounds` rounds on the session and return a copy of the job
+        record immediately. `on_event` is called from the worker thread with
+        every round event as it is produced.
+        """
+        if rounds < 1:
+            raise ValueError("rounds must be >= 1")
+        session = self.get_session(session_id)
+        job = {
+            "job_id": uuid.uuid4().hex,
+            "session_id": session_id,
+            "rounds": rounds,
+            "status": "queued",
+            "submitted": self.clock(),
+            "started": None,
+            "finished": None,
+            "completed_rounds": 0,
+            "results": [],
+            "last_event": None,
+            "error": None,
+        }
+        with self._lock:
+            self._prune_jobs()
+            self.jobs[job["job_id"]] = job
+            session.job_ids.append(job["job_id"])
+            self.futures[job["job_id"]] = self.executor.submit(self._run_job, session, job, on_event)
+            return _copy_job(job)
+
+    def _run_job(
+        self,
+        session: Session,
+        job: Dict[str, Any],
+        on_event: Optional[Callable[[Dict[str, Any]], None]],
+    ) -> Dict[str, Any]:
+        with session.lock:
+            job["status"] = "running"
+            job["started"] = self.clock()
+            try:
+                for _ in range(job["rounds"]):
+                    for event in session.federation.iter_round():
+                        job["last_event"] = event["type"]
+                        if on_event is not None:
+                            on_event(event)
+                    job["results"].append(event["result"])
+                    job["completed_rounds"] += 1
+                job["status"] = "done"
+            except Exception as exc:
+                job["status"] = "failed"
+                job["error"] = repr(exc)
+            finally:
+                job["finished"] = self.clock()
+        return _copy_job(job)
+
+    def get_job(self, job_id: str) -> Dict[str, Any]:
+        """A snapshot of the job record; the worker keeps updating the original."""
+        with self._lock:
+            self._prune_jobs()
+            if job_id not in self.jobs:
+                raise KeyError(f"Unknown job {job_id}")
+            return _copy_job(self.jobs[job_id])
+
+    def job_future(self, job_id: str) -> Future:
+        """Resolves to the final job record (a copy) once the job has finished."""
+        with self._lock:
+            if job_id not in self.futures:
+                raise KeyError(f"Unknown job {job_id}")
+            return self.futures[job_id]
+
+    def shutdown(self) -> None:
+        self.executor.shutdown(wait=False, cancel_futures=True)
@@ -0,0 +1,222 @@
+"""
+Durable federation state.
+
+- BlockStore: finalized blocks appended as JSON lines to `blocks.jsonl`, with
+  a fixed-width `blocks.idx` of (round_id, offset, length) records so any
+  block is one seek + read away.
+- Tensors (global model, aggregates, validator reference gradients) are raw
+  little-endian float32 files, memory-mapped copy-on-write when loaded.
+- FederationStore ties both together with an atomically replaced
+  `state.json`, so a federation resumes after a crash without replaying rounds.
+  Blocks are appended before the round's checkpoint, so blocks past the
+  checkpoint height belong to rounds whose model update never landed; they
+  are dropped on resume and those rounds run again.
+"""
+import json
+import os
+import struct
+from typing import Any, Dict, Iterator, List, Optional, Set
+
+import numpy as np
+import torch
+
+from .blockchain import Block
+
+_INDEX_RECORD = struct.Struct("<qQQ")
+
+
+def _atomic_write_bytes(path: str, data: bytes) -> None:
+    tmp = path + ".tmp"
+    with open(tmp, "wb") as f:
+        f.write(data)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp, path)
+
+
+def save_tensor(path: str, tensor: torch.Tensor) -> None:
+    """Write a tensor as raw float32 (shape is the caller's business)."""
+    data = tensor.detach().to(torch.float32).contiguous().numpy().astype("<f4", copy=False)
+    _atomic_write_bytes(path, data.tobytes())
+
+
+def load_tensor(path: str) -> torch.Tensor:
+    """Memory-map a raw float32 file; pages are read lazily and writes stay private."""
+    if os.path.getsize(path) == 0:
+        return torch.zeros(0)
+    return torch.from_numpy(np.memmap(path, dtype="<f4", mode="c"))
+
+
+class BlockStore:
+    def __init__(self, directory: str, fsync: bool = True):
+        os.makedirs(directory, exist_ok=True)
+        self.data_path = os.path.join(directory, "blocks.jsonl")
+        self.index_path = os.path.join(directory, "blocks.idx")
+        self.fsync = fsync
+        self._offsets: Dict[int, tuple] = {}
+        self._order: List[int] = []
+        self._recover()
+
+    def _recover(self) -> None:
+        """Load the index, dropping a torn trailing record or one past the data file's end."""
+        data_size = os.path.getsize(self.data_path) if os.path.exists(self.data_path) else 0
+        if not os.path.exists(self.index_path):
+            return
+        with open(self.index_path, "rb") as f:
+            raw = f.read()
+        valid = 0
+        for pos in range(0, len(raw) - _INDEX_RECORD.size + 1, _INDEX_RECORD.size):
+            round_id, offset, length = _INDEX_RECORD.unpack_from(raw, pos)
+            if offset + length > data_size:
+                break
+            self._offsets[round_id] = (offset, length)
+            self._order.append(round_id)
+            valid = pos + _INDEX_RECORD.size
+        if valid != len(raw):
+            with open(self.index_path, "r+b") as f:
+                f.truncate(valid)
+
+    def __len__(self) -> int:
+        return len(self._order)
+
+    def __contains__(self, round_id: int) -> bool:
+        return round_id in self._offsets
+
+    def append(self, block: Block) -> None:
+        line = (json.dumps(block.to_dict(), sort_keys=True) + "\n").encode("utf-8")
+        with open(self.data_path, "ab") as f:
+            offset = f.tell()
+            f.write(line)
+            f.flush()
+            if self.fsync:
+                os.fsync(f.fileno())
+        # The index record is written only after its block is durable.
+        with open(self.index_path, "ab") as f:
+            f.write(_INDEX_RECORD.pack(block.round_id, offset, len(line)))
+            f.flush()
+            if self.fsync:
+                os.fsync(f.fileno())
+        self._offsets[block.round_id] = (offset, len(line))
+        self._order.append(block.round_id)
+
+    def truncate(self, length: int) -> None:
+        """Drop every block after the first `length`, on disk and in the index."""
+        if length >= len(self._order):
+            return
+        dropped = self._order[length:]
+        data_end = self._offsets[dropped[0]][0]
+        # Index first, so a crash in between leaves no record pointing past the data.
+        with open(self.index_path, "r+b") as f:
+            f.truncate(length * _INDEX_RECORD.size)
+        with open(self.data_path, "r+b") as f:
+            f.truncate(data_end)
+        for round_id in dropped:
+            del self._offsets[round_id]
+        del self._order[length:]
+
+    def get(self, round_id: int) -> Optional[Block]:
+        entry = self._offsets.get(round_id)
+        if entry is None:
+            return None
+        offset, length = entry
+        with open(self.data_path, "rb") as f:
+            f.seek(offset)
+            return Block.from_dict(json.loads(f.read(length)))
+
+    def last(self) -> Optional[Block]:
+        return self.get(self._order[-1]) if self._order else None
+
+    def iter_blocks(self, start: int = 0, stop: Optional[int] = None) -> Iterator[Block]:
+        """Blocks by chain position, read one at a time."""
+        with open(self.data_path, "rb") as f:
+            for round_id in self._order[start:stop]:
+                offset, length = self._offsets[round_id]
+                f.seek(offset)
+                yield Block.from_dict(json.loads(f.read(length)))
+
+
+class FederationStore:
+    """On-disk layout for one federation: state.json, blocks/ and tensors/."""
+
+    def __init__(self, directory: str, keep_checkpoints: Optional[int] = None):
+        self.directory = directory
+        self.keep_checkpoints = keep_checkpoints
+        self.state_path = os.path.join(directory, "state.json")
+        self.tensor_dir = os.path.join(directory, "tensors")
+        os.makedirs(self.tensor_dir, exist_ok=True)
+        self.blocks = BlockStore(os.path.join(directory, "blocks"))
+
+    def _tensor_path(self, name: str) -> str:
+        return os.path.join(self.tensor_dir, f"{name}.f32")
+
+    def has_state(self) -> bool:
+        return os.path.exists(self.state_path)
+
+    def save_tensor(self, name: str, tensor: torch.Tensor) -> None:
+        save_tensor(self._tensor_path(name), tensor)
+
+    def load_tensor(self, name: str) -> Optional[torch.Tensor]:
+        path = self._tensor_path(name)
+        return load_tensor(path) if os.path.exists(path) else None
+
+    def save_round(
+        self,
+        round_id: int,
+        state: Dict[str, Any],
+        model: torch.Tensor,
+        aggregate: Optional[torch.Tensor] = None,
+        ref_grads: Optional[Dict[str, torch.Tensor]] = None,
+    ) -> None:
+        """
+        Checkpoint one round: tensors first, then the state file that points
+        at them. Reference gradients are written under per-round names, so
+        the previous checkpoint's files stay intact until the new state.json
+        has replaced the old one; they are removed after that.
+        """
+        self.save_tensor(f"model_round_{round_id:08d}", model)
+        if aggregate is not None:
+            self.save_tensor(f"aggregate_round_{round_id:08d}", aggregate)
+        ref_names = {vid: f"ref_grad_{vid}_round_{round_id:08d}" for vid in ref_grads or {}}
+        for vid, ref in (ref_grads or {}).items():
+            self.save_tensor(ref_names[vid], ref)
+        state = {**state, "round_id": round_id, "ref_grads": ref_names}
+        _atomic_write_bytes(self.state_path, json.dumps(state).encode("utf-8"))
+        self._prune_ref_grads(set(ref_names.values()))
+        if self.keep_checkpoints is not None:
+            self._prune_checkpoints(round_id - self.keep_checkpoints)
+
+    def _tensor_names(self, prefix: str) -> Iterator[str]:
+        """Names of stored tensors starting with `prefix`; leftover `.tmp` files are skipped."""
+        for filename in os.listdir(self.tensor_dir):
+            if filename.startswith(prefix) and filename.endswith(".f32"):
+                yield filename[: -len(".f32")]
+
+    def _prune_checkpoints(self, before_round: int) -> None:
+        for prefix in ("model_round_", "aggregate_round_"):
+            for name in list(self._tensor_names(prefix)):
+                if int(name[len(prefix) :]) <= before_round:
+                    os.remove(self._tensor_path(name))
+
+    def _prune_ref_grads(self, keep: Set[str]) -> None:
+        for name in list(self._tensor_names("ref_grad_")):
+            if name not in keep:
+                os.remove(self._tensor_path(name))
+
+    def load_ref_grads(self, state: Dict[str, Any]) -> Dict[str, torch.Tensor]:
+        """Reference gradients recorded in `state`, by validator id."""
+        refs = {}
+        for vid, name in state.get("ref_grads", {}).items():
+            ref = self.load_tensor(name)
+            if ref is not None:
+                refs[vid] = ref
+        return refs
+
+    def load_state(self) -> Dict[str, Any]:
+        with open(self.state_path) as f:
+            return json.load(f)
+
+    def load_model(self, round_id: int) -> Optional[torch.Tensor]:
+        return self.load_tensor(f"model_round_{round_id:08d}")
+
+    def load_aggregate(self, round_id: int) -> Optional[torch.Tensor]:
+        return self.load_tensor(f"aggregate_round_{round_id:08d}")
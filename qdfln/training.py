@@ -0,0 +1,87 @@
+from typing import List, Optional
+
+import torch
+import torch.nn as nn
+import torch.nn.functional as F
+
+from . import client as client_module
+from .client import Client, apply_dp_noise
+
+
+def supports_batched(clients: List[Client]) -> bool:
+    """Batched training covers clients whose model is a single nn.Linear(d, 1)."""
+    if not clients:
+        return False
+    dim = clients[0].X.shape[1]
+    return all(
+        isinstance(c.model, nn.Linear)
+        and c.model.out_features == 1
+        and c.model.bias is not None
+        and c.model.in_features == dim
+        and c.X.shape[1] == dim
+        for c in clients
+    )
+
+
+class BatchedTrainer:
+    """
+    Trains every client's logistic-regression model at once. All samples are
+    concatenated into one segmented batch (no padding), each sample gathers
+    its client's weight row, and per-client mean BCE losses are summed so one
+    backward pass yields every client's gradient. Data is stacked once and
+    reused across rounds.
+    """
+
+    def __init__(self, clients: List[Client]):
+        if not supports_batched(clients):
+            raise ValueError("BatchedTrainer needs clients with nn.Linear(d, 1) models")
+        self.clients = clients
+        self.X = torch.cat([c.X for c in clients], dim=0)
+        self.y = torch.cat([c.y for c in clients], dim=0)
+        counts = torch.tensor([c.X.shape[0] for c in clients])
+        self.seg = torch.repeat_interleave(torch.arange(len(clients)), counts)
+        self.inv_counts = 1.0 / counts.to(torch.float32)
+
+    def _loss(self, W: torch.Tensor, b: torch.Tensor) -> torch.Tensor:
+        logits = (self.X * W[self.seg]).sum(dim=1) + b[self.seg]
+        per_sample = F.binary_cross_entropy_with_logits(logits, self.y, reduction="none")
+        per_client = torch.zeros(W.shape[0]).index_add_(0, self.seg, per_sample)
+        return (per_client * self.inv_counts).sum()
+
+    def local_train_and_compute_gradients(
+        self,
+        epochs: int = 1,
+        lr: float = 0.1,
+        W0: Optional[torch.Tensor] = None,
+        b0: Optional[torch.Tensor] = None,
+    ) -> torch.Tensor:
+        """
+        Batched equivalent of Client.local_train_and_compute_gradient for all
+        clients. Starts from each client's current model (or W0/b0), writes the
+        trained weights back and returns a C x D gradient matrix whose rows use
+        the flatten_gradients layout [weight..., bias].
+        """
+        if W0 is None:
+            W0 = torch.stack([c.model.weight.data.view(-1) for c in self.clients])
+        if b0 is None:
+            b0 = torch.cat([c.model.bias.data.view(-1) for c in self.clients])
+        W = W0.detach().clone().requires_grad_(True)
+        b = b0.detach().clone().requires_grad_(True)
+
+        for _ in range(epochs):
+            gW, gb = torch.autograd.grad(self._loss(W, b), (W, b))
+            with torch.no_grad():
+                W.sub_(lr * gW)
+                b.sub_(lr * gb)
+
+        gW, gb = torch.autograd.grad(self._loss(W, b), (W, b))
+        grads = torch.cat([gW, gb.unsqueeze(1)], dim=1)
+
+        with torch.no_grad():
+            for i, c in enumerate(self.clients):
+                c.model.weight.data.copy_(W[i].view_as(c.model.weight))
+                c.model.bias.data.copy_(b[i].view_as(c.model.bias))
+
+        if client_module.USE_DP:
+            grads = torch.stack([apply_dp_noise(g) for g in grads])
+        return grads.detach()
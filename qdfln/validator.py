@@ -1,10 +1,176 @@
-from typing import Dict, List, Tuple, Optional
+import base64
+import binascii
+import os
+from concurrent.futures import Executor, ProcessPoolExecutor, ThreadPoolExecutor
+from typing import Dict, List, Tuple, Optional, Union
 
+import numpy as np
 import torch
-import torch.nn.functional as F
-from cryptography.fernet import Fernet
+from cryptography.exceptions import InvalidTag
 
-from .crypto_utils import hash_bytes, pqc_sig_verify
+from . import wire
+from .aggregation import Aggregator, make_aggregator
+from .channel import NONCE_SIZE, SessionChannels, channel_for
+from .compression import CompressionError, decompress
+from .crypto_utils import CryptoSuite, DEFAULT_SUITE, SignatureCache
+from .masking import PairwiseMasking
+from .merkle import DEFAULT_CHUNK_SIZE, QUANTUM, MerkleTree, recompute_leaves
+from .metrics import (
+    AGGREGATION_SECONDS,
+    COSINE_ANOMALIES,
+    DECOMPRESS_SECONDS,
+    DECRYPT_SECONDS,
+    OUTLIER_ANOMALIES,
+    PACKETS_ACCEPTED,
+    PACKETS_REJECTED,
+    VERIFY_SECONDS,
+)
+from .screening import Screener, ScreeningResult, update_reference
+
+
+def _verify_packet_signature(
+    packet: Dict,
+    g_bytes: bytes,
+    sig_cache: Optional[SignatureCache],
+    suite: Optional[CryptoSuite] = None,
+    public_key: Optional[bytes] = None,
+) -> bool:
+    """Check a dict packet's signature with `public_key`, or the key it embeds if None."""
+    signature = bytes.fromhex(packet["signature"])
+    if public_key is None:
+        public_key = bytes.fromhex(packet["sig_public_key"])
+    if sig_cache is None:
+        with VERIFY_SECONDS.time("false"):
+            return (suite or DEFAULT_SUITE).verify(public_key, g_bytes, signature)
+    return sig_cache.verify(public_key, g_bytes, signature, suite=suite)
+
+
+# Rejection reason codes and the log message printed for each.
+REJECT_MESSAGES = {
+    "no_key": "No QKD key",
+    "format": "Malformed packet",
+    "identity": "Unknown signing key",
+    "decrypt": "Decryption failed",
+    "signature": "Signature mismatch",
+    "replay": "Packet for another round or validator, or a repeat",
+    "dim": "Gradient dim mismatch",
+    "compression": "Malformed compressed payload",
+    "norm": "Norm anomaly",
+    "blocked": "Blocked after repeated anomalies",
+}
+
+
+def _expand_payload(payload: bytes, grad_dim: int, compressed: bool) -> Tuple[Optional[bytes], Optional[str]]:
+    """Dense float32 gradient bytes from a verified payload."""
+    if not compressed:
+        if len(payload) != 4 * grad_dim:
+            return None, "dim"
+        return payload, None
+    try:
+        with DECOMPRESS_SECONDS.time():
+            return decompress(payload, grad_dim).tobytes(), None
+    except CompressionError:
+        return None, "compression"
+
+
+def _stale(got_round: int, got_validator: str, round_id: Optional[int], validator_id: Optional[str]) -> bool:
+    return (round_id is not None and got_round != round_id) or (
+        validator_id is not None and got_validator != validator_id
+    )
+
+
+def _open_binary_packet(
+    packet: wire.Buffer,
+    key: Union[bytes, SessionChannels],
+    grad_dim: int,
+    sig_cache: Optional[SignatureCache],
+    public_key: Optional[bytes],
+    suite: Optional[CryptoSuite],
+    round_id: Optional[int],
+    validator_id: Optional[str],
+) -> Tuple[Optional[bytes], Optional[str]]:
+    try:
+        view = wire.parse_packet(packet)
+    except wire.WireFormatError:
+        return None, "format"
+    # The header is AEAD-authenticated below; this makes it fresh and addressed to us.
+    if _stale(view.round_id, view.validator_id, round_id, validator_id):
+        return None, "replay"
+    if public_key is None or wire.fingerprint(public_key) != view.public_key_fingerprint:
+        return None, "identity"
+    if not view.compressed and view.length != 4 * grad_dim:
+        return None, "dim"
+    try:
+        with DECRYPT_SECONDS.time("binary"):
+            g_bytes = view.decrypt(key)
+    except InvalidTag:
+        return None, "decrypt"
+
+    # The AEAD tag already authenticates the payload, so no separate hash check.
+    signature = bytes(view.signature)
+    if sig_cache is None:
+        with VERIFY_SECONDS.time("false"):
+            ok = (suite or DEFAULT_SUITE).verify(public_key, g_bytes, signature)
+    else:
+        ok = sig_cache.verify(public_key, g_bytes, signature, suite=suite)
+    if not ok:
+        return None, "signature"
+    return _expand_payload(g_bytes, grad_dim, view.compressed)
+
+
+def open_packet(
+    packet: Union[Dict, wire.Buffer],
+    key: Union[bytes, SessionChannels],
+    grad_dim: int,
+    sig_cache: Optional[SignatureCache] = None,
+    public_key: Optional[bytes] = None,
+    suite: Optional[CryptoSuite] = None,
+    round_id: Optional[int] = None,
+    validator_id: Optional[str] = None,
+) -> Tuple[Optional[bytes], Optional[str]]:
+    """
+    Stateless half of packet processing: decrypt, check signature and
+    gradient size, and expand compressed payloads. The AEAD tag
+    authenticates the payload, so there is no separate hash check. Returns
+    (dense float32 g_bytes, None) on success or (None, reason) with reason
+    one of REJECT_MESSAGES. Binary packets (see wire.py) need the
+    sender's registered `public_key`. Dict packets carry their own key, which
+    must match `public_key` when one is registered ("identity"). Signatures
+    are checked with `suite` (the default suite if None). Packets whose
+    authenticated round or recipient differs from `round_id` /
+    `validator_id` (when given) are rejected as "replay".
+    Module-level so it can run in a process pool.
+    """
+    if wire.is_binary_packet(packet):
+        return _open_binary_packet(packet, key, grad_dim, sig_cache, public_key, suite, round_id, validator_id)
+
+    try:
+        packet_round = int(packet.get("round_id", 0))
+    except (TypeError, ValueError):
+        return None, "format"
+    if _stale(packet_round, packet.get("validator_id"), round_id, validator_id):
+        return None, "replay"
+    try:
+        embedded_key = bytes.fromhex(packet["sig_public_key"])
+    except (KeyError, TypeError, ValueError):
+        return None, "format"
+    if public_key is not None and embedded_key != public_key:
+        return None, "identity"
+    try:
+        with DECRYPT_SECONDS.time("dict"):
+            sealed = base64.b64decode(packet["encrypted_gradient"])
+            channel = channel_for(key, packet.get("cipher", "aes-gcm"))
+            g_bytes = channel.decrypt(
+                sealed[:NONCE_SIZE],
+                sealed[NONCE_SIZE:],
+                wire.dict_packet_aad(packet["client_id"], packet["validator_id"], packet_round),
+            )
+    except (InvalidTag, binascii.Error, ValueError):
+        return None, "decrypt"
+
+    if not _verify_packet_signature(packet, g_bytes, sig_cache, suite, embedded_key):
+        return None, "signature"
+    return _expand_payload(g_bytes, grad_dim, packet.get("compression") is not None)
 
 
 class Validator:
@@ -17,98 +183,285 @@ class Validator:
         norm_threshold: float = 10.0,
         cos_threshold: float = -0.2,
         max_suspicion: int = 2,
+        sig_cache: Optional[SignatureCache] = None,
+        agg_options: Optional[Dict] = None,
+        masking: Optional[PairwiseMasking] = None,
+        suite: Optional[CryptoSuite] = None,
+        chunk_size: int = DEFAULT_CHUNK_SIZE,
+        quantum: float = QUANTUM,
+        median_threshold: Optional[float] = None,
+        cluster_threshold: Optional[float] = None,
     ):
         self.id = validator_id
         self.qkd_keys_with_clients: Dict[str, bytes] = {}
-        self.received_gradients: List[Tuple[str, torch.Tensor]] = []
+        # Cipher objects per client key; replaced together with the key.
+        self.client_channels: Dict[str, SessionChannels] = {}
+        self.client_sig_keys: Dict[str, bytes] = {}
+        # Ids of clients accepted this round; their gradients live only in the aggregator.
+        self.received_clients: List[str] = []
         self.grad_dim = grad_dim
 
         self.agg_mode = agg_mode
         self.trim_ratio = trim_ratio
+        self.agg_options = dict(agg_options or {})
+        self.aggregator: Aggregator = make_aggregator(
+            agg_mode, grad_dim, trim_ratio=trim_ratio, **self.agg_options
+        )
+        if masking is not None and not self.aggregator.linear:
+            raise ValueError(
+                f"{agg_mode!r} aggregation is not linear, so pairwise masks cannot be removed from it; "
+                "use agg_mode='mean' or mask_scale=None"
+            )
         self.norm_threshold = norm_threshold
         self.cos_threshold = cos_threshold
         self.max_suspicion = max_suspicion
+        # Norm, cosine and outlier checks over a whole batch at once (see screening.py).
+        self.screener = Screener(
+            norm_threshold, cos_threshold, median_threshold, cluster_threshold,
+            byzantine_ratio=self.agg_options.get("byzantine_ratio", 0.2),
+        )
+        self.screening: Optional[ScreeningResult] = None
 
         self.ref_grad: Optional[torch.Tensor] = None
         self.client_suspicion: Dict[str, int] = {}
+        # Reason code (see REJECT_MESSAGES) for each client rejected this round.
+        self.rejections: Dict[str, str] = {}
+        self.sig_cache = sig_cache if sig_cache is not None else SignatureCache()
+        self.masking = masking
+        self.round_id = 0
+        self.suite = suite or DEFAULT_SUITE
+        # H_agg is the root of a Merkle tree over quantized chunks of G_t (see merkle.py).
+        self.chunk_size = chunk_size
+        self.quantum = quantum
+        self.agg_tree: Optional[MerkleTree] = None
 
     def set_qkd_key_for_client(self, client_id: str, key: bytes):
+        if self.qkd_keys_with_clients.get(client_id) != key:
+            self.client_channels[client_id] = SessionChannels(key)
         self.qkd_keys_with_clients[client_id] = key
 
+    def register_client_identity(self, client_id: str, public_key: bytes):
+        """Signing key used to verify binary packets, which only carry its fingerprint."""
+        self.client_sig_keys[client_id] = public_key
+
+    def reset_round(self, round_id: Optional[int] = None):
+        """Drop the previous round's gradients; ref_grad and suspicion carry over."""
+        if round_id is not None:
+            self.round_id = round_id
+        self.received_clients = []
+        self.aggregator.reset()
+        self.rejections = {}
+
     def verify_signature(self, packet: Dict, g_bytes: bytes) -> bool:
-        signature = bytes.fromhex(packet["signature"])
-        public_key = bytes.fromhex(packet["sig_public_key"])
-        return pqc_sig_verify(public_key, g_bytes, signature)
+        cid = packet.get("client_id")
+        return _verify_packet_signature(packet, g_bytes, self.sig_cache, self.suite, self.client_sig_keys.get(cid))
 
-    def process_packet(self, packet: Dict) -> bool:
-        cid = packet["client_id"]
+    def process_packet(self, packet: Union[Dict, wire.Buffer]) -> bool:
+        try:
+            cid = wire.packet_client_id(packet)
+        except wire.WireFormatError:
+            print(f"[{self.id}] Malformed packet")
+            return False
         if cid not in self.qkd_keys_with_clients:
             print(f"[{self.id}] No QKD key for client {cid}")
-            return False
+            return self._reject(cid, "no_key")
 
-        key = self.qkd_keys_with_clients[cid]
-        f = Fernet(key)
-        token = packet["encrypted_gradient"].encode("utf-8")
-        g_bytes = f.decrypt(token)
+        g_bytes, error = open_packet(
+            packet, self.client_channels[cid], self.grad_dim, self.sig_cache, self.client_sig_keys.get(cid), self.suite,
+            self.round_id, self.id,
+        )
+        return self._accept_batch([(cid, g_bytes, error)])[0]
 
-        if hash_bytes(g_bytes) != packet["hash"]:
-            print(f"[{self.id}] Hash mismatch for client {cid}")
-            return False
-        if not self.verify_signature(packet, g_bytes):
-            print(f"[{self.id}] Signature mismatch for client {cid}")
-            return False
+    def process_packets(
+        self,
+        batch: List[Union[Dict, wire.Buffer]],
+        executor: Optional[Executor] = None,
+        max_workers: Optional[int] = None,
+    ) -> List[bool]:
+        """
+        Process a batch of packets. Decryption and signature/dim checks
+        are stateless and fan out to `executor` (a thread or process pool).
+        The opened gradients are then screened together against the
+        round-start ref_grad, so the verdicts do not depend on batch order.
+        """
+        results: List[bool] = [False] * len(batch)
+        jobs: List[Tuple[int, str]] = []
+        for i, packet in enumerate(batch):
+            try:
+                cid = wire.packet_client_id(packet)
+            except wire.WireFormatError:
+                print(f"[{self.id}] Malformed packet")
+                continue
+            if cid not in self.qkd_keys_with_clients:
+                print(f"[{self.id}] No QKD key for client {cid}")
+                self._reject(cid, "no_key")
+                continue
+            jobs.append((i, cid))
+        if not jobs:
+            return results
 
-        g_tensor = torch.frombuffer(g_bytes, dtype=torch.float32)
-        if g_tensor.numel() != self.grad_dim:
-            print(f"[{self.id}] Gradient dim mismatch for client {cid}")
-            return False
+        packets = [batch[i] for i, _ in jobs]
+        keys = [self.client_channels[cid] for _, cid in jobs]
+        dims = [self.grad_dim] * len(jobs)
+        public_keys = [self.client_sig_keys.get(cid) for _, cid in jobs]
+        suites = [self.suite] * len(jobs)
+        rounds = [self.round_id] * len(jobs)
+        recipients = [self.id] * len(jobs)
 
-        norm = torch.norm(g_tensor).item()
-        if norm > self.norm_threshold:
-            print(f"[{self.id}] Norm anomaly from {cid}: ||g||={norm:.2f} > {self.norm_threshold}")
-            return False
+        own_executor = executor is None
+        if own_executor:
+            executor = ThreadPoolExecutor(max_workers=max_workers)
+        try:
+            if isinstance(executor, ProcessPoolExecutor):
+                # The signature cache lives in this process; workers verify directly.
+                chunksize = max(1, len(jobs) // (4 * (os.cpu_count() or 1)))
+                caches = [None] * len(jobs)
+                opened = list(
+                    executor.map(
+                        open_packet, packets, keys, dims, caches, public_keys, suites, rounds, recipients,
+                        chunksize=chunksize,
+                    )
+                )
+            else:
+                caches = [self.sig_cache] * len(jobs)
+                opened = list(
+                    executor.map(open_packet, packets, keys, dims, caches, public_keys, suites, rounds, recipients)
+                )
+        finally:
+            if own_executor:
+                executor.shutdown()
+
+        accepted = self._accept_batch([(cid, g_bytes, error) for (_, cid), (g_bytes, error) in zip(jobs, opened)])
+        for (i, _), ok in zip(jobs, accepted):
+            results[i] = ok
+        return results
+
+    def _reject(self, cid: str, reason: str) -> bool:
+        self.rejections[cid] = reason
+        PACKETS_REJECTED.inc(reason)
+        return False
+
+    def _accept_batch(self, items: List[Tuple[str, Optional[bytes], Optional[str]]]) -> List[bool]:
+        """
+        Screen opened packets, given as (client id, g_bytes, error), as one
+        matrix. Suspicion counters, the aggregator and ref_grad are updated
+        once for the whole batch.
+        """
+        results = [False] * len(items)
+        opened: List[int] = []
+        # One gradient per client per round: later copies are replays.
+        seen = set(self.received_clients)
+        for j, (cid, g_bytes, error) in enumerate(items):
+            if error is None and cid in seen:
+                error = "replay"
+            if error is not None:
+                print(f"[{self.id}] {REJECT_MESSAGES[error]} for client {cid}")
+                self._reject(cid, error)
+            else:
+                seen.add(cid)
+                opened.append(j)
+        if not opened:
+            return results
 
-        if self.ref_grad is not None:
-            cos = F.cosine_similarity(
-                g_tensor.view(1, -1),
-                self.ref_grad.view(1, -1),
-                dim=1,
-            ).item()
-            if cos < self.cos_threshold:
-                prev = self.client_suspicion.get(cid, 0)
-                self.client_suspicion[cid] = prev + 1
-                print(f"[{self.id}] Cosine anomaly from {cid}: cos={cos:.2f}, suspicion={self.client_suspicion[cid]}")
+        G = torch.empty(len(opened), self.grad_dim)
+        rows = G.numpy()
+        for r, j in enumerate(opened):
+            rows[r] = np.frombuffer(items[j][1], dtype=np.float32)
+        # Screening and the reference gradient see unmasked rows. Every
+        # validator holds all pair keys in this simulation, so masking models
+        # the protocol's arithmetic but gives no privacy against validators.
+        S = G
+        if self.masking is not None:
+            idx = [self.masking.index[items[j][0]] for j in opened]
+            S = G - self.masking.masks(self.round_id)[idx]
+        screen = self.screener.screen(S, self.ref_grad)
+        self.screening = screen
+        norms = screen.norms.tolist()
+        rejected = screen.rejected.tolist()
+        anomalous = screen.anomalous.tolist()
+        cosines = screen.cosines.tolist() if screen.cosines is not None else None
+
+        keep: List[int] = []
+        for r, j in enumerate(opened):
+            cid = items[j][0]
+            if rejected[r]:
+                print(f"[{self.id}] Norm anomaly from {cid}: ||g||={norms[r]:.2f} > {self.norm_threshold}")
+                self._reject(cid, "norm")
+                continue
+            if anomalous[r]:
+                reasons = screen.reasons(r)
+                for reason in reasons:
+                    if reason == "cosine":
+                        COSINE_ANOMALIES.inc()
+                    else:
+                        OUTLIER_ANOMALIES.inc(reason)
+                self.client_suspicion[cid] = self.client_suspicion.get(cid, 0) + 1
+                detail = f"cos={cosines[r]:.2f}, " if cosines is not None and "cosine" in reasons else ""
+                print(
+                    f"[{self.id}] Anomaly ({', '.join(reasons)}) from {cid}: "
+                    f"{detail}suspicion={self.client_suspicion[cid]}"
+                )
                 if self.client_suspicion[cid] >= self.max_suspicion:
                     print(f"[{self.id}] Blocking client {cid} due to repeated anomalies")
-                    return False
-
-        if self.ref_grad is None:
-            self.ref_grad = g_tensor.clone()
-        else:
-            self.ref_grad = 0.9 * self.ref_grad + 0.1 * g_tensor
+                    self._reject(cid, "blocked")
+                    continue
+            keep.append(r)
+            results[j] = True
+            self.received_clients.append(cid)
 
-        self.received_gradients.append((cid, g_tensor))
-        return True
+        if keep:
+            accepted = G if len(keep) == len(opened) else G[keep]
+            self.aggregator.add_rows(accepted)
+            self.ref_grad = update_reference(self.ref_grad, S if S is G else S[keep])
+            PACKETS_ACCEPTED.inc(amount=len(keep))
+        return results
 
     def aggregate_gradients(self) -> torch.Tensor:
-        if not self.received_gradients:
-            return torch.zeros(self.grad_dim)
-        stack = torch.stack([g for _, g in self.received_gradients], dim=0)
+        """
+        G_t over the accepted gradients. With masking on, the pairwise masks
+        of clients that were rejected or dropped are corrected for, so G_t is
+        the mean of the unmasked gradients.
+        """
+        with AGGREGATION_SECONDS.time(self.agg_mode):
+            G_t = self.aggregator.result()
+            if self.masking is not None and self.received_clients:
+                correction = self.masking.correction(self.received_clients, self.round_id)
+                G_t = G_t - correction / len(self.received_clients)
+        return G_t
 
-        if self.agg_mode == "median":
-            return torch.median(stack, dim=0).values
+    def compute_H_agg(self, G_t: torch.Tensor) -> str:
+        """Merkle root over chunks of the quantized G_t; the tree is kept for dispute queries."""
+        self.agg_tree = MerkleTree.from_vector(G_t, self.chunk_size, self.quantum)
+        return self.agg_tree.root_hex
 
-        if self.agg_mode == "trimmed_mean":
-            n = stack.size(0)
-            k = int(self.trim_ratio * n)
-            if k == 0 or n <= 2 * k:
-                return stack.mean(dim=0)
-            sorted_vals, _ = torch.sort(stack, dim=0)
-            trimmed = sorted_vals[k : n - k, :]
-            return trimmed.mean(dim=0)
+    def merkle_node(self, level: int, index: int) -> bytes:
+        """Answer one dispute query about this round's aggregate tree."""
+        return self.agg_tree.node(level, index)
 
-        return stack.mean(dim=0)
+    def _aggregate_rows(self, rows: torch.Tensor) -> torch.Tensor:
+        aggregator = make_aggregator(self.agg_mode, rows.shape[1], trim_ratio=self.trim_ratio, **self.agg_options)
+        aggregator.start_like(self.aggregator)
+        aggregator.reserve(len(rows))
+        for g in rows:
+            aggregator.add(g)
+        return aggregator.result()
 
-    def compute_H_agg(self, G_t: torch.Tensor) -> str:
-        return hash_bytes(G_t.numpy().tobytes())
+    def recompute_chunks(self, client_grads: Dict[str, torch.Tensor], chunk_ids: List[int]) -> Dict[int, bytes]:
+        """
+        Leaf hashes of the given chunks of G_t, recomputed with this
+        validator's rule from the clients' signed payloads (dense, masked)
+        of the clients it accepted. Coordinate-wise rules only touch the
+        disputed columns.
+        """
+        rows = torch.zeros(0, self.grad_dim)
+        if self.received_clients:
+            rows = torch.stack([client_grads[cid] for cid in self.received_clients])
+        offset = None
+        if self.masking is not None and self.received_clients:
+            correction = self.masking.correction(self.received_clients, self.round_id)
+            offset = lambda cols: -correction[cols] / len(self.received_clients)
+        return recompute_leaves(
+            rows, chunk_ids, self.chunk_size, self._aggregate_rows,
+            self.aggregator.coordinatewise, offset, self.quantum,
+        )
 
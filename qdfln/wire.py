@@ -0,0 +1,145 @@
+"""
+Versioned binary format for secure gradient packets.
+
+Layout (network byte order):
+
+    magic "QDFP" | version u8 | flags u8 | client_id_len u16 | validator_id_len u16
+    | round_id u32 | ciphertext_len u32 | signature_len u32 | pk_fingerprint[32]
+    | client_id | validator_id | nonce[12] | ciphertext (AEAD, tag included)
+    | signature
+
+Bit 0 of flags selects the AEAD: 0 for AES-256-GCM, 1 for
+ChaCha20-Poly1305 (see channel.py). Bit 1 marks a compressed payload (see
+compression.py) instead of raw float32. The fixed header and the ids are bound
+to the ciphertext as associated data, and the ciphertext is encrypted in
+place into the packet buffer. The signer's public key is referenced by its SHA-256 fingerprint; the
+validator resolves it from the identities it registered during the handshake.
+"""
+import hashlib
+import struct
+from typing import Optional, Union
+
+from .channel import CIPHER_NAMES, NONCE_SIZE, TAG_SIZE, SecureChannel, SessionChannels, channel_for
+
+MAGIC = b"QDFP"
+VERSION = 1
+FINGERPRINT_SIZE = 32
+_CIPHER_MASK = 0x01
+FLAG_COMPRESSED = 0x02
+
+_HEADER = struct.Struct("!4sBBHHIII32s")
+
+Buffer = Union[bytes, bytearray, memoryview]
+
+
+class WireFormatError(ValueError):
+    pass
+
+
+def is_binary_packet(packet) -> bool:
+    return isinstance(packet, (bytes, bytearray, memoryview))
+
+
+def fingerprint(public_key: bytes) -> bytes:
+    return hashlib.sha256(public_key).digest()
+
+
+def dict_packet_aad(client_id: str, validator_id: str, round_id: int = 0) -> bytes:
+    """Associated data for the AEAD payload of a dict packet; binds sender, recipient and round."""
+    return f"{client_id}\x00{validator_id}\x00{round_id}".encode("utf-8")
+
+
+def encode_packet(
+    client_id: str,
+    validator_id: str,
+    round_id: int,
+    g_bytes: bytes,
+    channel: SecureChannel,
+    signature: bytes,
+    public_key_fingerprint: bytes,
+    compressed: bool = False,
+) -> bytes:
+    """
+    Encrypt g_bytes on `channel` and frame it as one packet. The channel's
+    nonce counter must outlive the call, so there is no bare-key variant.
+    """
+    cid = client_id.encode("utf-8")
+    vid = validator_id.encode("utf-8")
+    ct_len = len(g_bytes) + TAG_SIZE
+    aad_len = _HEADER.size + len(cid) + len(vid)
+    buf = bytearray(aad_len + NONCE_SIZE + ct_len + len(signature))
+
+    flags = channel.flag | (FLAG_COMPRESSED if compressed else 0)
+    _HEADER.pack_into(
+        buf, 0, MAGIC, VERSION, flags, len(cid), len(vid),
+        round_id, ct_len, len(signature), public_key_fingerprint,
+    )
+    buf[_HEADER.size : _HEADER.size + len(cid)] = cid
+    buf[_HEADER.size + len(cid) : aad_len] = vid
+
+    view = memoryview(buf)
+    pos = aad_len + NONCE_SIZE
+    nonce = channel.encrypt_into(g_bytes, view[:aad_len], view[pos : pos + ct_len])
+    buf[aad_len:pos] = nonce
+    buf[pos + ct_len :] = signature
+    return bytes(buf)
+
+
+class PacketView:
+    """Zero-copy parse of a binary packet; byte fields are memoryview slices."""
+
+    def __init__(self, packet: Buffer):
+        mv = memoryview(packet)
+        if len(mv) < _HEADER.size:
+            raise WireFormatError("Packet shorter than header")
+        (
+            magic, version, self.flags, cid_len, vid_len,
+            self.round_id, ct_len, sig_len, fp,
+        ) = _HEADER.unpack_from(mv, 0)
+        if magic != MAGIC:
+            raise WireFormatError("Bad packet magic")
+        if version != VERSION:
+            raise WireFormatError(f"Unsupported packet version {version}")
+
+        aad_len = _HEADER.size + cid_len + vid_len
+        if len(mv) != aad_len + NONCE_SIZE + ct_len + sig_len:
+            raise WireFormatError("Packet length does not match header")
+
+        self.version = version
+        self.public_key_fingerprint = bytes(fp)
+        self.client_id = str(mv[_HEADER.size : _HEADER.size + cid_len], "utf-8")
+        self.validator_id = str(mv[_HEADER.size + cid_len : aad_len], "utf-8")
+        self.aad = mv[:aad_len]
+        pos = aad_len
+        self.nonce = mv[pos : pos + NONCE_SIZE]
+        pos += NONCE_SIZE
+        self.ciphertext = mv[pos : pos + ct_len]
+        pos += ct_len
+        self.signature = mv[pos : pos + sig_len]
+        self.length = ct_len - TAG_SIZE
+        self.cipher = CIPHER_NAMES.get(self.flags & _CIPHER_MASK)
+        self.compressed = bool(self.flags & FLAG_COMPRESSED)
+
+    def decrypt(
+        self, key: Union[bytes, SessionChannels], out: Optional[bytearray] = None
+    ) -> Union[bytes, bytearray]:
+        """
+        Plaintext, written into `out` (self.length bytes) if given. Raises
+        cryptography's InvalidTag if the packet was tampered with.
+        """
+        channel = channel_for(key, self.cipher)
+        if out is None:
+            return channel.decrypt(self.nonce, self.ciphertext, self.aad)
+        channel.decrypt_into(self.nonce, self.ciphertext, self.aad, out)
+        return out
+
+
+def parse_packet(packet: Buffer) -> PacketView:
+    return PacketView(packet)
+
+
+def packet_client_id(packet) -> str:
+    """Client id of a dict or binary packet."""
+    if is_binary_packet(packet):
+        return parse_packet(packet).client_id
+    return packet["client_id"]
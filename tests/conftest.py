@@ -0,0 +1,26 @@
+import pytest
+
+from qdfln.keystore import KeyStore
+from qdfln.scenario import Scenario
+
+# ML-DSA signs in milliseconds; the default SPHINCS+ suite takes seconds per client.
+FAST_SUITE = "ml-dsa"
+
+
+@pytest.fixture(scope="session")
+def key_store():
+    return KeyStore()
+
+
+@pytest.fixture
+def make_federation(key_store):
+    """Build a small synthetic federation; keyword arguments override Scenario fields."""
+
+    def build(**overrides):
+        spec = dict(
+            num_clients=5, num_validators=3, dataset="synthetic", samples_per_client=16, crypto_suite=FAST_SUITE
+        )
+        spec.update(overrides)
+        return Scenario.from_dict(spec).build(key_store)
+
+    return build
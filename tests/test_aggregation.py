@@ -0,0 +1,97 @@
+import math
+
+import pytest
+import torch
+
+from qdfln.aggregation import _trim_count, make_aggregator
+
+DIM = 50
+
+
+def feed(agg, rows, bulk=False):
+    if bulk:
+        agg.add_rows(rows)
+    else:
+        for g in rows:
+            agg.add(g)
+    return agg.result()
+
+
+def sorted_trim(rows, trim_ratio):
+    k = _trim_count(rows.shape[0], trim_ratio)
+    s = torch.sort(rows, dim=0).values
+    return s[k : rows.shape[0] - k].mean(dim=0)
+
+
+@pytest.mark.parametrize("n", [1, 2, 7, 40])
+@pytest.mark.parametrize("bulk", [False, True])
+def test_streaming_median_matches_torch(n, bulk):
+    rows = torch.randn(n, DIM)
+    out = feed(make_aggregator("median", DIM), rows, bulk)
+    assert torch.equal(out, torch.median(rows, dim=0).values)
+
+
+@pytest.mark.parametrize("n", [1, 4, 5, 40])
+@pytest.mark.parametrize("bulk", [False, True])
+def test_streaming_trimmed_mean_matches_a_sorted_trim(n, bulk):
+    rows = torch.randn(n, DIM)
+    out = feed(make_aggregator("trimmed_mean", DIM, trim_ratio=0.2), rows, bulk)
+    assert torch.allclose(out, sorted_trim(rows, 0.2), atol=1e-5)
+
+
+def test_reset_starts_a_new_round():
+    agg = make_aggregator("median", DIM)
+    feed(agg, torch.randn(20, DIM))
+    agg.reset()
+    rows = torch.randn(3, DIM)
+    assert len(agg) == 0
+    assert torch.equal(feed(agg, rows), torch.median(rows, dim=0).values)
+
+
+def rank_error_bound(n, capacity):
+    # Each compaction at level h shifts a rank by at most 2**h, and a level
+    # compacts about n / (capacity * 2**h) times.
+    levels = max(1, math.ceil(math.log2(n / capacity)) + 1)
+    return levels * n / capacity
+
+
+@pytest.mark.parametrize("capacity", [16, 64])
+def test_approx_median_is_exact_until_the_sketch_fills(capacity):
+    rows = torch.randn(capacity, DIM)
+    out = feed(make_aggregator("approx_median", DIM, sketch_capacity=capacity), rows)
+    # The sketch returns the upper median; torch returns the lower one.
+    upper = torch.sort(rows, dim=0).values[capacity // 2]
+    lower = torch.median(rows, dim=0).values
+    assert torch.all((out == upper) | (out == lower))
+
+
+@pytest.mark.parametrize("n,capacity", [(500, 16), (2000, 64)])
+def test_approx_median_stays_within_the_rank_bound(n, capacity):
+    rows = torch.randn(n, DIM)
+    out = feed(make_aggregator("approx_median", DIM, sketch_capacity=capacity, block_size=16), rows)
+    ranks = (rows < out).sum(dim=0).float()
+    assert (ranks - n / 2).abs().max() <= rank_error_bound(n, capacity)
+
+
+@pytest.mark.parametrize("n,capacity", [(500, 16), (2000, 64)])
+def test_approx_trimmed_mean_stays_within_the_rank_bound(n, capacity):
+    torch.manual_seed(0)
+    rows = torch.randn(n, DIM)
+    out = feed(make_aggregator("approx_trimmed_mean", DIM, sketch_capacity=capacity, trim_ratio=0.1), rows)
+    s = torch.sort(rows, dim=0).values
+    k, e = _trim_count(n, 0.1), int(rank_error_bound(n, capacity))
+    # Kept ranks shifted by at most e either way bracket the sketch's result.
+    lower = s[max(0, k - e) : n - k - e].mean(dim=0)
+    upper = s[k + e : min(n, n - k + e)].mean(dim=0)
+    assert torch.all(out >= lower - 1e-5) and torch.all(out <= upper + 1e-5)
+    # Compactions keep alternating halves, so errors do not pile up on one side.
+    assert abs(float((out - sorted_trim(rows, 0.1)).mean())) < 0.05
+
+
+def test_approx_sketch_is_reproducible_after_reset():
+    rows = torch.randn(300, DIM)
+    agg = make_aggregator("approx_trimmed_mean", DIM, sketch_capacity=16)
+    first = feed(agg, rows)
+    agg.reset()
+    assert torch.equal(feed(agg, rows), first)
+    assert torch.equal(feed(make_aggregator("approx_trimmed_mean", DIM, sketch_capacity=16), rows), first)
@@ -0,0 +1,14 @@
+from qdfln.bench import STAGES, bench_round
+
+from conftest import FAST_SUITE
+
+
+def test_bench_round_reports_timer_stages_and_sent_packets():
+    report = bench_round(
+        4, 4, 5, rounds=2, warmup=0, scenario_overrides={"crypto_suite": FAST_SUITE, "committee_size": 2},
+    )
+    assert set(report["stages"]) == set(STAGES)
+    assert report["stages"]["training"]["n"] == 2
+    mean_round = report["round_s"]["mean"]
+    # Each client sends to its 2-validator committee, not to all 4 validators.
+    assert abs(report["throughput"]["packets_per_s"] * mean_round - 4 * 2) < 1e-6
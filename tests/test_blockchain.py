@@ -0,0 +1,132 @@
+import random
+
+import pytest
+
+from qdfln.blockchain import GENESIS_HASH, Block, BlockchainSim
+from qdfln.storage import BlockStore
+
+VALIDATORS = {"V1": 3.0, "V2": 2.0, "V3": 2.0, "V4": 1.0}
+
+
+def make_chain(**kwargs):
+    chain = BlockchainSim(**kwargs)
+    for vid, stake in VALIDATORS.items():
+        chain.register_validator(vid, stake)
+    return chain
+
+
+def finalize(chain, round_id, votes):
+    for vid, h in votes.items():
+        chain.submit_hash(round_id, vid, h)
+    return chain.check_consensus_and_update(round_id)
+
+
+def run_rounds(chain, rounds, start=1):
+    for round_id in range(start, start + rounds):
+        assert finalize(chain, round_id, {"V1": "a", "V2": "a", "V3": "a", "V4": f"bad{round_id}"})
+
+
+def test_blocks_hash_their_body_and_chain_to_the_previous_block():
+    chain = make_chain()
+    run_rounds(chain, 3)
+    assert chain.blocks[0].prev_hash == GENESIS_HASH
+    for prev, block in zip(chain.blocks, chain.blocks[1:]):
+        assert block.prev_hash == prev.hash
+        assert block.height == prev.height + 1
+    assert chain.head_hash == chain.blocks[-1].hash
+    assert chain.verify_chain()
+
+    copy = Block.from_dict(chain.blocks[1].to_dict())
+    assert copy.hash == copy.compute_hash() == chain.blocks[1].hash
+    chain.blocks[1].fraudsters = []
+    assert not chain.verify_chain()
+
+
+def test_finalize_rewards_the_majority_and_slashes_the_rest():
+    chain = make_chain(slash_fraction=0.5)
+    H_star, weight, entries, fraudsters = finalize(chain, 1, {"V1": "a", "V2": "a", "V3": "a", "V4": "b"})
+    assert (H_star, weight, fraudsters) == ("a", 7.0, ["V4"])
+    assert chain.stake["V4"] == 0.5 and chain.total_stake == pytest.approx(7.5)
+    assert chain.reputation == {"V1": 1, "V2": 1, "V3": 1, "V4": -1}
+    assert chain.blocks[-1].stake_deltas == {"V4": -0.5}
+    assert chain.check_consensus_and_update(1) is None
+    with pytest.raises(ValueError):
+        chain.submit_hash(1, "V1", "a")
+
+
+def rescan(chain, round_id):
+    tally = {}
+    for vid, h in chain.round_hashes.get(round_id, {}).items():
+        tally[h] = tally.get(h, 0.0) + chain.stake[vid]
+    if not tally:
+        return None
+    H, weight = max(tally.items(), key=lambda x: x[1])
+    return H if weight >= chain.supermajority * chain.total_stake else None
+
+
+def test_incremental_tallies_match_a_full_rescan():
+    rng = random.Random(7)
+    chain = make_chain()
+    for _ in range(300):
+        # Validators keep changing their vote; only the latest one counts.
+        vid = rng.choice(list(VALIDATORS))
+        chain.submit_hash(1, vid, rng.choice("abc"))
+        assert chain.leading_hash(1) == rescan(chain, 1)
+        assert chain.has_supermajority(1) == (rescan(chain, 1) is not None)
+    tally = chain._tallies[1]
+    assert sum(tally.values()) == pytest.approx(chain.total_stake)
+
+
+def test_unfinalized_rounds_are_pruned():
+    chain = make_chain()
+    chain.submit_hash(1, "V1", "a")
+    chain.submit_hash(2, "V1", "a")
+    chain.prune_open_rounds(2)
+    assert list(chain.round_hashes) == [2]
+    assert 1 not in chain._tallies and 1 not in chain._leaders
+
+
+def test_compaction_keeps_the_head_and_reads_old_blocks_from_the_store(tmp_path):
+    chain = make_chain(retain_blocks=2, block_store=BlockStore(str(tmp_path)))
+    run_rounds(chain, 5)
+    assert len(chain.blocks) == 2 and chain.height == 5
+    assert [b.round_id for b in chain.blocks] == [4, 5]
+    assert chain.get_block(5) is chain.blocks[-1]
+    assert chain.get_block(1).height == 0 and chain.get_block(1).prev_hash == GENESIS_HASH
+    assert chain.get_block(4).prev_hash == chain.get_block(3).hash
+    run_rounds(chain, 1, start=6)
+    assert chain.blocks[-1].prev_hash == chain.get_block(5).hash and chain.height == 6
+
+    in_memory = make_chain()
+    run_rounds(in_memory, 3)
+    in_memory.compact(1)
+    assert in_memory.get_block(1) is None and in_memory.get_block(3) is not None
+    assert in_memory.head_hash == in_memory.blocks[-1].hash
+
+
+def test_export_and_load_state_round_trip():
+    chain = make_chain()
+    run_rounds(chain, 3)
+    state = chain.export_state()
+    resumed = BlockchainSim()
+    resumed.load_state(state)
+    assert resumed.export_state() == state
+    assert resumed.total_stake == pytest.approx(chain.total_stake)
+    assert resumed.blocks == []
+
+    run_rounds(chain, 1, start=4)
+    run_rounds(resumed, 1, start=4)
+    assert resumed.blocks[-1].prev_hash == chain.blocks[-2].hash
+    assert resumed.blocks[-1].height == chain.blocks[-1].height == 3
+    assert resumed.stake == chain.stake and resumed.reputation == chain.reputation
+
+
+def test_apply_block_fast_forwards_to_the_same_state():
+    chain = make_chain()
+    run_rounds(chain, 3)
+    replica = make_chain()
+    for block in chain.blocks:
+        replica.apply_block(block)
+    assert replica.export_state() == chain.export_state()
+    with pytest.raises(ValueError):
+        replica.apply_block(chain.blocks[0])
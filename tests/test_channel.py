@@ -0,0 +1,88 @@
+import gc
+import os
+import pickle
+import weakref
+
+import pytest
+
+from qdfln import wire
+from qdfln.channel import (
+    CLIENT_TO_VALIDATOR,
+    MAX_EPOCH,
+    VALIDATOR_TO_CLIENT,
+    SecureChannel,
+    SessionChannels,
+    nonce_prefix,
+)
+from qdfln.crypto_utils import get_suite
+from qdfln.keystore import KeyStore
+from qdfln.scenario import Scenario
+from qdfln.validator import Validator
+
+from conftest import FAST_SUITE
+
+
+def test_nonce_prefix_is_unique_per_epoch_and_direction():
+    key = os.urandom(32)
+    nonces = {
+        SecureChannel(key, epoch=epoch, direction=direction).next_nonce()
+        for epoch in range(4)
+        for direction in (CLIENT_TO_VALIDATOR, VALIDATOR_TO_CLIENT)
+    }
+    assert len(nonces) == 8
+    assert SecureChannel(key, epoch=3).next_nonce() == SecureChannel(key, epoch=3).next_nonce()
+    with pytest.raises(OverflowError):
+        nonce_prefix(MAX_EPOCH + 1)
+
+
+def test_channel_epoch_survives_a_restart(tmp_path):
+    path = str(tmp_path / "keys.json")
+    suite = get_suite(FAST_SUITE)
+    store = KeyStore(path)
+    store.handshake("C1", "V1", suite)
+    assert [store.open_channel("C1", "V1", suite) for _ in range(2)] == [1, 2]
+    store.save()
+
+    reloaded = KeyStore(path)
+    reloaded.handshake("C1", "V1", suite)
+    assert reloaded.open_channel("C1", "V1", suite) == 3
+    reloaded.rotate("C1")
+    reloaded.handshake("C1", "V1", suite)
+    assert reloaded.open_channel("C1", "V1", suite) == 1
+
+
+def sent_nonces(federation):
+    nonces = set()
+    for c in federation.clients:
+        signed = c.sign_gradient(c.get_param_vector(), 1)
+        for vid in c.channels:
+            nonces.add(bytes(wire.parse_packet(c.create_binary_packet_for_validator(vid, signed, 1)).nonce))
+    return nonces
+
+
+def test_restarted_federation_opens_new_channel_epochs(tmp_path):
+    path = str(tmp_path / "keys.json")
+    spec = dict(num_clients=3, num_validators=2, dataset="synthetic", samples_per_client=8, crypto_suite=FAST_SUITE)
+    first = Scenario.from_dict(spec).build(KeyStore(path))
+    first.run(2, log=lambda line: None)
+    second = Scenario.from_dict(spec).build(KeyStore(path))
+    second.run(1, log=lambda line: None)
+    assert {ch.epoch for c in first.clients for ch in c.channels.values()} == {1}
+    assert {ch.epoch for c in second.clients for ch in c.channels.values()} == {2}
+    assert sent_nonces(first).isdisjoint(sent_nonces(second))
+
+
+def test_rotated_keys_release_their_channels():
+    v = Validator("V1", 8)
+    v.set_qkd_key_for_client("C1", os.urandom(32))
+    channels = v.client_channels["C1"]
+    old = weakref.ref(channels.get("aes-gcm"))
+    v.set_qkd_key_for_client("C1", channels.key)
+    assert v.client_channels["C1"] is channels
+    v.set_qkd_key_for_client("C1", os.urandom(32))
+    del channels
+    gc.collect()
+    assert old() is None
+    # Process-pool workers get the bare key and build their own channels.
+    restored = pickle.loads(pickle.dumps(v.client_channels["C1"]))
+    assert restored.key == v.client_channels["C1"].key and not restored._channels
@@ -0,0 +1,97 @@
+from collections import Counter
+
+import pytest
+
+from qdfln.blockchain import BlockchainSim
+from qdfln.committee import assign_committees, round_seed, weighted_sample
+
+CLIENTS = [f"C{i + 1}" for i in range(10)]
+STAKES = {f"V{i + 1}": 10.0 for i in range(6)}
+
+
+def test_assignment_is_deterministic_by_seed():
+    seed = round_seed("head", 3)
+    a = assign_committees(CLIENTS, STAKES, 3, seed)
+    b = assign_committees(CLIENTS, STAKES, 3, round_seed("head", 3))
+    assert a.to_dict() == b.to_dict()
+    others = [assign_committees(CLIENTS, STAKES, 3, round_seed("head", r)).to_dict() for r in range(4, 10)]
+    assert any(other != a.to_dict() for other in others)
+
+
+@pytest.mark.parametrize("num_shards", [None, 1, 3, 20])
+def test_every_client_gets_exactly_one_shard(num_shards):
+    assignment = assign_committees(CLIENTS, STAKES, 2, round_seed("head", 1), num_shards=num_shards)
+    members = [cid for shard in assignment.shards for cid in shard]
+    assert sorted(members) == sorted(CLIENTS)
+    sizes = [len(shard) for shard in assignment.shards]
+    assert min(sizes) >= 1 and max(sizes) - min(sizes) <= 1
+    for cid in CLIENTS:
+        committee = assignment.validators_for(cid)
+        assert len(committee) == len(set(committee)) == 2
+
+
+def test_selection_follows_stake_weight():
+    stakes = {"A": 8.0, "B": 1.0, "C": 1.0, "D": 0.0}
+    picks = Counter(weighted_sample(stakes, 1, round_seed("head", r))[0] for r in range(2000))
+    assert picks["D"] == 0
+    assert 0.75 < picks["A"] / 2000 < 0.85
+    assert 0.07 < picks["B"] / 2000 < 0.13
+    # Slashed-out validators never sit on a committee, even when more are asked for.
+    assert sorted(weighted_sample(stakes, 4, round_seed("head", 0))) == ["A", "B", "C"]
+
+
+def test_no_stake_left_is_an_error():
+    with pytest.raises(ValueError):
+        assign_committees(CLIENTS, {"V1": 0.0}, 1, round_seed("head", 1))
+
+
+def chain_with(stakes):
+    chain = BlockchainSim()
+    for vid, stake in stakes.items():
+        chain.register_validator(vid, stake)
+    return chain
+
+
+def test_shard_consensus_slashes_per_shard():
+    chain = chain_with(STAKES)
+    committees = [["V1", "V2", "V3"], ["V4", "V5", "V6"], ["V1", "V4", "V6"]]
+    votes = [
+        {"V1": "a", "V2": "a", "V3": "x"},
+        {"V4": "b", "V5": "y", "V6": "z"},
+        {"V1": "c", "V4": "c", "V6": "w"},
+    ]
+    H_star, winning, committee_stake, records, fraudsters = chain.check_shard_consensus_and_update(
+        1, committees, votes, spared=[("V6", 2)]
+    )
+    assert [r["H_agg"] for r in records] == ["a", None, "c"]
+    assert (winning, committee_stake) == (40.0, 90.0)
+    # A shard without a supermajority neither rewards nor slashes.
+    assert fraudsters == ["V3"]
+    assert chain.stake["V3"] == pytest.approx(8.0)
+    assert chain.stake["V5"] == chain.stake["V6"] == 10.0
+    assert chain.reputation["V1"] == 2 and chain.reputation["V6"] == 0
+    assert records[2]["spared"] == ["V6"]
+    block = chain.blocks[-1]
+    assert block.round_id == 1 and block.shards == records and block.H_agg == H_star
+    assert chain.check_shard_consensus_and_update(1, committees, votes) is None
+
+
+def test_no_shard_consensus_appends_no_block():
+    chain = chain_with(STAKES)
+    votes = [{"V1": "a", "V2": "b", "V3": "c"}]
+    assert chain.check_shard_consensus_and_update(1, [["V1", "V2", "V3"]], votes) is None
+    assert chain.height == 0
+
+
+def test_federation_runs_sharded_rounds(make_federation):
+    federation = make_federation(num_validators=6, committee_size=3, num_shards=2, mask_scale=None)
+    federation.validator_attacks["V2"] = lambda G: G + 1.0
+    results = federation.run(2, log=lambda line: None)
+    for result in results:
+        shards = result["consensus"]["shards"]
+        assert len(shards) == 2
+        assert sum(s["clients"] for s in shards) == len(federation.clients)
+        assert all(len(s["committee"]) == 3 for s in shards)
+    sat = {vid for r in results for s in r["consensus"]["shards"] for vid in s["committee"]}
+    fraudsters = {vid for r in results for vid in r["consensus"]["fraudsters"]}
+    assert fraudsters == ({"V2"} if "V2" in sat else set())
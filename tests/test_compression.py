@@ -0,0 +1,98 @@
+import numpy as np
+import pytest
+import torch
+
+from qdfln.compression import (
+    CODEC_SPARSE,
+    COMPRESSORS,
+    CompressionError,
+    _COUNT,
+    _HEADER,
+    decompress,
+    make_compressor,
+)
+
+DIM = 200
+
+
+@pytest.mark.parametrize("name", sorted(COMPRESSORS))
+def test_decompress_returns_what_was_sent(name):
+    torch.manual_seed(0)
+    g = torch.randn(DIM)
+    compressor = make_compressor(name, DIM, ratio=0.1)
+    out = decompress(compressor.compress(g), DIM)
+    assert out.dtype == np.float32 and out.shape == (DIM,)
+    err = np.linalg.norm(out - g.numpy()) / np.linalg.norm(g.numpy())
+    assert err == pytest.approx(compressor.last_error, abs=1e-6)
+    if name == "fp16":
+        assert np.allclose(out, g.numpy(), rtol=1e-3, atol=1e-4)
+    elif name == "int8":
+        assert np.abs(out - g.numpy()).max() <= float(g.abs().max()) / 127 / 2 + 1e-6
+    else:
+        kept = np.flatnonzero(out)
+        assert len(kept) == compressor.k == 20
+        assert np.array_equal(out[kept], g.numpy()[kept])
+
+
+def test_topk_keeps_the_largest_coordinates():
+    g = torch.randn(DIM)
+    out = decompress(make_compressor("topk", DIM, ratio=0.1).compress(g))
+    expected = torch.topk(g.abs(), 20).indices.numpy()
+    assert set(np.flatnonzero(out)) == set(expected)
+
+
+@pytest.mark.parametrize("name", ["topk", "randk"])
+def test_error_feedback_carries_every_update(name):
+    torch.manual_seed(1)
+    compressor = make_compressor(name, DIM, ratio=0.05)
+    grads = [torch.randn(DIM) for _ in range(6)]
+    sent = sum(torch.from_numpy(decompress(compressor.compress(g))) for g in grads)
+    # Whatever was not sent yet is still in the residual.
+    assert torch.allclose(sent + compressor.residual, sum(grads), atol=1e-4)
+    assert compressor.residual.abs().sum() > 0
+
+
+@pytest.mark.parametrize("name", ["topk", "randk"])
+def test_without_error_feedback_nothing_carries_over(name):
+    compressor = make_compressor(name, DIM, ratio=0.05, error_feedback=False)
+    g = torch.randn(DIM)
+    first = decompress(compressor.compress(g))
+    assert not compressor.residual.any()
+    if name == "topk":
+        assert np.array_equal(decompress(compressor.compress(g)), first)
+
+
+def _sparse(dim, idx, values, count=None):
+    count = len(idx) if count is None else count
+    return (
+        _HEADER.pack(CODEC_SPARSE, dim)
+        + _COUNT.pack(count)
+        + np.asarray(idx, dtype="<u4").tobytes()
+        + np.asarray(values, dtype="<f4").tobytes()
+    )
+
+
+@pytest.mark.parametrize("name", sorted(COMPRESSORS))
+def test_truncated_payloads_raise(name):
+    payload = make_compressor(name, DIM, ratio=0.1).compress(torch.randn(DIM))
+    for cut in (0, _HEADER.size - 1, _HEADER.size, len(payload) - 1):
+        with pytest.raises(CompressionError):
+            decompress(payload[:cut])
+    with pytest.raises(CompressionError):
+        decompress(payload + b"\x00")
+    with pytest.raises(CompressionError, match="expected"):
+        decompress(payload, DIM + 1)
+
+
+@pytest.mark.parametrize(
+    "payload",
+    [
+        _HEADER.pack(99, DIM),
+        _sparse(DIM, [3, DIM], [1.0, 2.0]),
+        _sparse(DIM, [3], [1.0], count=2),
+    ],
+    ids=["unknown-codec", "index-out-of-range", "wrong-count"],
+)
+def test_malformed_payloads_raise(payload):
+    with pytest.raises(CompressionError):
+        decompress(payload)
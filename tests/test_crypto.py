@@ -0,0 +1,76 @@
+import pickle
+
+import pytest
+
+from qdfln.crypto_utils import KEM_SCHEMES, SIG_SCHEMES, SUITE_PRESETS, SignatureCache, get_suite
+
+from conftest import FAST_SUITE
+
+
+class RejectingSuite:
+    sig_name = "other-scheme"
+
+    def verify(self, public_key, message, signature):
+        return False
+
+
+def test_signature_cache_is_keyed_by_scheme():
+    suite = get_suite(FAST_SUITE)
+    pk, sk = suite.sig_generate_keypair()
+    message = b"gradient"
+    signature = suite.sign(sk, message)
+    cache = SignatureCache()
+    assert cache.verify(pk, message, signature, suite=suite)
+    assert cache.verify(pk, message, signature, suite=suite)
+    assert (cache.hits, cache.misses) == (1, 1)
+    # The same bytes under another scheme are checked again, not served from the cache.
+    assert not cache.verify(pk, message, signature, suite=RejectingSuite())
+    assert cache.misses == 2
+
+
+def test_validators_verify_independently(make_federation):
+    federation = make_federation()
+    federation.run(1, log=lambda line: None)
+    caches = {id(v.sig_cache) for v in federation.validators}
+    assert len(caches) == len(federation.validators)
+    for v in federation.validators:
+        assert v.sig_cache.misses == len(federation.clients)
+
+
+def test_shared_cache_is_opt_in(make_federation):
+    federation = make_federation()
+    shared = type(federation)(
+        federation.clients, federation.input_dim, validator_ids=["V1", "V2"], key_store=federation.key_store,
+        crypto_suite=FAST_SUITE, shared_sig_cache=True,
+    )
+    assert shared.validators[0].sig_cache is shared.validators[1].sig_cache
+
+
+@pytest.mark.parametrize("sig", sorted(SIG_SCHEMES))
+def test_sign_verify_round_trip(sig):
+    suite = get_suite("ml-kem-512", sig)
+    pk, sk = suite.sig_generate_keypair()
+    signature = suite.sign(sk, b"gradient")
+    assert len(pk) == suite.sizes["sig_public_key"]
+    assert len(signature) <= suite.sizes["signature"]
+    assert suite.verify(pk, b"gradient", signature)
+    assert not suite.verify(pk, b"gradient!", signature)
+
+
+@pytest.mark.parametrize("kem", sorted(KEM_SCHEMES))
+def test_kem_round_trip(kem):
+    suite = get_suite(kem, "ml-dsa-44")
+    pk, sk = suite.kem_generate_keypair()
+    ciphertext, shared = suite.kem_encapsulate(pk)
+    assert len(pk) == suite.sizes["kem_public_key"]
+    assert len(ciphertext) == suite.sizes["kem_ciphertext"]
+    assert suite.kem_decapsulate(ciphertext, sk) == shared
+    _, other_sk = suite.kem_generate_keypair()
+    assert suite.kem_decapsulate(ciphertext, other_sk) != shared
+
+
+@pytest.mark.parametrize("preset", sorted(SUITE_PRESETS))
+def test_presets_name_registered_schemes(preset):
+    suite = get_suite(preset)
+    assert (suite.kem_name, suite.sig_name) == SUITE_PRESETS[preset]
+    assert pickle.loads(pickle.dumps(suite)) is suite
@@ -0,0 +1,150 @@
+import zipfile
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from qdfln import datasets
+from qdfln.datasets import Dataset, load_dataset, partition
+
+N = 60
+
+
+@pytest.fixture
+def frame():
+    rng = np.random.default_rng(0)
+    return pd.DataFrame({
+        "row": np.arange(N, dtype=np.float32),
+        "x1": rng.standard_normal(N).astype(np.float32),
+        "label": (np.arange(N) % 3).astype(np.float32),
+        "client_id": [f"C{i % 4 + 1}" for i in range(N)],
+    })
+
+
+def check(ds, frame, features=("row", "x1")):
+    assert ds.X.dtype == np.float32 and ds.X.flags["C_CONTIGUOUS"]
+    assert np.array_equal(ds.X, frame[list(features)].to_numpy(np.float32))
+    assert np.array_equal(ds.y, frame["label"].to_numpy(np.float32))
+
+
+def test_csv_with_header_finds_label_and_group_columns(tmp_path, frame):
+    path = tmp_path / "data.csv"
+    frame.to_csv(path, index=False)
+    ds = load_dataset(str(path))
+    check(ds, frame)
+    assert ds.feature_names == ["row", "x1"]
+    assert list(ds.groups) == list(frame["client_id"])
+
+
+def test_headerless_csv_uses_the_last_column_or_given_names(tmp_path, frame):
+    path = tmp_path / "raw.csv"
+    frame[["row", "x1", "label"]].to_csv(path, index=False, header=False)
+    check(load_dataset(str(path)), frame)
+    ds = load_dataset(str(path), names=["row", "x1", "label"])
+    assert ds.feature_names == ["row", "x1"]
+
+
+def test_csv_inside_a_zip(tmp_path, frame):
+    path = tmp_path / "data.zip"
+    with zipfile.ZipFile(path, "w") as archive:
+        archive.writestr("__MACOSX/._data.csv", "junk")
+        archive.writestr("data.csv", frame.to_csv(index=False))
+    check(load_dataset(str(path)), frame)
+
+    empty = tmp_path / "empty.zip"
+    with zipfile.ZipFile(empty, "w") as archive:
+        archive.writestr("readme.md", "no data")
+    with pytest.raises(ValueError):
+        load_dataset(str(empty))
+
+
+def test_npy_and_npz(tmp_path, frame):
+    npy = tmp_path / "data.npy"
+    np.save(npy, frame[["label", "row", "x1"]].to_numpy(np.float32))
+    check(load_dataset(str(npy), label_column=0), frame)
+
+    npz = tmp_path / "data.npz"
+    X = frame[["row", "x1"]].to_numpy(np.float32)
+    np.savez(npz, X=X, y=frame["label"].to_numpy(), groups=frame["client_id"].to_numpy(str))
+    ds = load_dataset(str(npz))
+    check(ds, frame)
+    assert list(ds.groups) == list(frame["client_id"])
+
+
+def test_parquet(tmp_path, frame):
+    pytest.importorskip("pyarrow")
+    path = tmp_path / "data.parquet"
+    frame.to_parquet(path)
+    check(load_dataset(str(path)), frame)
+
+
+def test_cache_skips_parsing_and_follows_file_changes(tmp_path, frame, monkeypatch):
+    path, cache_dir = tmp_path / "data.csv", str(tmp_path / "cache")
+    frame.to_csv(path, index=False)
+    first = load_dataset(str(path), cache_dir=cache_dir)
+    assert load_dataset(str(path), cache_dir=cache_dir) is first
+    assert isinstance(first.X, np.memmap)
+
+    # A new process only has the on-disk cache and never calls pandas.
+    monkeypatch.setattr(datasets, "_cache", {})
+    monkeypatch.setattr(datasets, "_read_frame", lambda *args: pytest.fail("parsed again"))
+    again = load_dataset(str(path), cache_dir=cache_dir)
+    check(again, frame)
+    assert list(again.groups) == list(frame["client_id"])
+
+    monkeypatch.undo()
+    frame.iloc[: N // 2].to_csv(path, index=False)
+    assert len(load_dataset(str(path), cache_dir=cache_dir)) == N // 2
+
+
+def dataset(frame):
+    return Dataset(
+        frame[["row", "x1"]].to_numpy(np.float32),
+        frame["label"].to_numpy(np.float32),
+        groups=frame["client_id"].to_numpy(),
+    )
+
+
+CLIENTS = ["C1", "C2", "C3", "C4"]
+
+
+def owned_rows(parts):
+    return {cid: set(X[:, 0].astype(int)) for cid, (X, y) in parts.items()}
+
+
+@pytest.mark.parametrize("scheme", ["iid", "dirichlet", "column"])
+def test_partitions_are_disjoint_and_cover_every_sample(frame, scheme):
+    parts = partition(dataset(frame), CLIENTS, scheme, alpha=0.3, seed=1)
+    rows = owned_rows(parts)
+    assert sum(len(r) for r in rows.values()) == N
+    assert set().union(*rows.values()) == set(range(N))
+    for cid, (X, y) in parts.items():
+        # Labels travel with their features.
+        assert np.array_equal(y, frame["label"].to_numpy(np.float32)[X[:, 0].astype(int)])
+
+
+@pytest.mark.parametrize("scheme", ["iid", "dirichlet"])
+def test_partitions_are_deterministic_by_seed(frame, scheme):
+    ds = dataset(frame)
+    a = owned_rows(partition(ds, CLIENTS, scheme, seed=3))
+    assert owned_rows(partition(ds, CLIENTS, scheme, seed=3)) == a
+    assert any(owned_rows(partition(ds, CLIENTS, scheme, seed=s)) != a for s in range(4, 8))
+
+
+def test_iid_shares_are_balanced(frame):
+    parts = partition(dataset(frame), CLIENTS, "iid")
+    assert [len(y) for _, y in parts.values()] == [N // 4] * 4
+
+
+def test_dirichlet_skews_labels(frame):
+    parts = partition(dataset(frame), CLIENTS, "dirichlet", alpha=0.05, seed=0)
+    shares = [np.bincount(y.astype(int), minlength=3) / len(y) for _, y in parts.values()]
+    assert max(s.max() for s in shares) > 0.6
+
+
+def test_column_partition_follows_the_group_column(frame):
+    parts = partition(dataset(frame), ["C2", "C9"], "column")
+    assert list(parts) == ["C2"]
+    assert owned_rows(parts)["C2"] == {i for i in range(N) if i % 4 == 1}
+    with pytest.raises(ValueError):
+        partition(Dataset(np.zeros((2, 1), np.float32), np.zeros(2, np.float32)), CLIENTS, "column")
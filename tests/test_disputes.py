@@ -0,0 +1,109 @@
+import pytest
+import torch
+
+from qdfln.blockchain import BlockchainSim
+from qdfln.merkle import MerkleTree, locate_disputes
+
+
+def tamper_chunk(index, chunk_size=2):
+    def tampered(G):
+        G = G.clone()
+        G[index * chunk_size] += 1.0
+        return G
+    return tampered
+
+
+def test_locate_disputes_finds_only_the_changed_chunks():
+    G = torch.randn(200)
+    H = G.clone()
+    H[[6, 131]] += 1.0
+    a, b = MerkleTree.from_vector(G, chunk_size=4), MerkleTree.from_vector(H, chunk_size=4)
+    chunks, exchanges = locate_disputes(a.node, b.node, a.widths)
+    assert chunks == [1, 32]
+    assert exchanges < a.num_chunks
+    assert locate_disputes(a.node, a.node, a.widths) == ([], 1)
+
+
+@pytest.mark.parametrize(
+    "validator",
+    [
+        {"agg_mode": "mean"},
+        {"agg_mode": "median"},
+        # A small radius keeps the result dependent on the center carried
+        # over from the previous round.
+        {"agg_mode": "centered_clip", "agg_options": {"clip_radius": 0.01}},
+    ],
+)
+def test_tampered_chunk_is_localized_and_confirmed_every_round(make_federation, validator):
+    federation = make_federation(
+        num_validators=4, input_dim=16, validator=dict(validator, chunk_size=2), mask_scale=None,
+    )
+    federation.validator_attacks["V4"] = tamper_chunk(3)
+    for result in federation.run(3, log=lambda line: None):
+        dispute = result["consensus"]["disputes"]["V4"]
+        assert dispute["chunks"] == [3]
+        assert dispute["total_chunks"] == 9
+        assert dispute["confirmed"]
+
+
+def test_masked_mean_dispute_is_confirmed(make_federation):
+    federation = make_federation(num_validators=4, input_dim=16, validator={"chunk_size": 2})
+    federation.validator_attacks["V4"] = tamper_chunk(5)
+    result = federation.run(1, log=lambda line: None)[0]
+    dispute = result["consensus"]["disputes"]["V4"]
+    assert dispute["chunks"] == [5] and dispute["confirmed"]
+
+
+def test_centered_clip_recompute_matches_the_round_aggregate(make_federation):
+    federation = make_federation(
+        input_dim=16, mask_scale=None,
+        validator={"agg_mode": "centered_clip", "agg_options": {"clip_radius": 0.01}, "chunk_size": 2},
+    )
+    for _ in range(3):
+        federation.run_round(log=lambda line: None)
+        client_grads = {c.id: c.sent_gradient() for c in federation.clients}
+        for v in federation.validators:
+            chunks = list(range(v.agg_tree.num_chunks))
+            recomputed = v.recompute_chunks(client_grads, chunks)
+            assert [recomputed[i] for i in chunks] == [v.agg_tree.leaf(i) for i in chunks]
+
+
+def test_confirmed_dispute_is_slashed(make_federation):
+    federation = make_federation(num_validators=4, input_dim=16, validator={"chunk_size": 2})
+    federation.validator_attacks["V4"] = tamper_chunk(3)
+    stake = federation.chain.stake["V4"]
+    consensus = federation.run(1, log=lambda line: None)[0]["consensus"]
+    assert consensus["disputes"]["V4"]["confirmed"]
+    assert consensus["fraudsters"] == ["V4"]
+    assert federation.chain.stake["V4"] < stake
+
+
+def test_unconfirmed_dispute_is_not_slashed(make_federation):
+    # A colluding majority outvotes the one honest validator; the referee's
+    # recomputation then agrees with the dissenter, so it keeps its stake.
+    federation = make_federation(num_validators=4, input_dim=16, validator={"chunk_size": 2})
+    for vid in ("V1", "V2", "V3"):
+        federation.validator_attacks[vid] = tamper_chunk(3)
+    stake, reputation = federation.chain.stake["V4"], federation.chain.reputation["V4"]
+    consensus = federation.run(1, log=lambda line: None)[0]["consensus"]
+    dispute = consensus["disputes"]["V4"]
+    assert dispute["chunks"] == [3] and not dispute["confirmed"]
+    assert consensus["fraudsters"] == []
+    assert federation.chain.stake["V4"] == stake
+    assert federation.chain.reputation["V4"] == reputation
+
+
+def test_replayed_blocks_spare_unconfirmed_dissenters(make_federation):
+    federation = make_federation(num_validators=4, input_dim=16, validator={"chunk_size": 2})
+    initial = dict(federation.chain.stake)
+    for vid in ("V1", "V2", "V3"):
+        federation.validator_attacks[vid] = tamper_chunk(3)
+    federation.run(2, log=lambda line: None)
+    replica = BlockchainSim()
+    for vid, stake in initial.items():
+        replica.register_validator(vid, stake)
+    for block in federation.chain.blocks:
+        replica.apply_block(block)
+    assert replica.reputation == federation.chain.reputation
+    assert replica.stake == federation.chain.stake
+    assert replica.head_hash == federation.chain.head_hash
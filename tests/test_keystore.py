@@ -0,0 +1,102 @@
+import pytest
+
+from qdfln.crypto_utils import get_suite
+from qdfln.keystore import KeyStore
+
+from conftest import FAST_SUITE
+
+SUITE = get_suite(FAST_SUITE)
+
+
+class Clock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self):
+        return self.now
+
+
+@pytest.fixture
+def clock():
+    return Clock()
+
+
+@pytest.fixture
+def key_store(clock):
+    # Overrides the shared store, so sessions start empty in every test.
+    return KeyStore(clock=clock)
+
+
+def handshake_events(federation):
+    return [e for e in federation.iter_round() if e["type"] == "handshake"]
+
+
+def test_identities_and_sessions_are_reused_across_rounds(make_federation):
+    federation = make_federation()
+    identities = {c.id: c.sig_public_key for c in federation.clients}
+    assert all(e["fresh"] for e in handshake_events(federation))
+    assert not any(e["fresh"] for e in handshake_events(federation))
+    assert {c.id: c.sig_public_key for c in make_federation().clients} == identities
+
+
+def test_session_keys_expire_after_max_age(key_store, clock):
+    key_store.session_max_age = 60.0
+    key, _, fresh = key_store.handshake("C1", "V1", SUITE)
+    assert fresh
+    clock.now += 59.0
+    assert key_store.handshake("C1", "V1", SUITE) == (key, key, False)
+    clock.now += 1.0
+    renewed, _, fresh = key_store.handshake("C1", "V1", SUITE)
+    assert fresh and renewed != key
+
+
+def test_session_keys_expire_after_max_uses(key_store):
+    key_store.session_max_uses = 2
+    key, _, _ = key_store.handshake("C1", "V1", SUITE)
+    assert key_store.handshake("C1", "V1", SUITE)[2] is False
+    renewed, _, fresh = key_store.handshake("C1", "V1", SUITE)
+    assert fresh and renewed != key
+
+
+def test_identities_rotate_after_max_age(key_store, clock):
+    key_store.sig_max_age = key_store.kem_max_age = 60.0
+    sig = key_store.sig_identity("C1", SUITE)
+    key_store.handshake("C1", "V1", SUITE)
+    clock.now += 30.0
+    assert key_store.sig_identity("C1", SUITE) == sig
+    clock.now += 30.0
+    assert key_store.sig_identity("C1", SUITE) != sig
+    # A new KEM key invalidates every session derived from the old one.
+    assert key_store.handshake("C1", "V1", SUITE)[2] is True
+
+
+@pytest.mark.parametrize(
+    "rotate,dropped",
+    [
+        ({"client_id": "C1"}, {("C1", "V1"), ("C1", "V2")}),
+        ({"validator_id": "V1"}, {("C1", "V1"), ("C2", "V1")}),
+        ({}, {("C1", "V1"), ("C1", "V2"), ("C2", "V1")}),
+    ],
+)
+def test_rotate_drops_matching_sessions(key_store, rotate, dropped):
+    pairs = [("C1", "V1"), ("C1", "V2"), ("C2", "V1")]
+    for cid, vid in pairs:
+        key_store.handshake(cid, vid, SUITE)
+    key_store.rotate(**rotate)
+    for cid, vid in pairs:
+        assert key_store.handshake(cid, vid, SUITE)[2] is ((cid, vid) in dropped)
+
+
+def test_store_round_trips_through_its_file(tmp_path, clock):
+    path = str(tmp_path / "keys.json")
+    store = KeyStore(path=path, clock=clock)
+    sig = store.sig_identity("C1", SUITE)
+    key, _, _ = store.handshake("C1", "V1", SUITE)
+    assert store.open_channel("C1", "V1", SUITE) == 1
+    store.save()
+
+    reloaded = KeyStore(path=path, clock=clock)
+    assert reloaded.sig_identity("C1", SUITE) == sig
+    assert reloaded.handshake("C1", "V1", SUITE) == (key, key, False)
+    # Channel epochs continue, so nonces are never reused after a restart.
+    assert reloaded.open_channel("C1", "V1", SUITE) == 2
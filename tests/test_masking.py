@@ -0,0 +1,91 @@
+import os
+
+import pytest
+import torch
+
+from qdfln.masking import DEFAULT_NEIGHBORS, PairwiseMasking, ring_graph
+from qdfln.validator import Validator
+
+DIM = 64
+CLIENTS = [f"C{i + 1}" for i in range(12)]
+
+
+def keyed_masking(neighbors=DEFAULT_NEIGHBORS, scale=0.01):
+    masking = PairwiseMasking(CLIENTS, DIM, scale=scale, neighbors=neighbors)
+    for a, b in masking.pairs():
+        masking.set_pair_key(a, b, os.urandom(32))
+    return masking
+
+
+def test_default_graph_is_a_sparse_ring():
+    edges = ring_graph(len(CLIENTS), DEFAULT_NEIGHBORS)
+    assert len(edges) == len(CLIENTS) * DEFAULT_NEIGHBORS // 2
+    assert len(ring_graph(len(CLIENTS), None)) == len(CLIENTS) * (len(CLIENTS) - 1) // 2
+
+
+@pytest.mark.parametrize("neighbors", [DEFAULT_NEIGHBORS, None])
+def test_masks_cancel_over_all_clients(neighbors):
+    masks = keyed_masking(neighbors).masks(round_id=1)
+    assert masks.sum(dim=0).abs().max() < 1e-6
+
+
+def test_correction_equals_survivor_residual():
+    masking = keyed_masking()
+    survivors = CLIENTS[:5] + CLIENTS[7:]
+    residual = torch.stack([masking.mask(cid, 2) for cid in survivors]).sum(dim=0)
+    assert torch.allclose(masking.correction(survivors, 2), residual, atol=1e-6)
+
+
+def masked_validator(masking, agg_mode, round_id, grads, dropped):
+    v = Validator("V1", DIM, agg_mode=agg_mode, masking=masking, norm_threshold=1e3)
+    v.reset_round(round_id)
+    items = [
+        (cid, (g + masking.mask(cid, round_id)).numpy().tobytes(), None)
+        for cid, g in grads.items()
+        if cid not in dropped
+    ]
+    v._accept_batch(items)
+    return v
+
+
+def test_mean_with_dropouts_recovers_unmasked_mean():
+    masking = keyed_masking(scale=1.0)
+    grads = {cid: torch.randn(DIM) * 0.1 for cid in CLIENTS}
+    dropped = {"C3", "C9"}
+    v = masked_validator(masking, "mean", 4, grads, dropped)
+    expected = torch.stack([g for cid, g in grads.items() if cid not in dropped]).mean(dim=0)
+    assert torch.allclose(v.aggregate_gradients(), expected, atol=1e-5)
+
+
+def test_screening_sees_unmasked_gradients():
+    # Masks far larger than the gradients would trip the norm check if
+    # screening ran on the masked rows.
+    masking = keyed_masking(scale=10.0)
+    grads = {cid: torch.randn(DIM) * 0.01 for cid in CLIENTS}
+    v = Validator("V1", DIM, agg_mode="mean", masking=masking, norm_threshold=1.0)
+    v.reset_round(6)
+    items = [(cid, (g + masking.mask(cid, 6)).numpy().tobytes(), None) for cid, g in grads.items()]
+    assert all(v._accept_batch(items))
+    expected = torch.stack(list(grads.values())).mean(dim=0)
+    assert torch.allclose(v.ref_grad, expected, atol=1e-5)
+
+
+AGG_MODES = ["median", "trimmed_mean", "krum", "multi_krum", "geometric_median", "centered_clip",
+             "norm_bounded_mean", "approx_median", "approx_trimmed_mean"]
+
+
+@pytest.mark.parametrize("agg_mode", AGG_MODES)
+def test_nonlinear_aggregators_refuse_masking(agg_mode):
+    with pytest.raises(ValueError, match="not linear"):
+        Validator("V1", DIM, agg_mode=agg_mode, masking=keyed_masking())
+    assert not Validator("V1", DIM, agg_mode=agg_mode).aggregator.linear
+
+
+@pytest.mark.parametrize("agg_mode", [None, "centered_clip", "krum"])
+def test_federation_masks_only_linear_aggregation(make_federation, agg_mode):
+    validator = {"agg_mode": agg_mode} if agg_mode else {}
+    federation = make_federation(validator=validator)
+    assert federation.masking is None
+    assert all(c.masking is None for c in federation.clients)
+    federation.run(1, log=lambda line: None)
+    assert make_federation(validator={"agg_mode": "mean"}).masking is not None
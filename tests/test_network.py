@@ -0,0 +1,53 @@
+import pytest
+
+from qdfln.network import LinkModel, Network, RoundPolicy
+
+SENDERS = [f"C{i + 1}" for i in range(10)]
+
+
+def to_v1(senders=SENDERS):
+    return [(src, "V1", src.encode()) for src in senders]
+
+
+def test_seeded_drops_and_jitter_are_reproducible():
+    # Uplink transfers interleave the senders' tasks.
+    link = LinkModel(latency_s=0.01, jitter_s=0.5, bandwidth_bps=8e4, drop_rate=0.3)
+    messages = [(src, vid, b"x" * 100 * (i % 3 + 1)) for i, src in enumerate(SENDERS) for vid in ("V1", "V2")]
+    runs = []
+    for _ in range(2):
+        delivered, stats = Network(link, time_scale=0.01, seed=7).exchange(messages)
+        runs.append(({vid: sorted(m.src for m in got) for vid, got in delivered.items()}, stats.dropped))
+    assert runs[0] == runs[1]
+    assert 0 < runs[0][1] < len(messages)
+
+
+def test_quorum_stops_early_and_counts_the_rest_unsent():
+    delays = {src: 0.1 * i for i, src in enumerate(SENDERS)}
+    network = Network(node_delay=delays, time_scale=0.01)
+    delivered, stats = network.exchange(to_v1(), RoundPolicy(quorum=0.5))
+    assert [m.src for m in delivered["V1"]] == SENDERS[:5]
+    assert (stats.sent, stats.delivered, stats.late, stats.unsent) == (5, 5, 0, 5)
+
+
+def test_deadline_counts_sent_stragglers_as_late():
+    slow = {src: LinkModel(latency_s=1.0) for src in SENDERS[7:]}
+    network = Network(LinkModel(latency_s=0.01), links=slow, time_scale=0.01)
+    delivered, stats = network.exchange(to_v1(), RoundPolicy(deadline_s=0.5))
+    assert sorted(m.src for m in delivered["V1"]) == sorted(SENDERS[:7])
+    assert (stats.sent, stats.late, stats.unsent, stats.dropped) == (10, 3, 0, 0)
+    assert stats.elapsed_s == pytest.approx(0.5, abs=0.3)
+
+
+def test_round_deadline_treats_stragglers_as_dropouts(make_federation):
+    federation = make_federation(
+        num_clients=6,
+        network={"time_scale": 0.01, "latency_s": 0.01, "stragglers": {"fraction": 0.34, "delay_s": 2.0}},
+        round_policy={"deadline_s": 1.0},
+    )
+    result = federation.run(1, log=lambda line: None)[0]
+    packets = result["network"]["packets"]
+    assert set(packets["arrived"].values()) == {4}
+    assert packets["unsent"] + packets["late"] == 2 * len(federation.validators)
+    received = {tuple(v.received_clients) for v in federation.validators}
+    assert len(received) == 1
+    assert result["consensus"]["fraudsters"] == []
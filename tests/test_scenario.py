@@ -0,0 +1,24 @@
+import pytest
+
+from qdfln import pipeline
+from qdfln.scenario import Scenario
+
+from conftest import FAST_SUITE
+
+
+def test_missing_bundled_dataset_is_a_clear_error(monkeypatch, key_store):
+    monkeypatch.setattr(pipeline, "_default_dataset", lambda: None)
+    with pytest.raises(ValueError, match="synthetic"):
+        Scenario(num_clients=2, crypto_suite=FAST_SUITE).build_clients(key_store)
+
+
+def test_client_data_is_loaded_once_per_dataset_spec(key_store):
+    scenario = Scenario(num_clients=3, dataset="synthetic", samples_per_client=8, crypto_suite=FAST_SUITE)
+    parts, _ = scenario.client_data()
+    assert scenario.client_data()[0] is parts
+    first, second = scenario.build_clients(key_store), scenario.build_clients(key_store)
+    assert [c.id for c in first] == ["C1", "C2", "C3"] and first[0] is not second[0]
+
+    scenario.num_clients = 4
+    assert len(scenario.client_data()[0]) == 4
+    assert scenario.to_dict()["num_clients"] == 4 and "_client_data" not in scenario.to_dict()
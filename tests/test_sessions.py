@@ -0,0 +1,77 @@
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+
+from qdfln.datasets import synthetic_dataset
+from qdfln.sessions import SessionManager
+
+from conftest import FAST_SUITE
+
+
+class Clock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self):
+        return self.now
+
+
+@pytest.fixture
+def clock():
+    return Clock()
+
+
+@pytest.fixture
+def manager(key_store, clock):
+    manager = SessionManager(ThreadPoolExecutor(max_workers=1), key_store=key_store, job_ttl=60.0, clock=clock)
+    yield manager
+    manager.shutdown()
+
+
+def run_job(manager, session):
+    job = manager.submit_rounds(session.id)
+    manager.job_future(job["job_id"]).result()
+    return job["job_id"]
+
+
+@pytest.fixture
+def session(manager):
+    return manager.create_session(dataset=synthetic_dataset(40, 4), crypto_suite=FAST_SUITE)
+
+
+def test_get_job_returns_a_snapshot(manager, session):
+    job_id = run_job(manager, session)
+    job = manager.get_job(job_id)
+    assert job["status"] == "done" and len(job["results"]) == 1
+    job["status"] = "tampered"
+    job["results"].clear()
+    assert manager.get_job(job_id)["status"] == "done"
+    assert len(manager.get_job(job_id)["results"]) == 1
+
+
+def test_deleting_a_session_drops_its_jobs(manager, session):
+    job_id = run_job(manager, session)
+    manager.delete_session(session.id)
+    assert not manager.jobs and not manager.futures
+    with pytest.raises(KeyError):
+        manager.get_job(job_id)
+
+
+def test_finished_jobs_expire_after_the_ttl(manager, session, clock):
+    job_id = run_job(manager, session)
+    clock.now += 59.0
+    manager.get_job(job_id)
+    clock.now += 2.0
+    with pytest.raises(KeyError):
+        manager.get_job(job_id)
+    assert session.job_ids == []
+
+
+def test_default_session_is_reused_until_deleted(manager):
+    session = manager.default_session(dataset=synthetic_dataset(40, 4), crypto_suite=FAST_SUITE)
+    run_job(manager, session)
+    assert manager.default_session() is session
+    assert session.federation.round_id == 1
+    manager.delete_session(session.id)
+    fresh = manager.default_session(dataset=synthetic_dataset(40, 4), crypto_suite=FAST_SUITE)
+    assert fresh is not session and fresh.federation.round_id == 0
@@ -0,0 +1,70 @@
+import pytest
+import torch
+
+from qdfln.storage import FederationStore
+
+
+def test_resume_restores_model_and_chain(make_federation, tmp_path):
+    federation = make_federation(storage_dir=str(tmp_path))
+    federation.run(2, log=lambda line: None)
+    theta = federation.global_flat.data.clone()
+
+    resumed = make_federation(storage_dir=str(tmp_path))
+    assert resumed.round_id == 2
+    assert resumed.chain.head_hash == federation.chain.head_hash
+    assert torch.equal(resumed.global_flat.data, theta)
+
+
+def test_crash_between_block_and_checkpoint_reruns_the_round(make_federation, tmp_path, monkeypatch):
+    federation = make_federation(storage_dir=str(tmp_path))
+    federation.run(1, log=lambda line: None)
+    theta = federation.global_flat.data.clone()
+    head = federation.chain.head_hash
+
+    def crash(*args, **kwargs):
+        raise RuntimeError("crashed before the checkpoint")
+
+    # Round 2 appends its block, then dies before the model is saved.
+    monkeypatch.setattr(FederationStore, "save_round", crash)
+    with pytest.raises(RuntimeError):
+        federation.run(1, log=lambda line: None)
+    assert len(federation.store.blocks) == 2
+    monkeypatch.undo()
+
+    resumed = make_federation(storage_dir=str(tmp_path))
+    assert resumed.round_id == 1
+    assert resumed.chain.head_hash == head
+    assert len(resumed.store.blocks) == 1
+    assert torch.equal(resumed.global_flat.data, theta)
+
+    result = resumed.run_round()
+    assert result["round_id"] == 2
+    assert result["consensus"]["block_height"] == 1
+    assert len(resumed.store.blocks) == 2
+
+
+def test_reference_gradients_are_versioned_per_checkpoint(make_federation, tmp_path):
+    federation = make_federation(storage_dir=str(tmp_path))
+    federation.store.keep_checkpoints = 1
+    federation.run(2, log=lambda line: None)
+    store = federation.store
+    state = store.load_state()
+    assert set(state["ref_grads"]) == {v.id for v in federation.validators}
+    assert all(name.endswith("_round_00000002") for name in state["ref_grads"].values())
+    assert sorted(store._tensor_names("ref_grad_")) == sorted(state["ref_grads"].values())
+
+    # A crash after the next round's tensors but before its state.json
+    # leaves the recorded references untouched.
+    saved = {vid: ref.clone() for vid, ref in store.load_ref_grads(state).items()}
+    for vid in saved:
+        store.save_tensor(f"ref_grad_{vid}_round_00000003", torch.ones(federation.grad_dim))
+    (tmp_path / "tensors" / "model_round_00000003.f32.tmp").write_bytes(b"torn")
+    resumed = make_federation(storage_dir=str(tmp_path))
+    resumed.store.keep_checkpoints = 1
+    for v in resumed.validators:
+        assert torch.equal(v.ref_grad, saved[v.id])
+
+    resumed.run(1, log=lambda line: None)
+    names = sorted(resumed.store._tensor_names(""))
+    assert [n for n in names if not n.startswith("ref_grad_")] == ["aggregate_round_00000003", "model_round_00000003"]
+    assert all(n.endswith("_round_00000003") for n in names)
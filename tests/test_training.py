@@ -0,0 +1,80 @@
+import random
+
+import numpy as np
+import pytest
+import torch
+
+from qdfln.client import Client
+from qdfln.crypto_utils import get_suite
+from qdfln.models import flat_params, make_model, parameter_vector
+from qdfln.training import BatchedTrainer
+from qdfln.validator import Validator
+
+from conftest import FAST_SUITE
+
+INPUT_DIM = 6
+
+
+@pytest.fixture(scope="module")
+def identity():
+    return get_suite(FAST_SUITE).sig_generate_keypair()
+
+
+def make_clients(identity, sizes=(5, 9, 3, 12)):
+    rng = np.random.default_rng(0)
+    suite = get_suite(FAST_SUITE)
+    clients = []
+    for i, n in enumerate(sizes):
+        X = rng.standard_normal((n, INPUT_DIM)).astype(np.float32)
+        y = (rng.random(n) < 0.5).astype(np.float32)
+        c = Client(f"C{i + 1}", X, y, INPUT_DIM, identity, suite)
+        torch.manual_seed(i)
+        c.flat.load_(torch.randn(len(c.flat)))
+        clients.append(c)
+    return clients
+
+
+@pytest.mark.parametrize("epochs", [1, 3])
+def test_batched_training_matches_per_client_training(identity, epochs):
+    per_client, batched = make_clients(identity), make_clients(identity)
+    expected = torch.stack([c.local_train_and_compute_gradient(epochs=epochs).clone() for c in per_client])
+    grads = BatchedTrainer(batched).local_train_and_compute_gradients(epochs=epochs)
+    assert torch.allclose(grads, expected, atol=1e-6)
+    for a, b in zip(per_client, batched):
+        assert torch.allclose(a.get_param_vector(), b.get_param_vector(), atol=1e-6)
+
+
+def test_flat_buffers_back_the_model_parameters():
+    model = make_model("mlp", INPUT_DIM, hidden=[4])
+    flat = flat_params(model)
+    assert parameter_vector(model).data_ptr() == flat.data.data_ptr()
+    flat.load_(torch.arange(len(flat), dtype=torch.float32))
+    assert model[0].weight.view(-1)[0] == 0 and model[-1].bias.item() == len(flat) - 1
+    model(torch.randn(3, INPUT_DIM)).sum().backward()
+    assert torch.equal(torch.cat([p.grad.view(-1) for p in model.parameters()]), flat.grad)
+
+
+def screen_in_order(rows, order):
+    v = Validator("V1", rows.shape[1], median_threshold=2.0, cluster_threshold=3.0, norm_threshold=10.0)
+    v.ref_grad = torch.ones(rows.shape[1])
+    v.reset_round(1)
+    items = [(f"C{i}", rows[i].numpy().tobytes(), None) for i in order]
+    accepted = dict(zip((f"C{i}" for i in order), v._accept_batch(items)))
+    return accepted, dict(v.client_suspicion), dict(v.rejections), v.ref_grad
+
+
+def test_batch_screening_does_not_depend_on_arrival_order():
+    torch.manual_seed(0)
+    rows = torch.ones(12, 8) + 0.1 * torch.randn(12, 8)
+    rows[3] = -rows[3]  # cosine anomaly
+    rows[7] *= 10.0  # norm rejection
+    rows[9] += 1.5  # outlier
+    order = list(range(12))
+    baseline = screen_in_order(rows, order)
+    assert baseline[2] == {"C7": "norm"}
+    assert {"C3", "C9"} <= set(baseline[1])
+    for seed in range(3):
+        random.Random(seed).shuffle(order)
+        accepted, suspicion, rejections, ref = screen_in_order(rows, order)
+        assert (accepted, suspicion, rejections) == baseline[:3]
+        assert torch.allclose(ref, baseline[3], atol=1e-6)
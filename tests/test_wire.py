@@ -0,0 +1,110 @@
+import os
+import struct
+
+import pytest
+import torch
+
+from qdfln.client import Client
+from qdfln.crypto_utils import get_suite
+from qdfln.validator import Validator
+
+from conftest import FAST_SUITE
+
+GRAD_DIM = 5
+ROUND_OFFSET = 10  # magic(4) version(1) flags(1) cid_len(2) vid_len(2)
+
+
+@pytest.fixture
+def peers():
+    suite = get_suite(FAST_SUITE)
+    client = Client("C1", [[0.0] * 4], [0.0], 4, suite=suite)
+    validators = {}
+    for vid in ("V1", "V2"):
+        v = Validator(vid, GRAD_DIM, suite=suite)
+        key = os.urandom(32)
+        client.set_symmetric_key_for_validator(vid, key)
+        v.set_qkd_key_for_client(client.id, key)
+        v.register_client_identity(client.id, client.sig_public_key)
+        validators[vid] = v
+    return client, validators
+
+
+def send(client, validators, wire_format, round_id, accept_round):
+    g = torch.full((GRAD_DIM,), 0.1)
+    packets = client.create_secure_packets(list(validators), g, wire_format=wire_format, round_id=round_id)
+    for v in validators.values():
+        v.reset_round(accept_round)
+    return packets
+
+
+@pytest.mark.parametrize("wire_format", ["binary", "dict"])
+def test_current_round_packet_is_accepted(peers, wire_format):
+    client, validators = peers
+    packets = send(client, validators, wire_format, round_id=3, accept_round=3)
+    v1 = validators["V1"]
+    assert v1.process_packets([packets["V1"]]) == [True]
+    assert v1.received_clients == ["C1"]
+
+
+@pytest.mark.parametrize("wire_format", ["binary", "dict"])
+def test_packet_from_earlier_round_is_a_replay(peers, wire_format):
+    client, validators = peers
+    packets = send(client, validators, wire_format, round_id=2, accept_round=3)
+    v1 = validators["V1"]
+    assert v1.process_packets([packets["V1"]]) == [False]
+    assert v1.rejections["C1"] == "replay"
+
+
+@pytest.mark.parametrize("wire_format", ["binary", "dict"])
+def test_repeated_packet_in_a_round_is_a_replay(peers, wire_format):
+    client, validators = peers
+    packets = send(client, validators, wire_format, round_id=3, accept_round=3)
+    v1 = validators["V1"]
+    assert v1.process_packets([packets["V1"], packets["V1"]]) == [True, False]
+    assert v1.process_packet(packets["V1"]) is False
+    assert v1.rejections["C1"] == "replay"
+    assert v1.received_clients == ["C1"] and len(v1.aggregator) == 1
+
+
+@pytest.mark.parametrize("wire_format", ["binary", "dict"])
+def test_packet_for_another_validator_is_rejected(peers, wire_format):
+    client, validators = peers
+    packets = send(client, validators, wire_format, round_id=3, accept_round=3)
+    v1 = validators["V1"]
+    assert v1.process_packet(packets["V2"]) is False
+    assert v1.rejections["C1"] == "replay"
+
+
+def test_rewritten_round_fails_authentication(peers):
+    client, validators = peers
+    packets = send(client, validators, "binary", round_id=2, accept_round=3)
+    forged = bytearray(packets["V1"])
+    struct.pack_into("!I", forged, ROUND_OFFSET, 3)
+    v1 = validators["V1"]
+    assert v1.process_packets([bytes(forged)]) == [False]
+    assert v1.rejections["C1"] == "decrypt"
+
+
+def test_tampered_ciphertext_is_rejected(peers):
+    client, validators = peers
+    packets = send(client, validators, "binary", round_id=1, accept_round=1)
+    forged = bytearray(packets["V1"])
+    forged[-len(bytes.fromhex(client.last_signed["signature"])) - 1] ^= 1
+    v1 = validators["V1"]
+    assert v1.process_packets([bytes(forged)]) == [False]
+    assert v1.rejections["C1"] == "decrypt"
+
+
+def test_dict_packet_must_use_the_registered_identity(peers):
+    client, validators = peers
+    impostor = Client("C1", [[0.0] * 4], [0.0], 4, suite=client.suite)
+    for vid, key in client.qkd_keys.items():
+        impostor.set_symmetric_key_for_validator(vid, key)
+    packets = send(impostor, validators, "dict", round_id=3, accept_round=3)
+    v1 = validators["V1"]
+    assert v1.process_packets([packets["V1"]]) == [False]
+    assert v1.rejections["C1"] == "identity"
+
+    # Without a registered key the embedded one is used.
+    del v1.client_sig_keys["C1"]
+    assert v1.process_packets([packets["V1"]]) == [True]